@@ -1,6 +1,136 @@
 import pytest
 import tempfile
+import glob
+import gc
+import json
 import os
+import random
+import statistics
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+# Размеры наборов задач для замеров производительности (pytest -m benchmark)
+BENCH_SIZES = {"1k": 1_000, "100k": 100_000, "1m": 1_000_000}
+# Распределения сроков в синтетическом наборе задач
+DUE_DISTRIBUTIONS = ("uniform", "clustered", "overdue", "none")
+_BENCH_WORDS = (
+    "купить молоко отчёт встреча позвонить написать проверить отправить "
+    "документы квартал клиент проект счёт письмо врач билеты ремонт код "
+    "релиз тесты договор презентация бюджет задача план обзор"
+).split()
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("benchmark", "замеры производительности")
+    group.addoption(
+        "--bench-sizes",
+        default="1k,100k",
+        help="размеры наборов задач через запятую: 1k, 100k, 1m",
+    )
+    group.addoption(
+        "--bench-completed",
+        type=float,
+        default=0.3,
+        help="доля выполненных задач в наборе",
+    )
+    group.addoption(
+        "--bench-due",
+        default="uniform",
+        choices=DUE_DISTRIBUTIONS,
+        help="распределение сроков задач в наборе",
+    )
+    group.addoption(
+        "--bench-dir",
+        default=".benchmarks",
+        help="каталог с результатами замеров и базовой линией",
+    )
+    group.addoption(
+        "--bench-save-baseline",
+        action="store_true",
+        help="сохранить результаты замеров как новую базовую линию",
+    )
+    group.addoption(
+        "--bench-threshold",
+        type=float,
+        default=1.0,
+        help="допустимое ухудшение относительно базовой линии (1.0 — вдвое медленнее)",
+    )
+
+
+def pytest_generate_tests(metafunc):
+    # Каждый замер выполняется на каждом из выбранных размеров набора
+    if "bench_size" in metafunc.fixturenames:
+        names = [
+            name.strip().lower()
+            for name in metafunc.config.getoption("--bench-sizes").split(",")
+            if name.strip()
+        ]
+        unknown = [name for name in names if name not in BENCH_SIZES]
+        if unknown:
+            raise pytest.UsageError(f"неизвестные размеры набора: {', '.join(unknown)}")
+        metafunc.parametrize(
+            "bench_size",
+            [BENCH_SIZES[name] for name in names],
+            ids=names,
+            scope="session",
+        )
+
+
+def generate_tasks(
+    count: int,
+    completed_ratio: float = 0.3,
+    due_distribution: str = "uniform",
+    seed: int = 0,
+    today: datetime = datetime(2025, 1, 1),
+):
+    """Синтетический набор задач, одинаковый при одном и том же seed
+
+    due_distribution: uniform — сроки равномерно на полгода в обе стороны
+    от today, clustered — вокруг нескольких общих дат, overdue — в основном
+    просроченные, none — без сроков. Задачи с uniform/clustered/overdue
+    имеют срок в 80% случаев.
+    """
+    from tasks import Task
+
+    if due_distribution not in DUE_DISTRIBUTIONS:
+        raise ValueError(f"неизвестное распределение сроков: {due_distribution}")
+    rng = random.Random(seed)
+    priorities = ("низкий", "средний", "высокий")
+    clusters = [today + timedelta(days=rng.randint(-30, 90)) for _ in range(5)]
+    tasks = []
+    for task_id in range(count):
+        due_date = ""
+        if due_distribution != "none" and rng.random() < 0.8:
+            if due_distribution == "uniform":
+                due = today + timedelta(days=rng.randint(-180, 180))
+            elif due_distribution == "clustered":
+                due = rng.choice(clusters) + timedelta(days=round(rng.gauss(0, 3)))
+            else:
+                due = today - timedelta(days=int(rng.expovariate(1 / 30)))
+            due_date = due.strftime("%Y-%m-%d")
+        created = today - timedelta(seconds=rng.randint(0, 365 * 86400))
+        completed = rng.random() < completed_ratio
+        completed_at = ""
+        if completed:
+            completed_at = (
+                created + timedelta(seconds=rng.randint(0, 30 * 86400))
+            ).strftime("%Y-%m-%d %H:%M:%S")
+        title = " ".join(rng.choices(_BENCH_WORDS, k=rng.randint(2, 6)))
+        tasks.append(
+            Task.from_row(
+                (
+                    task_id,
+                    title.capitalize(),
+                    rng.choice(priorities),
+                    due_date,
+                    completed,
+                    created.strftime("%Y-%m-%d %H:%M:%S"),
+                    completed_at,
+                )
+            )
+        )
+    return tasks
 
 
 @pytest.fixture
@@ -13,8 +143,61 @@ def temp_json_file():
 
     yield temp_file.name
 
-    if os.path.exists(temp_file.name):
-        os.remove(temp_file.name)
+    # Удаляем сам файл и служебные файлы рядом с ним (журнал и т.п.)
+    for path in glob.glob(temp_file.name + "*"):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            # Временный файл фоновой записи мог исчезнуть после glob
+            pass
+
+
+@pytest.fixture
+def temp_db_file(tmp_path):
+    """Фикстура для временного файла базы SQLite"""
+    return str(tmp_path / "tasks.db")
+
+
+@pytest.fixture
+def temp_ndjson_file(tmp_path):
+    """Фикстура для временного файла NDJSON со слотами"""
+    return str(tmp_path / "tasks.ndjson")
+
+
+@pytest.fixture
+def filled_manager(temp_json_file):
+    """Фикстура с менеджером, содержащим задачи разных приоритетов и сроков"""
+    from tasks import TaskManager
+
+    manager = TaskManager(temp_json_file)
+    manager.add_task("Task 1", "высокий", "2024-12-31")
+    manager.add_task("Task 2", "средний", "2024-06-30")
+    manager.add_task("Task 3", "высокий")
+    manager.add_task("Task 4", "низкий", "2024-01-15")
+    return manager
+
+
+@pytest.fixture
+def task_server(temp_json_file):
+    """Фикстура с HTTP-сервером задач на свободном порту localhost"""
+    import threading
+    from tasks import TaskManager, make_server
+
+    manager = TaskManager(
+        temp_json_file, thread_safe=True, autosave=True, autosave_delay=0.05
+    )
+    server = make_server(manager, port=0)
+    thread = threading.Thread(
+        target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True
+    )
+    thread.start()
+
+    yield server
+
+    server.shutdown()
+    server.server_close()
+    thread.join()
+    manager.close()
 
 
 @pytest.fixture
@@ -35,3 +218,190 @@ def todo_app(temp_json_file):
     # Переопределяем TaskManager с временным файлом
     app.task_manager = TaskManager(temp_json_file)
     return app
+
+
+@pytest.fixture
+def task_generator():
+    """Фикстура с генератором синтетических наборов задач"""
+    return generate_tasks
+
+
+@pytest.fixture(scope="session")
+def bench_file(bench_size, request, tmp_path_factory):
+    """Файл tasks.json с синтетическим набором задач размера bench_size
+
+    Набор строится один раз на сессию; замеры, которые меняют список,
+    работают с копией (см. bench_copy).
+    """
+    from tasks import TaskManager
+
+    config = request.config
+    path = str(tmp_path_factory.mktemp("bench") / f"tasks-{bench_size}.json")
+    manager = TaskManager(path, verbose=False)
+    manager._store.replace_all(
+        generate_tasks(
+            bench_size,
+            completed_ratio=config.getoption("--bench-completed"),
+            due_distribution=config.getoption("--bench-due"),
+        )
+    )
+    manager.save_to_file()
+    return path
+
+
+@pytest.fixture
+def bench_copy(bench_file, tmp_path):
+    """Копия файла набора задач, которую замер может изменять"""
+    import shutil
+
+    path = str(tmp_path / "tasks.json")
+    shutil.copyfile(bench_file, path)
+    return path
+
+
+def measure(fn, setup=None, items=1, min_time=0.5, max_time=5.0, max_rounds=1000):
+    """Замерить fn: медиана и минимум времени на вызов, процессорное
+    время лучшего раунда и пик памяти
+
+    Вызовы повторяются, пока не наберётся min_time (и хотя бы три раунда)
+    или не будет исчерпан max_time. setup вызывается перед каждым раундом
+    и в замер не входит. Пик памяти снимается отдельным прогоном под
+    tracemalloc, чтобы трассировка не искажала время.
+    """
+    # Прогон под tracemalloc идёт первым: он же прогревает кэши, чтобы
+    # первый раунд замера времени не отличался от остальных
+    if setup is not None:
+        setup()
+    gc.collect()
+    tracemalloc.start()
+    try:
+        fn()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    times = []
+    cpu_times = []
+    total = 0.0
+    while len(times) < max_rounds and total < max_time:
+        if setup is not None:
+            setup()
+        gc.collect()
+        start, cpu_start = time.perf_counter(), time.process_time()
+        fn()
+        elapsed = time.perf_counter() - start
+        cpu_times.append(time.process_time() - cpu_start)
+        times.append(elapsed)
+        total += elapsed
+        if total >= min_time and len(times) >= 3:
+            break
+    median = statistics.median(times)
+    return {
+        "seconds": median,
+        "min_seconds": min(times),
+        "cpu_seconds": min(cpu_times),
+        "rounds": len(times),
+        "items": items,
+        "throughput": items / median if median else float("inf"),
+        "peak_bytes": peak,
+    }
+
+
+def compare_with_baseline(result: dict, baseline: dict, threshold: float):
+    """Список ухудшений результата относительно базовой линии"""
+    problems = []
+    # Сравнивается процессорное время лучшего раунда: оно меньше медианы
+    # зависит от фоновой нагрузки машины и не включает ожидание fsync
+    if result["cpu_seconds"] > baseline["cpu_seconds"] * (1 + threshold):
+        problems.append(
+            f"процессорное время {result['cpu_seconds'] * 1000:.3f} мс против "
+            f"{baseline['cpu_seconds'] * 1000:.3f} мс"
+        )
+    # Небольшие колебания памяти (до 1 МиБ) не считаются ухудшением
+    grown = result["peak_bytes"] - baseline["peak_bytes"]
+    if grown > 1024 * 1024 and grown > baseline["peak_bytes"] * threshold:
+        problems.append(
+            f"память {result['peak_bytes'] / 2**20:.1f} МиБ против "
+            f"{baseline['peak_bytes'] / 2**20:.1f} МиБ"
+        )
+    return problems
+
+
+@pytest.fixture(scope="session")
+def bench_results(request):
+    """Результаты замеров сессии; базовая линия читается из --bench-dir"""
+    config = request.config
+    directory = config.getoption("--bench-dir")
+    try:
+        with open(os.path.join(directory, "baseline.json"), encoding="utf-8") as file:
+            baseline = json.load(file)["results"]
+    except (OSError, ValueError, KeyError):
+        baseline = {}
+    results = {}
+    config._bench_results = results
+    config._bench_baseline = baseline
+    return results
+
+
+@pytest.fixture
+def bench(request, bench_results):
+    """Фикстура замера: bench(fn, setup=None, items=1) -> результат
+
+    Результат сохраняется под именем теста и сравнивается с базовой
+    линией; ухудшение больше --bench-threshold проваливает тест.
+    """
+    config = request.config
+
+    def run(fn, setup=None, items=1, **options):
+        result = measure(fn, setup=setup, items=items, **options)
+        name = request.node.name
+        bench_results[name] = result
+        baseline = config._bench_baseline.get(name)
+        if baseline and not config.getoption("--bench-save-baseline"):
+            problems = compare_with_baseline(
+                result, baseline, config.getoption("--bench-threshold")
+            )
+            if problems:
+                pytest.fail(f"регрессия {name}: " + "; ".join(problems))
+        return result
+
+    return run
+
+
+def pytest_terminal_summary(terminalreporter, config):
+    # Таблица замеров и запись результатов (и базовой линии по запросу)
+    results = getattr(config, "_bench_results", None)
+    if not results:
+        return
+    baseline = config._bench_baseline
+    terminalreporter.write_sep("=", "замеры производительности")
+    terminalreporter.write_line(
+        f"{'замер':<44} {'мс/оп':>11} {'опер/с':>13} {'пик МиБ':>9} {'ЦП/база':>8}"
+    )
+    for name, result in sorted(results.items()):
+        ratio = ""
+        if baseline.get(name, {}).get("cpu_seconds"):
+            ratio = f"{result['cpu_seconds'] / baseline[name]['cpu_seconds']:.2f}x"
+        terminalreporter.write_line(
+            f"{name:<44} {result['seconds'] * 1000:>11.3f} "
+            f"{result['throughput']:>13,.0f} "
+            f"{result['peak_bytes'] / 2**20:>9.1f} {ratio:>8}"
+        )
+    directory = config.getoption("--bench-dir")
+    os.makedirs(directory, exist_ok=True)
+    report = {
+        "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "completed_ratio": config.getoption("--bench-completed"),
+        "due_distribution": config.getoption("--bench-due"),
+        "results": results,
+    }
+    names = ["latest.json"]
+    if config.getoption("--bench-save-baseline"):
+        # Новая базовая линия дополняет старую: замеры других размеров
+        # из прошлых запусков сохраняются
+        report["results"] = {**baseline, **results}
+        names.append("baseline.json")
+    for file_name in names:
+        path = os.path.join(directory, file_name)
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+        terminalreporter.write_line(f"результаты записаны в {path}")
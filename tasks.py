@@ -1,12 +1,71 @@
+import functools
 import json
+import marshal
+import operator
 import os
-from datetime import datetime
-from typing import List, Optional
+import re
+import signal
+import struct
+import sys
+import threading
+import time
+import weakref
+import zlib
+from array import array
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from contextlib import contextmanager, nullcontext
+from datetime import date, datetime, timedelta
+from heapq import merge, nsmallest
+from itertools import chain, islice
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    ContextManager,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    TextIO,
+    Tuple,
+    Union,
+)
+
+try:
+    import fcntl
+except ImportError:  # Windows: блокировок файлов между процессами нет
+    fcntl = None
+
+# Тяжёлые модули (asyncio, http.server, sqlite3, gzip, lzma, csv) импортируются
+# там, где они нужны: команды командной строки запускаются без лишних импортов
+if TYPE_CHECKING:
+    from concurrent.futures import Executor
+    from http.server import ThreadingHTTPServer
 
 
 class Task:
     """Класс, представляющий отдельную задачу"""
 
+    # Без __dict__ у каждой задачи: заметно меньше памяти на больших списках
+    __slots__ = (
+        "_on_change",
+        "_title",
+        "_priority",
+        "_due_date",
+        "_completed",
+        "_dirty",
+        "_shown",
+        "_listed",
+        "created_at",
+        "completed_at",
+        "id",
+        "__weakref__",
+    )
+
     def __init__(
         self,
         title: str,
@@ -14,181 +73,5213 @@ class Task:
         due_date: str = "",
         completed: bool = False,
     ):
-        self.title = title
-        self.priority = priority.lower()
-        self.due_date = due_date
-        self.completed = completed
+        # Наблюдатель изменений полей (менеджер обновляет по нему индексы)
+        self._on_change: Optional[Callable[["Task", str, Any], None]] = None
+        self._title = title
+        # Приоритетов всего несколько — храним одну общую строку на значение
+        self._priority = sys.intern(priority.lower())
+        self._due_date = due_date
+        self._completed = completed
+        # Поля, изменённые с последнего сохранения (None — изменений нет)
+        self._dirty: Optional[set] = None
+        # Готовая строка show() (None — ещё не построена или устарела)
+        self._shown: Optional[str] = None
+        # Готовый блок задачи в списке: (id, текст) — номер входит в текст
+        self._listed: Optional[Tuple[Optional[int], str]] = None
         self.created_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        # Время выполнения: по нему выполненные задачи уходят в архив
+        self.completed_at = ""
+        # Постоянный идентификатор, назначается менеджером при добавлении
+        self.id: Optional[int] = None
+
+    @property
+    def title(self) -> str:
+        return self._title
+
+    @title.setter
+    def title(self, value: str) -> None:
+        self._set("title", value)
+
+    @property
+    def priority(self) -> str:
+        return self._priority
+
+    @priority.setter
+    def priority(self, value: str) -> None:
+        self._set("priority", value)
+
+    @property
+    def due_date(self) -> str:
+        return self._due_date
+
+    @due_date.setter
+    def due_date(self, value: str) -> None:
+        self._set("due_date", value)
+
+    @property
+    def completed(self) -> bool:
+        return self._completed
+
+    @completed.setter
+    def completed(self, value: bool) -> None:
+        if value and not self._completed:
+            self.completed_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        elif not value:
+            self.completed_at = ""
+        self._set("completed", value)
+
+    def _set(self, field: str, value: Any) -> None:
+        """Изменить поле и сообщить наблюдателю старое значение"""
+        old = getattr(self, "_" + field)
+        if old == value:
+            return
+        setattr(self, "_" + field, value)
+        self._shown = self._listed = None
+        self._mark_dirty(field)
+        if self._on_change is not None:
+            self._on_change(self, field, old)
+
+    def _mark_dirty(self, field: str) -> None:
+        """Запомнить, что поле изменилось после последнего сохранения"""
+        if self._dirty is None:
+            self._dirty = set()
+        self._dirty.add(field)
+
+    @property
+    def dirty_fields(self) -> frozenset:
+        """Поля, изменённые после последнего сохранения задачи"""
+        return frozenset(self._dirty or ())
+
+    def clear_dirty(self) -> None:
+        """Отметить задачу сохранённой"""
+        self._dirty = None
+
+    def mark_completed(self) -> None:
+        """Отметить задачу как выполненную"""
+        self.completed = True
+
+    def edit(
+        self,
+        title: Optional[str] = None,
+        priority: Optional[str] = None,
+        due_date: Optional[str] = None,
+    ) -> None:
+        """Редактировать параметры задачи"""
+        if title:
+            self.title = title
+        if priority:
+            self.priority = sys.intern(priority.lower())
+        if due_date:
+            self.due_date = due_date
+
+    def show(self) -> str:
+        """Вывести информацию о задаче в виде строки
+
+        Строка запоминается до изменения любого поля задачи; сколько задач
+        держат готовые строки, ограничивает RENDER_CACHE.
+        """
+        shown = self._shown
+        if shown is not None:
+            RENDER_CACHE.touch(self)
+            return shown
+        shown = self._render()
+        RENDER_CACHE.add(self, shown)
+        return shown
+
+    def _list_entry(self) -> str:
+        """Блок задачи в списке list_tasks (запоминается вместе со show())"""
+        listed = self._listed
+        if listed is not None and listed[0] == self.id:
+            RENDER_CACHE.touch(self)
+            return listed[1]
+        entry = f"\nЗадача #{self.id}:\n{self.show()}\n"
+        if self._shown is not None:
+            # Строка show() запомнена — значит, RENDER_CACHE сбросит и блок
+            self._listed = (self.id, entry)
+        return entry
+
+    def _render(self) -> str:
+        status = "ВЫПОЛНЕНО" if self.completed else "НЕ ВЫПОЛНЕНО"
+        due = f"   Срок: {self.due_date}\n" if self.due_date else ""
+        # Строка собирается одним выражением, без промежуточных копий
+        return (
+            f"[{status}] {self.title}\n"
+            f"   Приоритет: {self.priority.upper()}\n"
+            f"   Создана: {self.created_at}\n"
+            f"{due}"
+        )
+
+    def to_dict(self) -> dict:
+        """Преобразовать задачу в словарь для сохранения в файл"""
+        return {
+            "id": self.id,
+            "title": self.title,
+            "priority": self.priority,
+            "due_date": self.due_date,
+            "completed": self.completed,
+            "created_at": self.created_at,
+            "completed_at": self.completed_at,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Task":
+        """Создать задачу из словаря (при загрузке из файла)"""
+        # В старых файлах идентификатора нет — его назначит менеджер
+        return cls.from_row(
+            (
+                data.get("id"),
+                data["title"],
+                data["priority"],
+                data["due_date"],
+                data["completed"],
+                data["created_at"],
+                data.get("completed_at", ""),
+            )
+        )
+
+    def to_row(self) -> tuple:
+        """Преобразовать задачу в кортеж полей для бинарного кэша"""
+        return (
+            self.id,
+            self.title,
+            self.priority,
+            self.due_date,
+            self.completed,
+            self.created_at,
+            self.completed_at,
+        )
+
+    @classmethod
+    def from_row(cls, row: tuple) -> "Task":
+        """Создать задачу из кортежа (id, title, priority, due_date, completed,
+        created_at, completed_at) без лишней работы конструктора (текущего времени и т.п.)
+        """
+        task = cls.__new__(cls)
+        task._on_change = None
+        task.id = row[0]
+        task._title = row[1]
+        task._priority = sys.intern(row[2].lower())
+        task._due_date = row[3]
+        task._completed = row[4]
+        task._dirty = None
+        task._shown = task._listed = None
+        task.created_at = row[5]
+        task.completed_at = row[6]
+        return task
+
+
+class RenderCache:
+    """Ограничение памяти под строки Task.show()
+
+    Строка хранится в самой задаче, а здесь — очередь задач с готовыми
+    строками от давно показанных к недавним. Сверх maxsize строки у самых
+    давно показанных задач сбрасываются (и строятся заново при показе).
+    """
+
+    def __init__(self, maxsize: int = 50_000):
+        self.maxsize = maxsize
+        # id задачи -> слабая ссылка на неё: кэш не держит удалённые задачи
+        self._entries: "OrderedDict[int, weakref.ref]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, task: "Task", shown: str) -> None:
+        """Запомнить строку задачи, вытеснив самые давно показанные"""
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            task._shown = shown
+            self._entries[id(task)] = weakref.ref(task)
+            self._entries.move_to_end(id(task))
+            self._evict(self.maxsize)
+
+    def touch(self, task: "Task") -> None:
+        """Отметить, что строку задачи только что показали"""
+        # Без блокировки: move_to_end выполняется целиком под GIL, а запись,
+        # которую в этот момент вытеснил другой поток, просто не найдётся
+        try:
+            self._entries.move_to_end(id(task))
+        except KeyError:
+            pass
+
+    def resize(self, maxsize: int) -> None:
+        """Изменить предел; 0 отключает запоминание строк"""
+        with self._lock:
+            self.maxsize = maxsize
+            self._evict(max(maxsize, 0))
+
+    def _evict(self, limit: int) -> None:
+        while len(self._entries) > limit:
+            evicted = self._entries.popitem(last=False)[1]()
+            if evicted is not None:
+                evicted._shown = evicted._listed = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+# Общий предел для строк show() всех задач процесса
+RENDER_CACHE = RenderCache()
+
+
+def _dict_to_row(data: dict) -> tuple:
+    """Кортеж полей задачи (как Task.to_row) прямо из словаря файла JSON
+
+    Последним элементом идёт версия записи (см. TaskManager(shared=True)),
+    Task.from_row её не читает.
+    """
+    return (
+        data.get("id"),
+        data["title"],
+        data["priority"],
+        data["due_date"],
+        data["completed"],
+        data["created_at"],
+        data.get("completed_at", ""),
+        data.get("version", 0),
+    )
+
+
+def iter_json_array(
+    source: Union[str, TextIO], chunk_size: int = 64 * 1024
+) -> Iterator[Any]:
+    """Потоково разобрать JSON-массив из файла, выдавая элементы по одному
+
+    source — имя файла или открытый текстовый файл. В памяти держится
+    только текущий фрагмент файла, а не весь массив.
+    """
+    if isinstance(source, str):
+        with open(source, "r", encoding="utf-8") as f:
+            yield from iter_json_array(f, chunk_size)
+        return
+    f = source
+    decoder = json.JSONDecoder()
+    buffer = ""
+    position = 0
+    eof = False
+
+    def fill() -> bool:
+        nonlocal buffer, position, eof
+        chunk = f.read(chunk_size)
+        if not chunk:
+            eof = True
+            return False
+        buffer = buffer[position:] + chunk
+        position = 0
+        return True
+
+    def skip_whitespace() -> Optional[str]:
+        nonlocal position
+        while True:
+            while position < len(buffer) and buffer[position].isspace():
+                position += 1
+            if position < len(buffer):
+                return buffer[position]
+            if not fill():
+                return None
+
+    if skip_whitespace() is None:
+        # Пустой файл — пустой список
+        return
+    if buffer[position] != "[":
+        raise ValueError("ожидался JSON-массив задач")
+    position += 1
+
+    first = True
+    while True:
+        char = skip_whitespace()
+        if char is None:
+            raise ValueError("неожиданный конец файла")
+        if char == "]":
+            return
+        if not first:
+            if char != ",":
+                raise ValueError(f"ожидалась запятая в позиции {position}")
+            position += 1
+            if skip_whitespace() is None:
+                raise ValueError("неожиданный конец файла")
+        first = False
+
+        while True:
+            try:
+                item, end = decoder.raw_decode(buffer, position)
+            except ValueError:
+                # Элемент не поместился в прочитанный фрагмент — дочитываем
+                if eof or not fill():
+                    raise
+                continue
+            if end == len(buffer) and not eof:
+                # Число на границе фрагмента могло оборваться
+                if fill():
+                    continue
+            position = end
+            break
+        yield item
+
+
+def iter_tasks_from_file(filename: str) -> Iterator["Task"]:
+    """Потоково прочитать задачи из файла JSON"""
+    for data in iter_json_array(filename):
+        yield Task.from_dict(data)
+
+
+# Поля записи задачи при импорте и экспорте (и колонки CSV) — как в to_dict
+TASK_FIELDS = (
+    "id",
+    "title",
+    "priority",
+    "due_date",
+    "completed",
+    "created_at",
+    "completed_at",
+)
+# Форматы файлов импорта и экспорта по расширению; остальные — массив JSON
+STREAM_FORMATS = {".ndjson": "ndjson", ".jsonl": "ndjson", ".csv": "csv"}
+# Сжатие по расширению файла
+COMPRESSIONS = {".gz": "gzip", ".xz": "lzma", ".lzma": "lzma"}
+
+
+def stream_format(filename: str) -> Tuple[str, Optional[str]]:
+    """Определить по имени файла формат (json, ndjson, csv) и сжатие
+
+    Например, tasks.ndjson.gz — ("ndjson", "gzip").
+    """
+    base, ext = os.path.splitext(filename.lower())
+    compression = COMPRESSIONS.get(ext)
+    if compression is not None:
+        ext = os.path.splitext(base)[1]
+    return STREAM_FORMATS.get(ext, "json"), compression
+
+
+def open_stream(filename: str, mode: str, compression: Optional[str]) -> TextIO:
+    """Открыть текстовый файл для импорта или экспорта, возможно сжатый
+
+    mode — "r" или "w"; compression — None, "gzip" или "lzma".
+    """
+    if compression is None:
+        return open(filename, mode, encoding="utf-8", newline="")
+    if compression == "gzip":
+        import gzip
+
+        # Уровень 6 вместо 9: почти тот же размер, запись в разы быстрее
+        return gzip.open(
+            filename, mode + "t", compresslevel=6, encoding="utf-8", newline=""
+        )
+    if compression == "lzma":
+        import lzma
+
+        # Уровень 1 вместо 6: в разы быстрее, а файл всё ещё меньше, чем gzip
+        preset = 1 if mode == "w" else None
+        return lzma.open(
+            filename, mode + "t", preset=preset, encoding="utf-8", newline=""
+        )
+    raise ValueError(f"неизвестное сжатие: {compression}")
+
+
+def iter_task_records(f: TextIO, fmt: str) -> Iterator[Dict[str, Any]]:
+    """Читать записи задач (словари с полями TASK_FIELDS) по одной
+
+    Форматы: json — массив JSON, ndjson — объект на строку, csv — строки
+    с заголовком. В CSV все значения — строки.
+    """
+    if fmt == "json":
+        yield from iter_json_array(f)
+    elif fmt == "ndjson":
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError as e:
+                raise ValueError(f"строка {number}: {e}") from None
+    elif fmt == "csv":
+        import csv
+
+        yield from csv.DictReader(f)
+    else:
+        raise ValueError(f"неизвестный формат: {fmt}")
+
+
+def write_task_records(tasks: Iterable["Task"], out: TextIO, fmt: str) -> int:
+    """Записать задачи в формате json, ndjson или csv; вернуть их число"""
+    if fmt == "json":
+        # Тот же вид, что и при сохранении, но без отступов внутри задачи
+        chunks = (
+            (",\n" if number else "[\n")
+            + json.dumps(task.to_dict(), ensure_ascii=False)
+            for number, task in enumerate(tasks)
+        )
+        count = write_buffered(chunks, out)
+        out.write("\n]\n" if count else "[\n]\n")
+        return count
+    if fmt == "ndjson":
+        return write_buffered(render_tasks(tasks, "ndjson"), out)
+    if fmt == "csv":
+        import csv
+
+        writer = csv.writer(out, lineterminator="\n")
+        writer.writerow(TASK_FIELDS)
+        count = 0
+        for count, task in enumerate(tasks, 1):
+            row = task.to_row()
+            # completed пишется как 1/0, а не True/False
+            writer.writerow(row[:4] + (int(row[4]),) + row[5:])
+        return count
+    raise ValueError(f"неизвестный формат: {fmt}")
+
+
+def with_progress(
+    items: Iterable[Any], progress: Optional[Callable[[int], None]], every: int
+) -> Iterator[Any]:
+    """Пропустить элементы дальше, сообщая progress(число) каждые every штук
+
+    В конце progress вызывается с итоговым числом элементов.
+    """
+    if progress is None:
+        yield from items
+        return
+    count = 0
+    for count, item in enumerate(items, 1):
+        yield item
+        if count % every == 0:
+            progress(count)
+    if count % every or not count:
+        progress(count)
+
+
+def file_crc(filename: str, chunk_size: int = 1024 * 1024) -> int:
+    """Посчитать CRC32 файла, читая его по частям"""
+    crc = 0
+    with open(filename, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            crc = zlib.crc32(chunk, crc)
+    return crc
+
+
+@contextmanager
+def lock_file(filename: str, exclusive: bool) -> Iterator[None]:
+    """Рекомендательная блокировка файла filename между процессами
+
+    Без fcntl (например, в Windows) ничего не блокирует.
+    """
+    if fcntl is None:
+        yield
+        return
+    with open(filename, "a+b") as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def atomic_write(filename: str, data: Union[bytes, Iterable[bytes]]) -> None:
+    """Атомарно заменить содержимое файла
+
+    Данные (байты или куски байтов) пишутся во временный файл в том же
+    каталоге, сбрасываются на диск и переименовываются поверх старого файла.
+    При сбое остаётся либо старая, либо новая версия целиком.
+    """
+    directory = os.path.dirname(os.path.abspath(filename))
+    # Имя уникально для потока процесса, поэтому параллельные записи
+    # не пересекаются; остаток после сбоя того же потока просто затирается
+    temp_name = f"{filename}.{os.getpid()}-{threading.get_ident()}.tmp"
+    fd = os.open(temp_name, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            if isinstance(data, bytes):
+                f.write(data)
+            else:
+                f.writelines(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_name, filename)
+    except BaseException:
+        if os.path.exists(temp_name):
+            os.remove(temp_name)
+        raise
+
+    # Сбрасываем и запись каталога, иначе переименование может потеряться
+    try:
+        dir_fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(dir_fd)
+    except OSError:
+        pass
+    finally:
+        os.close(dir_fd)
+
+
+def render_tasks(
+    tasks: Iterable["Task"], fmt: str = "text", archived_ids: Iterable[int] = ()
+) -> Iterator[str]:
+    """Представить задачи текстом по одному куску на задачу
+
+    Форматы: text — как в меню, tsv — строка с полями через табуляцию,
+    ndjson — объект JSON на строку. Задачи берутся из tasks по мере вывода.
+    """
+    if fmt == "text":
+        archived_ids = set(archived_ids)
+        for task in tasks:
+            if task.id in archived_ids:
+                yield f"\nЗадача #{task.id} (в архиве):\n{task.show()}\n"
+            else:
+                yield task._list_entry()
+    elif fmt == "tsv":
+        for task in tasks:
+            status = "выполнено" if task.completed else "не выполнено"
+            yield (
+                f"{task.id}\t{status}\t{task.priority}\t"
+                f"{task.due_date}\t{task.title}\n"
+            )
+    elif fmt == "ndjson":
+        for task in tasks:
+            yield json.dumps(task.to_dict(), ensure_ascii=False) + "\n"
+    else:
+        raise ValueError(f"неизвестный формат вывода: {fmt}")
+
+
+def write_buffered(
+    chunks: Iterable[str], out: Optional[TextIO] = None, buffer_size: int = 64 * 1024
+) -> int:
+    """Записать куски текста крупными порциями; вернуть число кусков
+
+    По умолчанию пишет в текущий sys.stdout.
+    """
+    if out is None:
+        out = sys.stdout
+    buffer: List[str] = []
+    size = 0
+    count = 0
+    for chunk in chunks:
+        buffer.append(chunk)
+        size += len(chunk)
+        count += 1
+        if size >= buffer_size:
+            out.write("".join(buffer))
+            buffer = []
+            size = 0
+    if buffer:
+        out.write("".join(buffer))
+    return count
+
+
+def parse_due_date(value: str) -> str:
+    """Проверить срок и привести его к виду ГГГГ-ММ-ДД ("" — срока нет)
+
+    Для неверной даты выбрасывает ValueError.
+    """
+    value = value.strip()
+    if not value:
+        return ""
+    return date.fromisoformat(value).isoformat()
+
+
+def _is_due_date(value: str) -> bool:
+    """Записан ли срок как дата ГГГГ-ММ-ДД (в старых файлах бывает что угодно)"""
+    try:
+        return date.fromisoformat(value).isoformat() == value
+    except ValueError:
+        return False
+
+
+def _discard_sorted(items: List[Any], item: Any) -> None:
+    """Удалить элемент из отсортированного списка, если он там есть"""
+    position = bisect_left(items, item)
+    if position < len(items) and items[position] == item:
+        del items[position]
+
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Разбить текст на слова для поиска: нижний регистр, ё приравнена к е"""
+    # casefold, а не lower: одинаково приводит и кириллицу, и латиницу (ß -> ss)
+    return _WORD_RE.findall(text.casefold().replace("ё", "е"))
+
+
+def rank_matches(
+    tasks: Iterable["Task"], words: List[str], limit: Optional[int] = None
+) -> List["Task"]:
+    """Отобрать задачи, в названии которых есть все слова запроса (как начала
+    слов), и упорядочить: сначала больше точных совпадений, затем по номеру
+    """
+    if not words:
+        return []
+    scored = []
+    for task in tasks:
+        score = _match_score(words, tokenize(task.title))
+        if score:
+            scored.append((-score, task.id, task))
+    return [task for _, _, task in _top(scored, limit)]
+
+
+def _match_score(words: Iterable[str], title_words: List[str]) -> int:
+    """2 за каждое слово запроса, найденное целиком, 1 — за найденное как
+    начало слова; 0, если какого-то слова нет
+    """
+    score = 0
+    for word in words:
+        if word in title_words:
+            score += 2
+        elif any(title_word.startswith(word) for title_word in title_words):
+            score += 1
+        else:
+            return 0
+    return score
+
+
+def _top(scored: List[tuple], limit: Optional[int]) -> List[tuple]:
+    """Лучшие элементы (минус оценка, id, ...) по возрастанию"""
+    if limit is None:
+        return sorted(scored, key=lambda item: item[:2])
+    return nsmallest(limit, scored, key=lambda item: item[:2])
+
+
+class TitleIndex:
+    """Инвертированный индекс слов названий задач
+
+    Слово -> упорядоченное множество id задач (словарь со значениями None),
+    плюс отсортированный список слов для поиска по началу слова.
+    """
+
+    def __init__(self):
+        self._postings: Dict[str, Dict[int, None]] = {}
+        self._words: List[str] = []
+
+    def build(self, tasks: Iterable["Task"]) -> None:
+        """Заполнить индекс заново; список слов сортируется один раз"""
+        postings: Dict[str, Dict[int, None]] = {}
+        for task in tasks:
+            for word in tokenize(task.title):
+                bucket = postings.get(word)
+                if bucket is None:
+                    bucket = postings[word] = {}
+                bucket[task.id] = None
+        self._postings = postings
+        self._words = sorted(postings)
+
+    def add(self, task_id: int, title: str) -> None:
+        for word in tokenize(title):
+            bucket = self._postings.get(word)
+            if bucket is None:
+                bucket = self._postings[word] = {}
+                insort(self._words, word)
+            bucket[task_id] = None
+
+    def remove(self, task_id: int, title: str) -> None:
+        for word in tokenize(title):
+            bucket = self._postings.get(word)
+            if bucket is None:
+                continue
+            bucket.pop(task_id, None)
+            if not bucket:
+                del self._postings[word]
+                del self._words[bisect_left(self._words, word)]
+
+    def exact(self, word: str) -> Dict[int, None]:
+        """id задач, в названии которых есть ровно такое слово"""
+        return self._postings.get(word, {})
+
+    def candidates(self, prefix: str) -> Dict[int, None]:
+        """id задач, в названии которых есть слово, начинающееся с prefix"""
+        start, end = self._range(prefix)
+        if end - start == 1:
+            return self._postings[self._words[start]]
+        result: Dict[int, None] = {}
+        for word in self._words[start:end]:
+            result.update(self._postings[word])
+        return result
+
+    def estimate(self, prefix: str, at_most: float = float("inf")) -> float:
+        """Оценка числа кандидатов для prefix сверху; считать дальше
+        at_most не нужно — такое слово всё равно не будет самым редким
+        """
+        start, end = self._range(prefix)
+        total = 0
+        for word in self._words[start:end]:
+            total += len(self._postings[word])
+            if total > at_most:
+                break
+        return total
+
+    def _range(self, prefix: str) -> Tuple[int, int]:
+        start = bisect_left(self._words, prefix)
+        return start, bisect_left(self._words, prefix + "\U0010ffff", start)
+
+
+# Приоритеты по возрастанию: в запросах сравниваются номера, а не строки
+PRIORITY_RANK = {"низкий": 0, "средний": 1, "высокий": 2}
+
+_STATUS_VALUES = {
+    "pending": False,
+    "невыполненные": False,
+    "done": True,
+    "выполненные": True,
+}
+_OPERATORS: Dict[str, Callable[[Any, Any], bool]] = {
+    "=": operator.eq,
+    "!=": operator.ne,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+}
+
+
+class Query:
+    """Запрос к задачам: условия, сортировка и страница в одной строке
+
+    Пример: status=pending priority>=средний due<2026-11-01 sort=due,-priority
+    limit=50. Поля условий: status (pending/done), priority, due (дата или
+    none), created (дата создания), id и title~слова (как в search).
+    Операторы: = != < <= > >=. Строка разбирается один раз: условия
+    превращаются в функции проверки, поля сортировки — в ключи.
+    """
+
+    _TERM_RE = re.compile(r"([a-z]+)(<=|>=|!=|=|<|>|~)(.*)", re.S)
+    SORT_FIELDS = ("id", "title", "priority", "due", "created", "status")
+
+    def __init__(self, text: str):
+        import shlex
+
+        # Условия в разобранном виде: (поле, оператор, значение)
+        self.conditions: List[Tuple[str, str, Any]] = []
+        # Поля сортировки: (поле, по убыванию)
+        self.sort: List[Tuple[str, bool]] = []
+        self.limit: Optional[int] = None
+        self.offset = 0
+        try:
+            terms = shlex.split(text)
+        except ValueError as e:
+            raise ValueError(f"ошибка в запросе: {e}") from None
+        for term in terms:
+            match = self._TERM_RE.fullmatch(term)
+            if match is None:
+                raise ValueError(f"непонятное условие: {term}")
+            field, op, value = match.groups()
+            if field == "sort" and op == "=":
+                self.sort.extend(self._parse_sort(value))
+            elif field in ("limit", "offset") and op == "=":
+                number = self._parse_int(field, value)
+                setattr(self, field, number)
+            else:
+                self.conditions.append(self._parse_condition(field, op, value))
+        self._checks = [self._compile(*condition) for condition in self.conditions]
+        self._sort_keys = [
+            (self._sort_key(field, descending), descending)
+            for field, descending in self.sort
+        ]
+
+    def matches(self, task: "Task") -> bool:
+        """Подходит ли задача под все условия"""
+        for check in self._checks:
+            if not check(task):
+                return False
+        return True
+
+    def apply(
+        self, candidates: Iterable["Task"], ordered: bool, presorted: bool = False
+    ) -> List["Task"]:
+        """Отфильтровать, упорядочить и обрезать кандидатов
+
+        ordered — кандидаты идут по возрастанию номера, presorted — уже в
+        порядке sort=; тогда обход останавливается на последней нужной задаче.
+        """
+        tasks: Iterable[Task] = filter(self.matches, candidates)
+        stop = None if self.limit is None else self.offset + self.limit
+        if presorted:
+            return list(islice(tasks, self.offset, stop))
+        if not self.sort:
+            if not ordered:
+                tasks = sorted(tasks, key=lambda task: task.id)
+            return list(islice(tasks, self.offset, stop))
+        items = list(tasks)
+        if not ordered:
+            items.sort(key=lambda task: task.id)
+        # Сортировка устойчива: от последнего ключа к первому, номер — последним
+        for key, descending in reversed(self._sort_keys):
+            items.sort(key=key, reverse=descending)
+        return items[self.offset : stop]
+
+    def first(self, field: str, *ops: str) -> Any:
+        """Значение первого условия по полю с одним из операторов (или None)"""
+        for name, op, value in self.conditions:
+            if name == field and op in ops:
+                return value
+        return None
+
+    def __str__(self) -> str:
+        terms = [self._format(*condition) for condition in self.conditions]
+        if self.sort:
+            fields = ",".join(
+                f"-{field}" if descending else field for field, descending in self.sort
+            )
+            terms.append(f"sort={fields}")
+        if self.limit is not None:
+            terms.append(f"limit={self.limit}")
+        if self.offset:
+            terms.append(f"offset={self.offset}")
+        return " ".join(terms)
+
+    def _parse_condition(self, field: str, op: str, value: str) -> Tuple[str, str, Any]:
+        if field == "title":
+            if op != "~":
+                raise ValueError("для title есть только оператор ~")
+            return field, op, tokenize(value)
+        if op == "~":
+            raise ValueError(f"оператор ~ только для title, а не {field}")
+        if field == "status":
+            completed = _STATUS_VALUES.get(value.lower())
+            if completed is None or op not in ("=", "!="):
+                raise ValueError("status: pending или done через = или !=")
+            # status!=done — то же, что status=pending
+            return field, "=", completed if op == "=" else not completed
+        if field == "priority":
+            rank = PRIORITY_RANK.get(value.lower())
+            if rank is None:
+                raise ValueError(
+                    f"приоритет должен быть один из: {', '.join(PRIORITY_RANK)}"
+                )
+            return field, op, rank
+        if field == "due" and value.lower() in ("none", "нет"):
+            if op not in ("=", "!="):
+                raise ValueError("due=none и due!=none сравнивают только с =, !=")
+            return field, op, ""
+        if field in ("due", "created"):
+            try:
+                return field, op, parse_due_date(value)
+            except ValueError:
+                raise ValueError(f"{field}: нужна дата ГГГГ-ММ-ДД, а не {value}")
+        if field == "id":
+            return field, op, self._parse_int(field, value)
+        raise ValueError(f"неизвестное поле: {field}")
+
+    @staticmethod
+    def _parse_int(field: str, value: str) -> int:
+        try:
+            number = int(value)
+        except ValueError:
+            number = -1
+        if number < 0:
+            raise ValueError(f"{field}: нужно неотрицательное целое, а не {value}")
+        return number
+
+    def _parse_sort(self, value: str) -> List[Tuple[str, bool]]:
+        result = []
+        for item in value.split(","):
+            descending = item.startswith("-")
+            field = item.lstrip("-")
+            if field not in self.SORT_FIELDS:
+                raise ValueError(f"сортировать можно по: {', '.join(self.SORT_FIELDS)}")
+            result.append((field, descending))
+        return result
+
+    @staticmethod
+    def _compile(field: str, op: str, value: Any) -> Callable[["Task"], bool]:
+        """Превратить условие в функцию проверки задачи"""
+        compare = _OPERATORS.get(op)
+        if field == "status":
+            return lambda task: task.completed == value
+        if field == "priority":
+            ranks = PRIORITY_RANK
+            return lambda task: compare(ranks.get(task.priority, -1), value)
+        if field == "due":
+            if not value:
+                # due=none / due!=none
+                return lambda task: compare(task.due_date, "")
+            # Задачи без срока не раньше и не позже любой даты
+            return lambda task: bool(task.due_date) and compare(task.due_date, value)
+        if field == "created":
+            return lambda task: compare(task.created_at[:10], value)
+        if field == "id":
+            return lambda task: compare(task.id, value)
+        words = value
+        if not words:
+            # title~"" без слов подходит к любой задаче (как и в плане запроса)
+            return lambda task: True
+        return lambda task: _match_score(words, tokenize(task.title)) > 0
+
+    @staticmethod
+    def _sort_key(field: str, descending: bool) -> Callable[["Task"], Any]:
+        if field == "priority":
+            return lambda task: PRIORITY_RANK.get(task.priority, -1)
+        if field == "due":
+            # Задачи без срока — в конце при любом направлении
+            if descending:
+                return lambda task: (task.due_date != "", task.due_date)
+            return lambda task: (task.due_date == "", task.due_date)
+        if field == "title":
+            return lambda task: task.title.casefold()
+        if field == "created":
+            return lambda task: task.created_at
+        if field == "status":
+            return lambda task: task.completed
+        return lambda task: task.id
+
+    @staticmethod
+    def _format(field: str, op: str, value: Any) -> str:
+        if field == "status":
+            return f"status={'done' if value else 'pending'}"
+        if field == "priority":
+            return f"priority{op}{list(PRIORITY_RANK)[value]}"
+        if field == "title":
+            return f'title~"{" ".join(value)}"'
+        if field == "due" and not value:
+            return f"due{op}none"
+        return f"{field}{op}{value}"
+
+
+# Скомпилированные запросы по их тексту: повторный запрос не разбирается заново
+compile_query = functools.lru_cache(maxsize=256)(Query)
+
+
+class QueryPlan:
+    """Выбранный способ получить кандидатов для запроса"""
+
+    def __init__(
+        self,
+        description: str,
+        estimate: int,
+        candidates: Callable[[], Iterable["Task"]],
+        ordered: bool,
+        presorted: bool = False,
+    ):
+        # Что выбрано — для explain
+        self.description = description
+        # Сколько задач придётся проверить (оценка сверху)
+        self.estimate = estimate
+        self.candidates = candidates
+        # Идут ли кандидаты по возрастанию номера
+        self.ordered = ordered
+        # Идут ли кандидаты уже в порядке sort= запроса
+        self.presorted = presorted
+
+    def __repr__(self) -> str:
+        return f"QueryPlan({self.description!r}, estimate={self.estimate})"
+
+
+class TaskStorage:
+    """Базовый класс хранилища задач, с которым работает TaskManager"""
+
+    # True, если хранилище само сохраняет каждое изменение на диск
+    # и TaskManager не нужно перезаписывать JSON-файл
+    persistent = False
+
+    def __init__(self):
+        # Обработчик изменений полей, который назначается загруженным задачам
+        self._on_change: Optional[Callable[[Task, str, Any], None]] = None
+
+    def attach(self, on_change: Callable[[Task, str, Any], None]) -> None:
+        """Назначить обработчик изменений задач (вызывает TaskManager)"""
+        self._on_change = on_change
+
+    def get(self, task_id: int) -> Optional[Task]:
+        """Найти задачу по идентификатору"""
+        raise NotImplementedError
+
+    def insert(self, task: Task) -> None:
+        """Добавить задачу, назначив ей идентификатор, если его нет"""
+        raise NotImplementedError
+
+    def delete(self, task_id: int) -> Optional[Task]:
+        """Удалить задачу и вернуть её (или None, если её нет)"""
+        raise NotImplementedError
+
+    def replace_all(self, tasks: Iterable[Task]) -> None:
+        """Заменить всё содержимое хранилища"""
+        raise NotImplementedError
+
+    def query(
+        self,
+        completed: Optional[bool] = None,
+        priority: Optional[str] = None,
+        due_before: Optional[str] = None,
+    ) -> List[Task]:
+        """Найти задачи по фильтрам в порядке добавления"""
+        raise NotImplementedError
+
+    def search(self, words: List[str], limit: Optional[int] = None) -> List[Task]:
+        """Найти задачи по словам названия (см. rank_matches)"""
+        return rank_matches(self, words, limit)
+
+    def plan(self, query: Query) -> QueryPlan:
+        """Выбрать, как получить кандидатов для запроса
+
+        По умолчанию равенства по статусу и приоритету и верхняя граница
+        срока передаются в query() (там их может учесть индекс хранилища),
+        остальные условия запрос проверяет сам.
+        """
+        completed = query.first("status", "=")
+        rank = query.first("priority", "=")
+        priority = None if rank is None else list(PRIORITY_RANK)[rank]
+        due_before = query.first("due", "<") or None
+        if completed is None and priority is None and due_before is None:
+            return QueryPlan("полный просмотр", len(self), lambda: iter(self), True)
+        arguments = ", ".join(
+            f"{name}={value!r}"
+            for name, value in (
+                ("completed", completed),
+                ("priority", priority),
+                ("due_before", due_before),
+            )
+            if value is not None
+        )
+        return QueryPlan(
+            f"query({arguments})",
+            len(self),
+            lambda: self.query(completed, priority, due_before),
+            True,
+        )
+
+    def deadlines(
+        self,
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+        limit: Optional[int] = None,
+    ) -> List[Task]:
+        """Невыполненные задачи со сроком от start (включительно) до end
+        (не включая) в порядке срока, затем номера
+        """
+        tasks = [
+            task
+            for task in self
+            if not task.completed
+            and _is_due_date(task.due_date)
+            and (start is None or task.due_date >= start)
+            and (end is None or task.due_date < end)
+        ]
+        tasks.sort(key=lambda task: (task.due_date, task.id))
+        return tasks if limit is None else tasks[:limit]
+
+    def page(self, offset: int, stop: Optional[int]) -> Iterator[Task]:
+        """Задачи с offset-й по stop-ю (не включая) в порядке номеров"""
+        return islice(self, offset, stop)
+
+    def task_changed(self, task: Task, field: str, old: Any) -> None:
+        """Учесть изменение поля задачи"""
+
+    def reserve_ids(self, next_id: int) -> None:
+        """Не выдавать новым задачам идентификаторы меньше next_id
+
+        Нужно, когда задачи с такими идентификаторами хранятся вне хранилища
+        (например, в архиве).
+        """
+
+    def flush(self) -> None:
+        """Записать накопленные изменения на диск"""
+
+    def begin_batch(self) -> None:
+        """Начать пакет изменений (например, транзакцию)"""
+
+    def end_batch(self) -> None:
+        """Завершить пакет изменений"""
+
+    def close(self) -> None:
+        """Освободить ресурсы хранилища"""
+
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+    def __iter__(self) -> Iterator[Task]:
+        raise NotImplementedError
+
+
+class MemoryStorage(TaskStorage):
+    """Хранилище задач в памяти с вторичными индексами
+
+    Сохраняется на диск через TaskManager.save_to_file в формате JSON.
+    """
+
+    def __init__(self):
+        super().__init__()
+        # Индекс id -> задача; словарь сохраняет порядок добавления
+        self._tasks: Dict[int, Task] = {}
+        self._next_id = 0
+        # Нижняя граница для новых идентификаторов (см. reserve_ids)
+        self._reserved_id = 0
+        # Вторичные индексы: словари используются как упорядоченные множества id
+        self._by_status: Dict[bool, Dict[int, None]] = {True: {}, False: {}}
+        self._by_priority: Dict[str, Dict[int, None]] = {}
+        # Отсортированный список (срок, id) для задач со сроком
+        self._due_index: List[Tuple[str, int]] = []
+        # Очередь сроков: такой же список только для невыполненных задач
+        # с правильной датой; даты проверяются один раз при добавлении в него
+        self._deadlines: List[Tuple[str, int]] = []
+        # Внутри пакета записи дописываются в конец списков сроков, а
+        # сортируются один раз — в конце пакета или перед первым чтением
+        self._batch_depth = 0
+        self._unsorted = False
+        # Индекс слов названий строится при первом поиске, дальше
+        # обновляется вместе с остальными индексами
+        self._title_index: Optional[TitleIndex] = None
+
+    def get(self, task_id: int) -> Optional[Task]:
+        return self._tasks.get(task_id)
+
+    def insert(self, task: Task) -> None:
+        if task.id is None:
+            task.id = self._next_id
+        self._next_id = max(self._next_id, task.id + 1)
+        self._tasks[task.id] = task
+        self._index_field(task, "completed", task.completed)
+        self._index_field(task, "priority", task.priority)
+        self._index_field(task, "due_date", task.due_date)
+        self._index_field(task, "title", task.title)
+        self._index_deadline(task)
+        task._on_change = self._on_change
+
+    def delete(self, task_id: int) -> Optional[Task]:
+        task = self._tasks.pop(task_id, None)
+        if task is None:
+            return None
+        task._on_change = None
+        self._sort_indexes()
+        self._unindex_field(task, "completed", task.completed)
+        self._unindex_field(task, "priority", task.priority)
+        self._unindex_field(task, "due_date", task.due_date)
+        self._unindex_field(task, "title", task.title)
+        _discard_sorted(self._deadlines, (task.due_date, task.id))
+        return task
+
+    def replace_all(self, tasks: Iterable[Task]) -> None:
+        for task in self._tasks.values():
+            task._on_change = None
+        self._tasks = {}
+        self._next_id = 0
+        self._by_status = {True: {}, False: {}}
+        self._by_priority = {}
+        self._due_index = []
+        self._deadlines = []
+        self._unsorted = False
+        self._title_index = None
+        tasks = list(tasks)
+        # Сначала учитываем уже назначенные идентификаторы, чтобы новые
+        # не совпали с ними
+        known_ids = [task.id for task in tasks if task.id is not None]
+        next_id = max(known_ids) + 1 if known_ids else 0
+
+        # Индексы заполняем напрямую, а список сроков сортируем один раз
+        # в конце — это намного быстрее вставки задач по одной
+        by_status = self._by_status
+        by_priority = self._by_priority
+        due_index = self._due_index
+        deadlines = self._deadlines
+        for task in tasks:
+            task_id = task.id
+            if task_id is None or task_id in self._tasks:
+                task_id = task.id = next_id
+                next_id += 1
+            self._tasks[task_id] = task
+            by_status[bool(task.completed)][task_id] = None
+            bucket = by_priority.get(task.priority)
+            if bucket is None:
+                bucket = by_priority[task.priority] = {}
+            bucket[task_id] = None
+            if task.due_date:
+                due_index.append((task.due_date, task_id))
+                if not task.completed and _is_due_date(task.due_date):
+                    deadlines.append((task.due_date, task_id))
+            task._on_change = self._on_change
+        due_index.sort()
+        deadlines.sort()
+        self._next_id = max(next_id, self._reserved_id)
+
+    def query(
+        self,
+        completed: Optional[bool] = None,
+        priority: Optional[str] = None,
+        due_before: Optional[str] = None,
+    ) -> List[Task]:
+        """Найти задачи по фильтрам
+
+        Кандидаты берутся из самого маленького подходящего индекса, поэтому
+        стоимость запроса зависит от размера результата, а не всего списка.
+        """
+        candidates: List[Iterable[int]] = []
+        if completed is not None:
+            candidates.append(self._by_status[completed])
+        if priority is not None:
+            candidates.append(self._by_priority.get(priority.lower(), {}))
+        if due_before is not None:
+            self._sort_indexes()
+            end = bisect_left(self._due_index, (due_before,))
+            candidates.append([task_id for _, task_id in self._due_index[:end]])
+        if not candidates:
+            return list(self._tasks.values())
+
+        smallest = min(candidates, key=len)
+        result = []
+        for task_id in smallest:
+            task = self._tasks[task_id]
+            if completed is not None and task.completed != completed:
+                continue
+            if priority is not None and task.priority != priority.lower():
+                continue
+            if due_before is not None and not (
+                task.due_date and task.due_date < due_before
+            ):
+                continue
+            result.append(task)
+        # Идентификаторы растут с каждым добавлением — это порядок добавления
+        result.sort(key=lambda task: task.id)
+        return result
+
+    def search(self, words: List[str], limit: Optional[int] = None) -> List[Task]:
+        """Найти задачи по словам названия через инвертированный индекс
+
+        Кандидатов даёт самое редкое слово запроса; с остальными словами
+        они пересекаются как множества, а слово, у которого кандидатов во
+        много раз больше, проверяется по названиям уже отобранных задач.
+        """
+        if not words:
+            return []
+        index = self._title_index
+        if index is None:
+            index = self._title_index = TitleIndex()
+            index.build(self._tasks.values())
+
+        inf = float("inf")
+        sizes: Dict[str, float] = {}
+        for word in words:
+            sizes[word] = index.estimate(word, min(sizes.values(), default=inf))
+        ordered = sorted(words, key=sizes.__getitem__)
+        found = index.candidates(ordered[0])
+        ids: Any = found.keys()
+        # Все ли слова совпали только целиком: тогда оценки у всех равны
+        only_exact = found is index.exact(ordered[0])
+        intersected = 1
+        for word in ordered[1:]:
+            if len(ids) * 4 < sizes[word]:
+                break
+            found = index.candidates(word)
+            only_exact = only_exact and found is index.exact(word)
+            ids = ids & found.keys()
+            intersected += 1
+        exact = [index.exact(word) for word in ordered[:intersected]]
+        rest = ordered[intersected:]
+
+        tasks = self._tasks
+        if only_exact and not rest:
+            # Порядок — только по номеру: сортировка целых без подсчёта оценок
+            top = sorted(ids) if limit is None else nsmallest(limit, ids)
+            return [tasks[task_id] for task_id in top]
+        scored = []
+        for task_id in ids:
+            score = 0
+            for postings in exact:
+                score += 2 if task_id in postings else 1
+            if rest:
+                rest_score = _match_score(rest, tokenize(tasks[task_id].title))
+                if not rest_score:
+                    continue
+                score += rest_score
+            scored.append((-score, task_id))
+        return [tasks[task_id] for _, task_id in _top(scored, limit)]
+
+    def plan(self, query: Query) -> QueryPlan:
+        """Выбрать индекс с наименьшим числом кандидатов
+
+        Кандидатов считают точно (размер множества или отрезка списка сроков)
+        или сверху (индекс слов); если ни один индекс не меньше всего списка,
+        остаётся полный просмотр.
+        """
+        tasks = self._tasks
+        plans = [QueryPlan("полный просмотр", len(tasks), tasks.values, True)]
+        for field, op, value in query.conditions:
+            if field == "id" and op == "=":
+                plans.append(
+                    QueryPlan(
+                        f"по номеру {value}",
+                        int(value in tasks),
+                        lambda value=value: [tasks[value]] if value in tasks else [],
+                        True,
+                    )
+                )
+            elif field == "status":
+                bucket = self._by_status[value]
+                plans.append(
+                    QueryPlan(
+                        f"индекс статуса: {'done' if value else 'pending'}",
+                        len(bucket),
+                        lambda bucket=bucket: (tasks[task_id] for task_id in bucket),
+                        False,
+                    )
+                )
+            elif field == "priority" and op != "!=":
+                compare = _OPERATORS[op]
+                names = [
+                    name for name, rank in PRIORITY_RANK.items() if compare(rank, value)
+                ]
+                buckets = [self._by_priority.get(name, {}) for name in names]
+                plans.append(
+                    QueryPlan(
+                        f"индекс приоритета: {', '.join(names)}",
+                        sum(map(len, buckets)),
+                        lambda buckets=buckets: (
+                            tasks[task_id] for bucket in buckets for task_id in bucket
+                        ),
+                        False,
+                    )
+                )
+            elif field == "title":
+                plans.append(self._title_plan(value))
+        due_plan = self._due_plan(query)
+        if due_plan is not None:
+            plans.append(due_plan)
+        best = min(plans, key=lambda plan: plan.estimate)
+        if query.limit is not None and query.sort == [("due", False)]:
+            # Список сроков уже в порядке sort=due: обход можно остановить
+            # после limit подходящих задач и не сортировать. Подходящие задачи
+            # встречаются в нём примерно с частотой best.estimate / размер
+            ordered = due_plan or self._due_plan(query, bounded=False)
+            wanted = query.offset + query.limit
+            expected = wanted * ordered.estimate // max(best.estimate, 1) + 1
+            if expected < best.estimate:
+                best = QueryPlan(
+                    f"{ordered.description} по порядку sort=due, до {wanted} задач",
+                    min(expected, ordered.estimate),
+                    ordered.candidates,
+                    False,
+                    presorted=True,
+                )
+        return best
+
+    def _due_plan(self, query: Query, bounded: bool = True) -> Optional[QueryPlan]:
+        """Отрезок списка сроков по всем условиям due с датой
+
+        Без таких условий при bounded=False — весь список сроков, а после
+        него задачи без срока по номеру (порядок sort=due).
+        """
+        self._sort_indexes()
+        due_index = self._due_index
+        low, high = 0, len(due_index)
+        bounds = []
+        inf = float("inf")
+        for field, op, value in query.conditions:
+            if field != "due" or not value or op == "!=":
+                continue
+            bounds.append(f"due{op}{value}")
+            # (value,) стоит перед всеми записями с этой датой, (value, inf) — после
+            if op in (">=", "="):
+                low = max(low, bisect_left(due_index, (value,)))
+            elif op == ">":
+                low = max(low, bisect_left(due_index, (value, inf)))
+            if op == "<":
+                high = min(high, bisect_left(due_index, (value,)))
+            elif op in ("<=", "="):
+                high = min(high, bisect_left(due_index, (value, inf)))
+        tasks = self._tasks
+        if not bounds:
+            if bounded:
+                return None
+            return QueryPlan(
+                "индекс сроков",
+                len(tasks),
+                lambda: chain(
+                    (tasks[task_id] for _, task_id in due_index),
+                    (task for task in tasks.values() if not task.due_date),
+                ),
+                False,
+            )
+        return QueryPlan(
+            f"индекс сроков: {', '.join(bounds)}",
+            max(high - low, 0),
+            lambda: (tasks[task_id] for _, task_id in due_index[low:high]),
+            False,
+        )
+
+    def _title_plan(self, words: List[str]) -> QueryPlan:
+        """Кандидаты из индекса слов по самому редкому слову"""
+        if not words:
+            # title~"" без слов подходит к любой задаче
+            return QueryPlan(
+                "полный просмотр", len(self._tasks), self._tasks.values, True
+            )
+        index = self._title_index
+        if index is None:
+            index = self._title_index = TitleIndex()
+            index.build(self._tasks.values())
+        word = min(words, key=index.estimate)
+        tasks = self._tasks
+        return QueryPlan(
+            f"индекс слов: {word}",
+            int(index.estimate(word)),
+            lambda: (tasks[task_id] for task_id in index.candidates(word)),
+            False,
+        )
+
+    def deadlines(
+        self,
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+        limit: Optional[int] = None,
+    ) -> List[Task]:
+        """Невыполненные задачи со сроком в [start, end) по очереди сроков"""
+        self._sort_indexes()
+        deadlines = self._deadlines
+        low = 0 if start is None else bisect_left(deadlines, (start,))
+        high = len(deadlines) if end is None else bisect_left(deadlines, (end,))
+        if limit is not None:
+            high = min(high, low + limit)
+        return [self._tasks[task_id] for _, task_id in deadlines[low:high]]
+
+    def reserve_ids(self, next_id: int) -> None:
+        self._reserved_id = max(self._reserved_id, next_id)
+        self._next_id = max(self._next_id, next_id)
+
+    def task_changed(self, task: Task, field: str, old: Any) -> None:
+        """Перестроить записи индексов для изменившегося поля задачи"""
+        if field in ("completed", "due_date"):
+            self._sort_indexes()
+        self._unindex_field(task, field, old)
+        self._index_field(task, field, getattr(task, field))
+        if field in ("completed", "due_date"):
+            # Место в очереди сроков зависит от обоих полей
+            due_date = old if field == "due_date" else task.due_date
+            _discard_sorted(self._deadlines, (due_date, task.id))
+            self._index_deadline(task)
+
+    def _index_deadline(self, task: Task) -> None:
+        if not task.completed and task.due_date and _is_due_date(task.due_date):
+            self._add_sorted(self._deadlines, (task.due_date, task.id))
+
+    def _add_sorted(
+        self, entries: List[Tuple[str, int]], entry: Tuple[str, int]
+    ) -> None:
+        """Вставить запись в список сроков (внутри пакета — дописать в конец)"""
+        if self._batch_depth:
+            entries.append(entry)
+            self._unsorted = True
+        else:
+            insort(entries, entry)
+
+    def _sort_indexes(self) -> None:
+        """Упорядочить списки сроков, если в пакете в них дописывали"""
+        if self._unsorted:
+            # Отсортированное начало и дописанный хвост timsort сливает
+            # за один проход
+            self._due_index.sort()
+            self._deadlines.sort()
+            self._unsorted = False
+
+    def begin_batch(self) -> None:
+        self._batch_depth += 1
+
+    def end_batch(self) -> None:
+        self._batch_depth -= 1
+        if self._batch_depth == 0:
+            self._sort_indexes()
+
+    def __len__(self) -> int:
+        return len(self._tasks)
+
+    def __iter__(self) -> Iterator[Task]:
+        return iter(self._tasks.values())
+
+    def _index_field(self, task: Task, field: str, value: Any) -> None:
+        if field == "completed":
+            self._by_status[bool(value)][task.id] = None
+        elif field == "priority":
+            self._by_priority.setdefault(value, {})[task.id] = None
+        elif field == "due_date" and value:
+            self._add_sorted(self._due_index, (value, task.id))
+        elif field == "title" and self._title_index is not None:
+            self._title_index.add(task.id, value)
+
+    def _unindex_field(self, task: Task, field: str, value: Any) -> None:
+        if field == "completed":
+            self._by_status[bool(value)].pop(task.id, None)
+        elif field == "priority":
+            bucket = self._by_priority.get(value)
+            if bucket is not None:
+                bucket.pop(task.id, None)
+                if not bucket:
+                    del self._by_priority[value]
+        elif field == "due_date" and value:
+            _discard_sorted(self._due_index, (value, task.id))
+        elif field == "title" and self._title_index is not None:
+            self._title_index.remove(task.id, value)
+
+
+class LazyMemoryStorage(MemoryStorage):
+    """Хранилище в памяти, которое строит задачи по мере обращения к ним
+
+    Задачи из файла читаются потоком: объекты Task создаются только тогда,
+    когда до них дошёл обход списка или поиск по идентификатору. Операции,
+    которым нужен весь список (подсчёт, фильтры, добавление), дочитывают
+    файл до конца.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._pending: Optional[Iterator[Task]] = None
+        # Ошибка чтения файла: TaskManager не даст перезаписать такой файл
+        self.load_error: Optional[str] = None
+        # Задачи в порядке чтения из файла (нужен только до конца чтения)
+        self._order: List[Task] = []
+
+    def replace_all(self, tasks: Iterable[Task]) -> None:
+        self._close_pending()
+        super().replace_all([])
+        self._order = []
+        self._pending = iter(tasks)
+
+    def get(self, task_id: int) -> Optional[Task]:
+        while task_id not in self._tasks and self._load_next():
+            pass
+        return super().get(task_id)
+
+    def insert(self, task: Task) -> None:
+        # Новый идентификатор не должен совпасть с ещё не прочитанными
+        self._load_all()
+        super().insert(task)
+
+    def delete(self, task_id: int) -> Optional[Task]:
+        self.get(task_id)
+        return super().delete(task_id)
+
+    def query(
+        self,
+        completed: Optional[bool] = None,
+        priority: Optional[str] = None,
+        due_before: Optional[str] = None,
+    ) -> List[Task]:
+        self._load_all()
+        return super().query(completed, priority, due_before)
+
+    def search(self, words: List[str], limit: Optional[int] = None) -> List[Task]:
+        self._load_all()
+        return super().search(words, limit)
+
+    def deadlines(
+        self,
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+        limit: Optional[int] = None,
+    ) -> List[Task]:
+        self._load_all()
+        return super().deadlines(start, end, limit)
+
+    def plan(self, query: Query) -> QueryPlan:
+        self._load_all()
+        return super().plan(query)
+
+    def close(self) -> None:
+        self._close_pending()
+
+    def __len__(self) -> int:
+        self._load_all()
+        return super().__len__()
+
+    def __iter__(self) -> Iterator[Task]:
+        if self._pending is None:
+            yield from super().__iter__()
+            return
+
+        # Пока файл не дочитан, идём по списку прочитанных задач и дочитываем
+        # следующую, когда он заканчивается; удалённые по пути пропускаем
+        order = self._order
+        position = 0
+        while True:
+            if position < len(order):
+                task = order[position]
+                position += 1
+                if self._tasks.get(task.id) is task:
+                    yield task
+            elif not self._load_next():
+                return
+
+    @property
+    def fully_loaded(self) -> bool:
+        """Прочитан ли файл задач до конца"""
+        return self._pending is None
+
+    def _load_next(self) -> bool:
+        """Прочитать одну задачу из файла; False, если файл закончился"""
+        if self._pending is None:
+            return False
+        try:
+            task = next(self._pending)
+        except StopIteration:
+            self._finish_loading()
+            return False
+        except Exception as e:
+            print(f"Ошибка при загрузке файла: {e}")
+            self.load_error = str(e)
+            self._finish_loading()
+            return False
+
+        if task.id is not None and task.id in self._tasks:
+            task.id = None
+        super().insert(task)
+        self._order.append(task)
+        return True
+
+    def _finish_loading(self) -> None:
+        self._pending = None
+        # Активные обходы держат свою ссылку на список, здесь его можно отпустить
+        self._order = []
+
+    def _load_all(self) -> None:
+        while self._load_next():
+            pass
+
+    def _close_pending(self) -> None:
+        if self._pending is not None and hasattr(self._pending, "close"):
+            self._pending.close()
+        self._finish_loading()
+
+
+class TaskRow(Task):
+    """Лёгкое представление задачи поверх строки ColumnarStorage
+
+    Не хранит поля сам, а читает и пишет их в столбцы хранилища.
+    """
+
+    __slots__ = ("_storage", "_row")
+
+    def __init__(self, storage: "ColumnarStorage", row: int):
+        self._storage = storage
+        self._row = row
+        self._on_change = storage._on_change
+        self._dirty = None
+
+    @property
+    def id(self) -> int:
+        return self._row
+
+    @property
+    def title(self) -> str:
+        return self._storage._titles[self._row]
+
+    @title.setter
+    def title(self, value: str) -> None:
+        self._set("title", value)
+
+    @property
+    def priority(self) -> str:
+        return self._storage._decode_priority(self._row)
+
+    @priority.setter
+    def priority(self, value: str) -> None:
+        self._set("priority", value)
+
+    @property
+    def due_date(self) -> str:
+        return self._storage._decode_due_date(self._row)
+
+    @due_date.setter
+    def due_date(self, value: str) -> None:
+        self._set("due_date", value)
+
+    @property
+    def completed(self) -> bool:
+        return self._storage._completed[self._row]
+
+    @completed.setter
+    def completed(self, value: bool) -> None:
+        # Время выполнения меняется так же, как у Task
+        if value and not self.completed:
+            self.completed_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        elif not value:
+            self.completed_at = ""
+        self._set("completed", value)
+
+    @property
+    def created_at(self) -> str:
+        return self._storage._decode_time("created_at", self._row)
+
+    @property
+    def completed_at(self) -> str:
+        return self._storage._decode_time("completed_at", self._row)
+
+    @completed_at.setter
+    def completed_at(self, value: str) -> None:
+        self._storage._write(self._row, "completed_at", value)
+
+    def show(self) -> str:
+        # Представление создаётся заново при каждом обращении — строку не запоминаем
+        return self._render()
+
+    def _list_entry(self) -> str:
+        return f"\nЗадача #{self.id}:\n{self._render()}\n"
+
+    def _set(self, field: str, value: Any) -> None:
+        old = getattr(self, field)
+        if old == value:
+            return
+        self._storage._write(self._row, field, value)
+        self._mark_dirty(field)
+        if self._on_change is not None:
+            self._on_change(self, field, old)
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, TaskRow):
+            return self._storage is other._storage and self._row == other._row
+        return NotImplemented
+
+    def __hash__(self) -> int:
+        return hash((id(self._storage), self._row))
+
+
+class BitArray:
+    """Компактный массив флагов: один бит на элемент"""
+
+    def __init__(self):
+        self._bytes = bytearray()
+        self._size = 0
+
+    def append(self, value: bool) -> None:
+        if self._size % 8 == 0:
+            self._bytes.append(0)
+        self._size += 1
+        self[self._size - 1] = value
+
+    def __getitem__(self, index: int) -> bool:
+        return bool(self._bytes[index >> 3] & (1 << (index & 7)))
+
+    def __setitem__(self, index: int, value: bool) -> None:
+        if value:
+            self._bytes[index >> 3] |= 1 << (index & 7)
+        else:
+            self._bytes[index >> 3] &= ~(1 << (index & 7)) & 0xFF
+
+    def __len__(self) -> int:
+        return self._size
+
+
+class ColumnarStorage(TaskStorage):
+    """Компактное хранилище задач в параллельных массивах (по столбцу на поле)
+
+    Номер строки совпадает с идентификатором задачи. Приоритет хранится
+    кодом в один байт, статус и признак удаления — битами, даты — целыми
+    числами (срок — порядковым номером дня, создание и выполнение —
+    секундами).
+    Значения, которые нельзя сжать без потерь (нестандартный приоритет или
+    дата в произвольном формате), хранятся отдельно как есть. Задачи
+    возвращаются как TaskRow — представления над строкой без своих полей.
+    """
+
+    _PRIORITIES = ("низкий", "средний", "высокий")
+    _OTHER = 255
+    _NO_DATE = 0
+    _RAW_DATE = -1
+    # Время выполнения у невыполненной задачи (пустая строка)
+    _NO_TIME = -(2**63)
+
+    def __init__(self):
+        super().__init__()
+        self._titles: List[Optional[str]] = []
+        self._priorities = bytearray()
+        self._completed = BitArray()
+        self._alive = BitArray()
+        self._due_dates = array("i")
+        self._created_at = array("q")
+        self._completed_at = array("q")
+        # Значения, не поместившиеся в компактные столбцы: (столбец, строка)
+        self._raw: Dict[Tuple[str, int], str] = {}
+        self._count = 0
+        # Нижняя граница для новых идентификаторов (см. reserve_ids)
+        self._reserved_id = 0
+
+    def get(self, task_id: int) -> Optional[Task]:
+        if 0 <= task_id < len(self._titles) and self._alive[task_id]:
+            return TaskRow(self, task_id)
+        return None
+
+    def insert(self, task: Task) -> None:
+        row = task.id
+        if row is None or row < 0 or (row < len(self._titles) and self._alive[row]):
+            row = len(self._titles)
+        # Пропуски в идентификаторах заполняем удалёнными строками
+        self._extend(row + 1)
+
+        self._alive[row] = True
+        self._count += 1
+        for field in (
+            "title",
+            "priority",
+            "due_date",
+            "completed",
+            "created_at",
+            "completed_at",
+        ):
+            self._write(row, field, getattr(task, field))
+        task.id = row
+
+    def delete(self, task_id: int) -> Optional[Task]:
+        task = self.get(task_id)
+        if task is None:
+            return None
+        # Отдаём отвязанную копию: строка будет переиспользоваться как пустая
+        removed = Task(task.title, task.priority, task.due_date, task.completed)
+        removed.created_at = task.created_at
+        removed.completed_at = task.completed_at
+        removed.id = task_id
+        self._alive[task_id] = False
+        self._titles[task_id] = None
+        for column in ("priority", "due_date", "created_at", "completed_at"):
+            self._raw.pop((column, task_id), None)
+        self._count -= 1
+        return removed
+
+    def replace_all(self, tasks: Iterable[Task]) -> None:
+        on_change = self._on_change
+        reserved = self._reserved_id
+        self.__init__()
+        self._on_change = on_change
+        for task in tasks:
+            self.insert(task)
+        self.reserve_ids(reserved)
+
+    def reserve_ids(self, next_id: int) -> None:
+        # Новые задачи получают номер строки в конце, поэтому достаточно
+        # дополнить столбцы удалёнными строками
+        self._reserved_id = max(self._reserved_id, next_id)
+        self._extend(next_id)
+
+    def _extend(self, rows: int) -> None:
+        """Дополнить столбцы удалёнными строками до rows строк"""
+        while len(self._titles) < rows:
+            self._titles.append(None)
+            self._priorities.append(0)
+            self._completed.append(False)
+            self._alive.append(False)
+            self._due_dates.append(self._NO_DATE)
+            self._created_at.append(0)
+            self._completed_at.append(self._NO_TIME)
+
+    def query(
+        self,
+        completed: Optional[bool] = None,
+        priority: Optional[str] = None,
+        due_before: Optional[str] = None,
+    ) -> List[Task]:
+        """Найти задачи проходом по компактным столбцам"""
+        priority_code = None
+        if priority is not None:
+            priority_code = self._priority_code(priority.lower())
+        due_limit = self._date_ordinal(due_before) if due_before else None
+
+        result: List[Task] = []
+        for row in range(len(self._titles)):
+            if not self._alive[row]:
+                continue
+            if completed is not None and self._completed[row] != completed:
+                continue
+            if priority is not None:
+                if priority_code != self._priorities[row]:
+                    continue
+                if priority_code == self._OTHER and (
+                    self._decode_priority(row) != priority.lower()
+                ):
+                    continue
+            if due_before is not None:
+                ordinal = self._due_dates[row]
+                if ordinal == self._NO_DATE:
+                    continue
+                if ordinal == self._RAW_DATE or due_limit is None:
+                    # Строковое сравнение, как в остальных хранилищах
+                    if not self._decode_due_date(row) < due_before:
+                        continue
+                elif ordinal >= due_limit:
+                    continue
+            result.append(TaskRow(self, row))
+        return result
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __iter__(self) -> Iterator[Task]:
+        for row in range(len(self._titles)):
+            if self._alive[row]:
+                yield TaskRow(self, row)
+
+    def _write(self, row: int, field: str, value: Any) -> None:
+        """Записать значение поля в столбец"""
+        if field == "title":
+            self._titles[row] = value
+        elif field == "completed":
+            self._completed[row] = bool(value)
+        elif field == "priority":
+            code = self._priority_code(value)
+            self._priorities[row] = code
+            self._store_raw("priority", row, value, code == self._OTHER)
+        elif field == "due_date":
+            if not value:
+                ordinal = self._NO_DATE
+            else:
+                ordinal = self._date_ordinal(value)
+                if ordinal is None:
+                    ordinal = self._RAW_DATE
+            self._due_dates[row] = ordinal
+            self._store_raw("due_date", row, value, ordinal == self._RAW_DATE)
+        elif field == "created_at":
+            seconds = self._timestamp(value)
+            self._created_at[row] = seconds if seconds is not None else 0
+            self._store_raw("created_at", row, value, seconds is None)
+        elif field == "completed_at":
+            seconds = self._timestamp(value) if value else self._NO_TIME
+            self._completed_at[row] = seconds if seconds is not None else 0
+            self._store_raw("completed_at", row, value, seconds is None)
+
+    def _store_raw(self, column: str, row: int, value: str, needed: bool) -> None:
+        if needed:
+            self._raw[(column, row)] = value
+        else:
+            self._raw.pop((column, row), None)
+
+    def _priority_code(self, priority: str) -> int:
+        try:
+            return self._PRIORITIES.index(priority)
+        except ValueError:
+            return self._OTHER
+
+    def _decode_priority(self, row: int) -> str:
+        code = self._priorities[row]
+        if code == self._OTHER:
+            return self._raw[("priority", row)]
+        return self._PRIORITIES[code]
+
+    def _decode_due_date(self, row: int) -> str:
+        ordinal = self._due_dates[row]
+        if ordinal == self._NO_DATE:
+            return ""
+        if ordinal == self._RAW_DATE:
+            return self._raw[("due_date", row)]
+        return date.fromordinal(ordinal).isoformat()
+
+    def _decode_time(self, column: str, row: int) -> str:
+        """Время создания или выполнения задачи из столбца секунд"""
+        raw = self._raw.get((column, row))
+        if raw is not None:
+            return raw
+        seconds = getattr(self, "_" + column)[row]
+        if seconds == self._NO_TIME:
+            return ""
+        moment = datetime(1970, 1, 1) + timedelta(seconds=seconds)
+        return moment.strftime("%Y-%m-%d %H:%M:%S")
+
+    @staticmethod
+    def _date_ordinal(value: str) -> Optional[int]:
+        """Номер дня для даты ГГГГ-ММ-ДД, если она обратима без потерь"""
+        try:
+            parsed = date.fromisoformat(value)
+        except (TypeError, ValueError):
+            return None
+        return parsed.toordinal() if parsed.isoformat() == value else None
+
+    @staticmethod
+    def _timestamp(value: str) -> Optional[int]:
+        """Секунды от 1970-01-01 для времени создания или выполнения,
+        если оно обратимо"""
+        try:
+            parsed = datetime.strptime(value, "%Y-%m-%d %H:%M:%S")
+        except (TypeError, ValueError):
+            return None
+        if parsed.strftime("%Y-%m-%d %H:%M:%S") != value:
+            return None
+        return int((parsed - datetime(1970, 1, 1)).total_seconds())
+
+
+class SqliteStorage(TaskStorage):
+    """Хранилище задач в базе SQLite
+
+    Каждое изменение сохраняется одной строкой таблицы, фильтрация выполняется
+    запросами по индексам, а задачи читаются из базы только по требованию,
+    поэтому весь список не держится в памяти. Запросы параметризованы
+    постоянными SQL-строками — модуль sqlite3 кэширует их подготовленные
+    выражения. Идентификаторы, как и в остальных хранилищах, начинаются с 0
+    и не выдаются повторно.
+    """
+
+    persistent = True
+
+    _COLUMNS = "id, title, priority, due_date, completed, created_at, completed_at"
+
+    def __init__(self, filename: str = "tasks.db"):
+        super().__init__()
+        self.filename = filename
+        # Автокоммит: каждое одиночное изменение — отдельная короткая транзакция
+        import sqlite3
+
+        self._conn = sqlite3.connect(
+            filename, isolation_level=None, check_same_thread=False
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS tasks (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                title TEXT NOT NULL,
+                priority TEXT NOT NULL,
+                due_date TEXT NOT NULL DEFAULT '',
+                completed INTEGER NOT NULL DEFAULT 0,
+                created_at TEXT NOT NULL,
+                completed_at TEXT NOT NULL DEFAULT ''
+            );
+            CREATE INDEX IF NOT EXISTS idx_tasks_completed ON tasks (completed, id);
+            CREATE INDEX IF NOT EXISTS idx_tasks_priority ON tasks (priority, id);
+            CREATE INDEX IF NOT EXISTS idx_tasks_due_date ON tasks (due_date)
+                WHERE due_date != '';
+            CREATE INDEX IF NOT EXISTS idx_tasks_deadline ON tasks (due_date, id)
+                WHERE completed = 0 AND due_date != '';
+            """)
+        # В базах прежних версий нет столбца времени выполнения
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(tasks)")]
+        if "completed_at" not in columns:
+            self._conn.execute(
+                "ALTER TABLE tasks ADD COLUMN completed_at TEXT NOT NULL DEFAULT ''"
+            )
+        self._reserved_id = 0
+        # Уже прочитанные задачи: один id — один объект, пока он используется
+        self._loaded: "weakref.WeakValueDictionary[int, Task]" = (
+            weakref.WeakValueDictionary()
+        )
+
+    def get(self, task_id: int) -> Optional[Task]:
+        task = self._loaded.get(task_id)
+        if task is not None:
+            return task
+        row = self._conn.execute(
+            f"SELECT {self._COLUMNS} FROM tasks WHERE id = ?", (task_id,)
+        ).fetchone()
+        return self._hydrate(row) if row else None
+
+    def insert(self, task: Task) -> None:
+        if task.id is None:
+            # AUTOINCREMENT начинает с 1, поэтому номер выдаётся явно
+            task.id = self._next_id()
+        self._conn.execute(
+            f"INSERT INTO tasks ({self._COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (
+                task.id,
+                task.title,
+                task.priority,
+                task.due_date,
+                int(task.completed),
+                task.created_at,
+                task.completed_at,
+            ),
+        )
+        task._on_change = self._on_change
+        self._loaded[task.id] = task
+
+    def delete(self, task_id: int) -> Optional[Task]:
+        task = self.get(task_id)
+        if task is None:
+            return None
+        self._conn.execute("DELETE FROM tasks WHERE id = ?", (task_id,))
+        self._loaded.pop(task_id, None)
+        task._on_change = None
+        return task
+
+    def replace_all(self, tasks: Iterable[Task]) -> None:
+        # Внутри пакета TaskManager.batch() транзакция уже открыта
+        own_transaction = not self._conn.in_transaction
+        if own_transaction:
+            self._conn.execute("BEGIN")
+        try:
+            self._conn.execute("DELETE FROM tasks")
+            # Нумерация продолжается от нового набора задач, как в MemoryStorage
+            self._conn.execute("DELETE FROM sqlite_sequence WHERE name = 'tasks'")
+            self._loaded.clear()
+            for task in tasks:
+                self.insert(task)
+            if own_transaction:
+                self._conn.execute("COMMIT")
+        except Exception:
+            if own_transaction:
+                self._conn.execute("ROLLBACK")
+            raise
+
+    def reserve_ids(self, next_id: int) -> None:
+        self._reserved_id = max(self._reserved_id, next_id)
+
+    def begin_batch(self) -> None:
+        """Открыть одну транзакцию на весь пакет изменений"""
+        if not self._conn.in_transaction:
+            self._conn.execute("BEGIN")
+
+    def end_batch(self) -> None:
+        if self._conn.in_transaction:
+            self._conn.execute("COMMIT")
+
+    def query(
+        self,
+        completed: Optional[bool] = None,
+        priority: Optional[str] = None,
+        due_before: Optional[str] = None,
+    ) -> List[Task]:
+        conditions = []
+        params: List[Any] = []
+        if completed is not None:
+            conditions.append("completed = ?")
+            params.append(int(completed))
+        if priority is not None:
+            conditions.append("priority = ?")
+            params.append(priority.lower())
+        if due_before is not None:
+            conditions.append("due_date != '' AND due_date < ?")
+            params.append(due_before)
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        rows = self._conn.execute(
+            f"SELECT {self._COLUMNS} FROM tasks{where} ORDER BY id", params
+        )
+        return [self._hydrate(row) for row in rows]
+
+    def deadlines(
+        self,
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+        limit: Optional[int] = None,
+    ) -> List[Task]:
+        # Условие повторяет частичный индекс idx_tasks_deadline; LIMIT -1 —
+        # без ограничения, поэтому строка запроса всегда одна и та же
+        rows = self._conn.execute(
+            f"SELECT {self._COLUMNS} FROM tasks "
+            "WHERE completed = 0 AND due_date != '' AND due_date >= ? "
+            "AND due_date < ? "
+            "AND due_date GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]' "
+            "ORDER BY due_date, id LIMIT ?",
+            (start or "", end or "\uffff", -1 if limit is None else limit),
+        )
+        return [self._hydrate(row) for row in rows]
+
+    def task_changed(self, task: Task, field: str, old: Any) -> None:
+        """Сохранить изменённое поле одной строкой UPDATE"""
+        value = getattr(task, field)
+        if field == "completed":
+            # Время выполнения Task меняет вместе со статусом
+            self._conn.execute(
+                "UPDATE tasks SET completed = ?, completed_at = ? WHERE id = ?",
+                (int(value), task.completed_at, task.id),
+            )
+            return
+        # Имя столбца берётся только из фиксированного набора полей Task
+        self._conn.execute(
+            f"UPDATE tasks SET {field} = ? WHERE id = ?", (value, task.id)
+        )
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def __len__(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM tasks").fetchone()[0]
+
+    def __iter__(self) -> Iterator[Task]:
+        # Курсор читает строки порциями, список целиком не строится
+        for row in self._conn.execute(f"SELECT {self._COLUMNS} FROM tasks ORDER BY id"):
+            yield self._hydrate(row)
+
+    def _hydrate(self, row: tuple) -> Task:
+        """Построить задачу из строки таблицы (или вернуть уже загруженную)"""
+        task = self._loaded.get(row[0])
+        if task is not None:
+            return task
+        task = Task.from_row(row[:4] + (bool(row[4]),) + row[5:])
+        task._on_change = self._on_change
+        self._loaded[task.id] = task
+        return task
+
+    def _next_id(self) -> int:
+        """Следующий свободный идентификатор по счётчику AUTOINCREMENT"""
+        row = self._conn.execute(
+            "SELECT seq FROM sqlite_sequence WHERE name = 'tasks'"
+        ).fetchone()
+        return max(row[0] + 1 if row else 0, self._reserved_id)
+
+
+def migrate_json_to_sqlite(json_filename: str, db_filename: str) -> int:
+    """Перенести задачи из файла JSON в базу SQLite, вернуть их количество"""
+    with open(json_filename, "r", encoding="utf-8") as f:
+        tasks_data = json.load(f)
+
+    storage = SqliteStorage(db_filename)
+    try:
+        tasks = [Task.from_dict(data) for data in tasks_data]
+        # Сохраняем идентификаторы из файла; повторы получат новые
+        seen = set()
+        for task in tasks:
+            if task.id in seen:
+                task.id = None
+            seen.add(task.id)
+        storage.replace_all(tasks)
+        return len(tasks)
+    finally:
+        storage.close()
+
+
+class NdjsonStorage(MemoryStorage):
+    """Хранилище в памяти, сохраняемое в файл NDJSON по одной записи
+
+    Каждая задача занимает в файле отдельный слот: строку JSON, дополненную
+    пробелами до размера, кратного SLOT_SIZE. Таблица смещений id -> слот
+    позволяет перезаписать на месте только изменённые задачи, не трогая
+    остальные. Если запись перестала помещаться в свой слот, она переезжает
+    в свободный слот или в конец файла, а старый слот заполняется пробелами
+    и используется повторно. Когда свободного места становится больше, чем
+    занятого, файл переписывается целиком.
+    """
+
+    persistent = True
+
+    # Размер слота кратен этому числу байт (включая перевод строки)
+    SLOT_SIZE = 64
+
+    def __init__(self, filename: str = "tasks.ndjson"):
+        super().__init__()
+        self.filename = filename
+        # Таблица смещений: id -> (смещение, размер слота)
+        self._slots: Dict[int, Tuple[int, int]] = {}
+        # Свободные слоты по размеру: размер -> список смещений
+        self._free: Dict[int, List[int]] = {}
+        self._free_bytes = 0
+        self._file_size = 0
+        # Новые и изменённые задачи, а также слоты удалённых задач
+        self._dirty_ids: Dict[int, None] = {}
+        self._released: List[Tuple[int, int]] = []
+        self._rewrite = False
+        self._load()
+
+    def insert(self, task: Task) -> None:
+        super().insert(task)
+        self._dirty_ids[task.id] = None
+
+    def delete(self, task_id: int) -> Optional[Task]:
+        task = super().delete(task_id)
+        if task is None:
+            return None
+        self._dirty_ids.pop(task_id, None)
+        slot = self._slots.pop(task_id, None)
+        if slot is not None:
+            self._released.append(slot)
+        return task
+
+    def replace_all(self, tasks: Iterable[Task]) -> None:
+        super().replace_all(tasks)
+        # Новый список проще записать заново, чем сопоставлять со слотами
+        self._rewrite = True
+
+    def task_changed(self, task: Task, field: str, old: Any) -> None:
+        super().task_changed(task, field, old)
+        self._dirty_ids[task.id] = None
+
+    def end_batch(self) -> None:
+        super().end_batch()
+        if self._batch_depth == 0:
+            self.flush()
+
+    def flush(self) -> None:
+        """Записать в файл только новые, изменённые и удалённые задачи"""
+        if self._batch_depth:
+            return
+        if self._rewrite or not os.path.exists(self.filename):
+            self._write_all()
+            return
+        if not self._dirty_ids and not self._released:
+            return
+
+        with open(self.filename, "r+b") as f:
+            for offset, size in self._released:
+                self._write_slot(f, offset, size, b"")
+                self._free.setdefault(size, []).append(offset)
+                self._free_bytes += size
+            self._released = []
+
+            for task_id in self._dirty_ids:
+                task = self._tasks[task_id]
+                slot = self._slots.get(task_id)
+                if slot is not None and not task.dirty_fields:
+                    continue
+                data = self._encode(task)
+                if slot is None or len(data) >= slot[1]:
+                    if slot is not None:
+                        # Запись выросла — освобождаем старый слот
+                        self._write_slot(f, slot[0], slot[1], b"")
+                        self._free.setdefault(slot[1], []).append(slot[0])
+                        self._free_bytes += slot[1]
+                    slot = self._allocate(self._slot_size(data))
+                    self._slots[task_id] = slot
+                self._write_slot(f, slot[0], slot[1], data)
+                task.clear_dirty()
+            self._dirty_ids = {}
+            f.flush()
+            os.fsync(f.fileno())
+
+        if self._free_bytes > self._file_size - self._free_bytes:
+            self._write_all()
+
+    def _load(self) -> None:
+        """Прочитать файл и построить таблицу смещений"""
+        if not os.path.exists(self.filename):
+            return
+        entries = []
+        offset = 0
+        with open(self.filename, "rb") as f:
+            for line in f:
+                size = len(line)
+                if not line.endswith(b"\n"):
+                    # Недописанный слот после сбоя — отрезаем его
+                    break
+                if line.strip():
+                    try:
+                        task = Task.from_dict(json.loads(line.decode("utf-8")))
+                    except (ValueError, KeyError) as e:
+                        # Слот не освобождаем: данные останутся для восстановления
+                        print(f"Пропущена повреждённая запись (смещение {offset}): {e}")
+                    else:
+                        entries.append((task, task.id, offset, size))
+                else:
+                    self._free.setdefault(size, []).append(offset)
+                    self._free_bytes += size
+                offset += size
+        self._file_size = offset
+        if offset != os.path.getsize(self.filename):
+            with open(self.filename, "r+b") as f:
+                f.truncate(offset)
+
+        # Порядок слотов в файле не совпадает с порядком добавления
+        entries.sort(key=lambda entry: (entry[1] is None, entry[1] or 0))
+        super().replace_all(entry[0] for entry in entries)
+        for task, file_id, offset, size in entries:
+            if task.id == file_id and task.id not in self._slots:
+                self._slots[task.id] = (offset, size)
+            else:
+                # Задача без id или с повтором получила новый id — перезапишем
+                self._released.append((offset, size))
+                self._dirty_ids[task.id] = None
+
+    def _write_all(self) -> None:
+        """Переписать файл целиком, плотно уложив задачи по слотам"""
+        chunks = []
+        slots = {}
+        offset = 0
+        for task in self._tasks.values():
+            data = self._encode(task)
+            size = self._slot_size(data)
+            chunks.append(self._pad(data, size))
+            slots[task.id] = (offset, size)
+            offset += size
+            task.clear_dirty()
+        atomic_write(self.filename, b"".join(chunks))
+        self._slots = slots
+        self._free = {}
+        self._free_bytes = 0
+        self._file_size = offset
+        self._dirty_ids = {}
+        self._released = []
+        self._rewrite = False
+
+    def _allocate(self, size: int) -> Tuple[int, int]:
+        """Найти свободный слот нужного размера или добавить новый в конец"""
+        offsets = self._free.get(size)
+        if offsets:
+            self._free_bytes -= size
+            return offsets.pop(), size
+        offset = self._file_size
+        self._file_size += size
+        return offset, size
+
+    def _write_slot(self, f, offset: int, size: int, data: bytes) -> None:
+        f.seek(offset)
+        f.write(self._pad(data, size))
+
+    @staticmethod
+    def _encode(task: Task) -> bytes:
+        return json.dumps(
+            task.to_dict(), ensure_ascii=False, separators=(",", ":")
+        ).encode("utf-8")
+
+    @classmethod
+    def _slot_size(cls, data: bytes) -> int:
+        """Размер слота для записи: с переводом строки, кратный SLOT_SIZE"""
+        return (len(data) // cls.SLOT_SIZE + 1) * cls.SLOT_SIZE
+
+    @staticmethod
+    def _pad(data: bytes, size: int) -> bytes:
+        """Дополнить запись пробелами до размера слота"""
+        return data + b" " * (size - len(data) - 1) + b"\n"
+
+
+class MmapNdjsonStorage(TaskStorage):
+    """Хранилище в файле NDJSON, задачи которого читаются по требованию
+
+    Файл данных устроен так же, как у NdjsonStorage (задача — строка JSON в
+    слоте), и отображается в память через mmap. Рядом лежит индекс
+    смещений filename + ".idx": заголовок и три столбца int64 — номера
+    задач по возрастанию, смещения и размеры их слотов. Индекс тоже
+    отображается в память, поэтому открытие не зависит от размера файла:
+    задача по номеру находится двоичным поиском, и декодируется только она
+    сама, а список декодирует лишь выводимые задачи.
+
+    Слоты новых и переехавших задач и номера удалённых хранятся поверх
+    столбцов: в памяти, а при закрытии — коротким хвостом файла индекса.
+    Столбцы переписываются, только когда таких записей накопилось больше
+    MAX_PENDING_SLOTS, поэтому правка одной задачи не переписывает индекс.
+    Индекс — кэш: если он не соответствует файлу данных (например, после
+    сбоя), он строится заново одним проходом по файлу без разбора JSON.
+    Освобождённые слоты повторно не используются: когда их становится
+    больше, чем занятых, файл переписывается копированием слотов.
+    """
+
+    persistent = True
+
+    # Заголовок индекса: сигнатура, число задач в столбцах, размер и время
+    # изменения файла данных, байты свободных слотов, число записей хвоста.
+    # Числа пишутся в порядке байтов машины — индекс остаётся локальным
+    # кэшем, как tasks.json.cache
+    _HEADER = struct.Struct("=8sqqqqq")
+    _MAGIC = b"TASKIDX" + sys.byteorder[0].upper().encode()
+    # Номер задачи в начале строки — так её пишет NdjsonStorage._encode
+    _ID_RE = re.compile(rb'\{"id":(\d+),')
+    # Сколько изменений слотов держать поверх столбцов индекса
+    MAX_PENDING_SLOTS = 4096
+
+    def __init__(self, filename: str = "tasks.ndjson"):
+        super().__init__()
+        self.filename = filename
+        self.index_filename = filename + ".idx"
+        self._data_map: Any = None
+        self._index_map: Any = None
+        # Столбцы индекса (memoryview поверх отображённого файла индекса)
+        self._columns: Optional[memoryview] = None
+        self._ids: Sequence[int] = ()
+        self._offsets: Sequence[int] = ()
+        self._sizes: Sequence[int] = ()
+        # Изменения поверх индекса: новые слоты задач и удалённые номера
+        self._moved: Dict[int, Tuple[int, int]] = {}
+        self._removed: Set[int] = set()
+        # Действителен ли индекс на диске (см. _invalidate_index)
+        self._index_saved = False
+        self._count = 0
+        self._next_id = 0
+        # Нижняя граница для новых идентификаторов (см. reserve_ids)
+        self._reserved_id = 0
+        self._file_size = 0
+        self._free_bytes = 0
+        # Уже прочитанные задачи: один id — один объект, пока он используется
+        self._loaded: "weakref.WeakValueDictionary[int, Task]" = (
+            weakref.WeakValueDictionary()
+        )
+        # Новые и изменённые задачи до записи в файл
+        self._dirty: Dict[int, Task] = {}
+        self._released: List[Tuple[int, int]] = []
+        self._rewrite = False
+        self._batch_depth = 0
+        self._open()
+
+    def get(self, task_id: int) -> Optional[Task]:
+        task = self._loaded.get(task_id)
+        if task is not None:
+            return task
+        slot = self._slot(task_id)
+        return None if slot is None else self._decode(task_id, *slot)
+
+    def insert(self, task: Task) -> None:
+        # Занятый номер не перезаписываем: задача получает новый, как в
+        # ColumnarStorage
+        if task.id is None or task.id < 0 or self.get(task.id) is not None:
+            task.id = self._next_id
+        self._next_id = max(self._next_id, task.id + 1)
+        task._on_change = self._on_change
+        self._loaded[task.id] = task
+        self._dirty[task.id] = task
+        self._count += 1
+
+    def delete(self, task_id: int) -> Optional[Task]:
+        task = self.get(task_id)
+        if task is None:
+            return None
+        slot = self._slot(task_id)
+        if slot is not None:
+            self._released.append(slot)
+        self._moved.pop(task_id, None)
+        self._removed.add(task_id)
+        self._dirty.pop(task_id, None)
+        self._loaded.pop(task_id, None)
+        task._on_change = None
+        self._count -= 1
+        return task
+
+    def replace_all(self, tasks: Iterable[Task]) -> None:
+        for task in self._loaded.values():
+            task._on_change = None
+        self._close_index()
+        self._set_columns((), (), ())
+        self._loaded = weakref.WeakValueDictionary()
+        self._dirty = {}
+        self._released = []
+        tasks = list(tasks)
+        # Уже назначенные идентификаторы сохраняем, повторы получат новые
+        known_ids = [task.id for task in tasks if task.id is not None]
+        self._next_id = max(max(known_ids) + 1 if known_ids else 0, self._reserved_id)
+        for task in tasks:
+            if task.id in self._dirty:
+                task.id = None
+            self.insert(task)
+        # Новый список проще записать заново, чем сопоставлять со слотами
+        self._rewrite = True
+
+    def query(
+        self,
+        completed: Optional[bool] = None,
+        priority: Optional[str] = None,
+        due_before: Optional[str] = None,
+    ) -> List[Task]:
+        # Вторичных индексов нет: задачи декодируются и проверяются по очереди
+        if priority is not None:
+            priority = priority.lower()
+        return [
+            task
+            for task in self
+            if (completed is None or task.completed == completed)
+            and (priority is None or task.priority == priority)
+            and (due_before is None or "" < task.due_date < due_before)
+        ]
+
+    def page(self, offset: int, stop: Optional[int]) -> Iterator[Task]:
+        # Пропущенные задачи не декодируются; без изменений поверх столбцов
+        # страница — просто срез столбцов
+        if self._moved or self._removed or self._dirty:
+            return self._tasks(islice(self._entries(), offset, stop))
+        return self._tasks(
+            zip(
+                self._ids[offset:stop],
+                self._offsets[offset:stop],
+                self._sizes[offset:stop],
+            )
+        )
+
+    def task_changed(self, task: Task, field: str, old: Any) -> None:
+        self._dirty[task.id] = task
+
+    def reserve_ids(self, next_id: int) -> None:
+        self._reserved_id = max(self._reserved_id, next_id)
+        self._next_id = max(self._next_id, next_id)
+
+    def begin_batch(self) -> None:
+        self._batch_depth += 1
+
+    def end_batch(self) -> None:
+        self._batch_depth -= 1
+        if self._batch_depth == 0:
+            self.flush()
+
+    def flush(self) -> None:
+        """Записать новые, изменённые и удалённые задачи в их слоты"""
+        if self._batch_depth:
+            return
+        if self._rewrite or not os.path.exists(self.filename):
+            self._write_all()
+            return
+        if not self._dirty and not self._released:
+            return
+
+        self._invalidate_index()
+        with open(self.filename, "r+b") as f:
+            for offset, size in self._released:
+                self._write_slot(f, offset, size, b"")
+                self._free_bytes += size
+            self._released = []
+
+            for task_id, task in self._dirty.items():
+                data = NdjsonStorage._encode(task)
+                slot = self._slot(task_id)
+                if slot is None or len(data) >= slot[1]:
+                    if slot is not None:
+                        # Запись выросла — старый слот освобождается
+                        self._write_slot(f, slot[0], slot[1], b"")
+                        self._free_bytes += slot[1]
+                    slot = (self._file_size, NdjsonStorage._slot_size(data))
+                    self._file_size += slot[1]
+                    self._moved[task_id] = slot
+                    self._removed.discard(task_id)
+                self._write_slot(f, slot[0], slot[1], data)
+                task.clear_dirty()
+            self._dirty = {}
+            f.flush()
+            os.fsync(f.fileno())
+        self._map_data()
+
+        if self._free_bytes > self._file_size - self._free_bytes:
+            self._write_all()
+        elif len(self._moved) + len(self._removed) > self.MAX_PENDING_SLOTS:
+            self._write_index()
+
+    def close(self) -> None:
+        self.flush()
+        if not self._index_saved and os.path.exists(self.filename):
+            if self._index_map is not None:
+                self._save_pending()
+            else:
+                self._write_index()
+        self._close_index()
+        if self._data_map is not None:
+            self._data_map.close()
+            self._data_map = None
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __iter__(self) -> Iterator[Task]:
+        return self._tasks(self._entries())
+
+    def _tasks(self, entries: Iterable[Tuple[int, int, int]]) -> Iterator[Task]:
+        """Задачи по записям (номер, смещение, размер слота)"""
+        loaded = self._loaded
+        for task_id, offset, size in entries:
+            task = loaded.get(task_id)
+            yield task if task is not None else self._decode(task_id, offset, size)
+
+    def _entries(self) -> Iterator[Tuple[int, int, int]]:
+        """Записи (номер, смещение, размер слота) по возрастанию номера
+
+        Новые задачи, ещё не записанные в файл, идут со смещением -1.
+        """
+        base = zip(self._ids, self._offsets, self._sizes)
+        moved = self._moved
+        removed = self._removed
+        pending = [task_id for task_id in self._dirty if self._slot(task_id) is None]
+        if not moved and not removed and not pending:
+            return base
+        changed = sorted(
+            [(task_id, *slot) for task_id, slot in moved.items()]
+            + [(task_id, -1, 0) for task_id in pending]
+        )
+        return merge(
+            (
+                entry
+                for entry in base
+                if entry[0] not in removed and entry[0] not in moved
+            ),
+            changed,
+        )
+
+    def _slot(self, task_id: int) -> Optional[Tuple[int, int]]:
+        """Слот задачи в файле данных (смещение, размер) или None"""
+        slot = self._moved.get(task_id)
+        if slot is not None:
+            return slot
+        if task_id in self._removed:
+            return None
+        ids = self._ids
+        position = bisect_left(ids, task_id)
+        if position < len(ids) and ids[position] == task_id:
+            return self._offsets[position], self._sizes[position]
+        return None
+
+    def _decode(self, task_id: int, offset: int, size: int) -> Task:
+        """Прочитать задачу из её слота в отображённом файле"""
+        task = Task.from_dict(json.loads(self._data_map[offset : offset + size]))
+        task.id = task_id
+        task._on_change = self._on_change
+        self._loaded[task_id] = task
+        return task
+
+    def _open(self) -> None:
+        if not os.path.exists(self.filename):
+            return
+        self._file_size = os.path.getsize(self.filename)
+        self._map_data()
+        if not self._load_index():
+            self._rebuild_index()
+
+    def _map_data(self) -> None:
+        """Отобразить файл данных в память заново, если изменился его размер"""
+        import mmap
+
+        if self._data_map is not None:
+            if len(self._data_map) == self._file_size:
+                # Запись на месте видна через то же отображение
+                return
+            self._data_map.close()
+            self._data_map = None
+        if self._file_size:
+            with open(self.filename, "rb") as f:
+                self._data_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _load_index(self) -> bool:
+        """Отобразить индекс в память, если он соответствует файлу данных"""
+        import mmap
+
+        try:
+            f = open(self.index_filename, "rb")
+        except OSError:
+            return False
+        with f:
+            size = os.fstat(f.fileno()).st_size
+            if size < self._HEADER.size:
+                return False
+            index_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, count, data_size, data_mtime, free_bytes, pending = (
+            self._HEADER.unpack_from(index_map)
+        )
+        stat = os.stat(self.filename)
+        if (
+            magic != self._MAGIC
+            or size != self._HEADER.size + 24 * (count + pending)
+            or (data_size, data_mtime) != (stat.st_size, stat.st_mtime_ns)
+        ):
+            index_map.close()
+            return False
+        self._close_index()
+        self._index_map = index_map
+        self._columns = memoryview(index_map)[self._HEADER.size :].cast("q")
+        columns = self._columns
+        self._set_columns(
+            columns[:count], columns[count : 2 * count], columns[2 * count : 3 * count]
+        )
+        # Хвост: тройки (номер, смещение, размер); размер 0 — задача удалена
+        for position in range(3 * count, 3 * (count + pending), 3):
+            task_id, offset, size = columns[position : position + 3].tolist()
+            in_columns = self._slot(task_id) is not None
+            if size:
+                self._moved[task_id] = (offset, size)
+                self._count += not in_columns
+                self._next_id = max(self._next_id, task_id + 1)
+            else:
+                self._removed.add(task_id)
+                self._count -= in_columns
+        self._free_bytes = free_bytes
+        self._index_saved = True
+        return True
+
+    def _set_columns(
+        self, ids: Sequence[int], offsets: Sequence[int], sizes: Sequence[int]
+    ) -> None:
+        self._ids, self._offsets, self._sizes = ids, offsets, sizes
+        self._moved = {}
+        self._removed = set()
+        self._count = len(ids)
+        if ids:
+            self._next_id = max(self._next_id, ids[-1] + 1)
+
+    def _close_index(self) -> None:
+        """Отпустить столбцы и закрыть отображение индекса"""
+        if self._index_map is None:
+            return
+        # Пока есть представления буфера, mmap нельзя закрыть
+        for column in (self._ids, self._offsets, self._sizes, self._columns):
+            if isinstance(column, memoryview):
+                column.release()
+        self._ids = self._offsets = self._sizes = ()
+        self._columns = None
+        self._index_map.close()
+        self._index_map = None
+
+    def _invalidate_index(self) -> None:
+        """Стереть сигнатуру индекса на диске перед изменением файла данных
+
+        Так после сбоя индекс не примут за действительный, даже если размер
+        и время изменения файла данных совпали с записанными в нём.
+        """
+        if not self._index_saved:
+            return
+        with open(self.index_filename, "r+b") as f:
+            f.write(bytes(len(self._MAGIC)))
+        self._index_saved = False
+
+    def _rebuild_index(self) -> None:
+        """Построить индекс одним проходом по файлу данных
+
+        Номер задачи берётся из начала строки без разбора JSON. Строки без
+        номера или с повтором номера декодируются и получают новый номер.
+        """
+        data = self._data_map
+        ids, offsets, sizes = array("q"), array("q"), array("q")
+        others = []
+        match = self._ID_RE.match
+        offset = 0
+        end = len(data) if data is not None else 0
+        while offset < end:
+            newline = data.find(b"\n", offset)
+            if newline < 0:
+                # Недописанный слот после сбоя — отрезаем его
+                break
+            size = newline + 1 - offset
+            found = match(data, offset, newline)
+            if found is not None:
+                ids.append(int(found.group(1)))
+                offsets.append(offset)
+                sizes.append(size)
+            elif data[offset:newline].strip():
+                others.append((offset, size))
+            else:
+                self._free_bytes += size
+            offset = newline + 1
+        if offset != self._file_size:
+            with open(self.filename, "r+b") as f:
+                f.truncate(offset)
+            self._file_size = offset
+            self._map_data()
+
+        # Порядок слотов в файле не совпадает с порядком номеров
+        order = sorted(range(len(ids)), key=ids.__getitem__)
+        sorted_ids, sorted_offsets, sorted_sizes = array("q"), array("q"), array("q")
+        for position in order:
+            if sorted_ids and sorted_ids[-1] == ids[position]:
+                others.append((offsets[position], sizes[position]))
+                continue
+            sorted_ids.append(ids[position])
+            sorted_offsets.append(offsets[position])
+            sorted_sizes.append(sizes[position])
+        self._set_columns(sorted_ids, sorted_offsets, sorted_sizes)
+
+        for offset, size in others:
+            try:
+                task = Task.from_dict(json.loads(data[offset : offset + size]))
+            except (ValueError, KeyError) as e:
+                # Слот не освобождаем: данные останутся для восстановления
+                print(f"Пропущена повреждённая запись (смещение {offset}): {e}")
+                continue
+            # Задача без номера или с повтором получает новый — перезапишем
+            task.id = None
+            self.insert(task)
+            self._released.append((offset, size))
+        self.flush()
+        self._write_index()
+
+    def _save_pending(self) -> None:
+        """Записать изменения слотов хвостом индекса, не трогая столбцы"""
+        records = array("q")
+        for task_id, (offset, size) in self._moved.items():
+            records.extend((task_id, offset, size))
+        for task_id in self._removed:
+            records.extend((task_id, 0, 0))
+        count = len(self._ids)
+        stat = os.stat(self.filename)
+        with open(self.index_filename, "r+b") as f:
+            f.seek(self._HEADER.size + 24 * count)
+            f.write(records.tobytes())
+            f.truncate()
+            f.flush()
+            os.fsync(f.fileno())
+            # Заголовок с сигнатурой — последним: до него индекс недействителен
+            f.seek(0)
+            f.write(
+                self._HEADER.pack(
+                    self._MAGIC,
+                    count,
+                    stat.st_size,
+                    stat.st_mtime_ns,
+                    self._free_bytes,
+                    len(records) // 3,
+                )
+            )
+            f.flush()
+            os.fsync(f.fileno())
+        self._index_saved = True
+
+    def _write_index(self) -> None:
+        """Переписать индекс, слив изменения из памяти со столбцами"""
+        ids, offsets, sizes = array("q"), array("q"), array("q")
+        for task_id, offset, size in self._entries():
+            ids.append(task_id)
+            offsets.append(offset)
+            sizes.append(size)
+        self._save_index(ids, offsets, sizes)
+
+    def _save_index(self, ids: array, offsets: array, sizes: array) -> None:
+        stat = os.stat(self.filename)
+        header = self._HEADER.pack(
+            self._MAGIC, len(ids), stat.st_size, stat.st_mtime_ns, self._free_bytes, 0
+        )
+        self._close_index()
+        atomic_write(
+            self.index_filename,
+            [header, ids.tobytes(), offsets.tobytes(), sizes.tobytes()],
+        )
+        if not self._load_index():
+            # Файл данных изменили извне между stat и записью индекса
+            self._set_columns(ids, offsets, sizes)
+
+    def _write_all(self) -> None:
+        """Переписать файл данных плотно: слоты копируются без разбора JSON"""
+        data = self._data_map
+        ids, offsets, sizes = array("q"), array("q"), array("q")
+        position = 0
+
+        def chunks() -> Iterator[bytes]:
+            nonlocal position
+            for task_id, offset, size in self._entries():
+                task = self._dirty.get(task_id)
+                if task is not None:
+                    encoded = NdjsonStorage._encode(task)
+                    size = NdjsonStorage._slot_size(encoded)
+                    chunk = NdjsonStorage._pad(encoded, size)
+                    task.clear_dirty()
+                else:
+                    chunk = data[offset : offset + size]
+                ids.append(task_id)
+                offsets.append(position)
+                sizes.append(size)
+                position += size
+                yield chunk
+
+        self._invalidate_index()
+        atomic_write(self.filename, chunks())
+        self._dirty = {}
+        self._released = []
+        self._rewrite = False
+        self._free_bytes = 0
+        self._file_size = position
+        if self._data_map is not None:
+            # Старое отображение указывает на заменённый файл
+            self._data_map.close()
+            self._data_map = None
+        self._map_data()
+        self._save_index(ids, offsets, sizes)
+
+    @staticmethod
+    def _write_slot(f, offset: int, size: int, data: bytes) -> None:
+        f.seek(offset)
+        f.write(NdjsonStorage._pad(data, size))
+
+
+class ReadWriteLock:
+    """Блокировка «много читателей или один писатель»
+
+    Читатели не ждут друг друга, писатель получает монопольный доступ.
+    Ожидающий писатель не пропускает вперёд новых читателей, поэтому поток
+    чтений не задерживает запись бесконечно. Блокировка повторно входима:
+    писатель может снова взять запись или чтение, читатель — снова чтение.
+    Повысить чтение до записи нельзя: два таких потока ждали бы друг друга.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition(threading.Lock())
+        # Глубина вложенных чтений по потокам
+        self._readers: Dict[int, int] = {}
+        self._writer: Optional[int] = None
+        self._writer_depth = 0
+        self._waiting_writers = 0
+
+    @contextmanager
+    def read(self) -> Iterator[None]:
+        """Взять блокировку для чтения на время блока with"""
+        self.acquire_read()
+        try:
+            yield
+        finally:
+            self.release_read()
+
+    @contextmanager
+    def write(self) -> Iterator[None]:
+        """Взять блокировку для записи на время блока with"""
+        self.acquire_write()
+        try:
+            yield
+        finally:
+            self.release_write()
+
+    def acquire_read(self) -> None:
+        me = threading.get_ident()
+        with self._condition:
+            if self._writer != me and me not in self._readers:
+                while self._writer is not None or self._waiting_writers:
+                    self._condition.wait()
+            self._readers[me] = self._readers.get(me, 0) + 1
+
+    def release_read(self) -> None:
+        me = threading.get_ident()
+        with self._condition:
+            depth = self._readers[me] - 1
+            if depth:
+                self._readers[me] = depth
+                return
+            del self._readers[me]
+            if not self._readers:
+                self._condition.notify_all()
+
+    def acquire_write(self) -> None:
+        me = threading.get_ident()
+        with self._condition:
+            if self._writer == me:
+                self._writer_depth += 1
+                return
+            if me in self._readers:
+                raise RuntimeError("нельзя повысить блокировку чтения до записи")
+            self._waiting_writers += 1
+            try:
+                while self._writer is not None or self._readers:
+                    self._condition.wait()
+            finally:
+                self._waiting_writers -= 1
+            self._writer = me
+            self._writer_depth = 1
+
+    def release_write(self) -> None:
+        with self._condition:
+            self._writer_depth -= 1
+            if self._writer_depth == 0:
+                self._writer = None
+                self._condition.notify_all()
+
+
+class Autosaver:
+    """Фоновое отложенное сохранение с объединением изменений
+
+    Изменения только отмечают данные «грязными». Фоновый поток сохраняет их
+    одной записью, когда изменения затихли на quiet_period секунд, но не
+    позже чем через max_delay секунд после первого несохранённого изменения.
+    """
+
+    def __init__(
+        self,
+        save: Callable[[], None],
+        quiet_period: float = 1.0,
+        max_delay: float = 5.0,
+    ):
+        self._save = save
+        self.quiet_period = quiet_period
+        self.max_delay = max_delay
+        self._condition = threading.Condition()
+        self._first_change: Optional[float] = None
+        self._last_change = 0.0
+        self._stopped = False
+        # Сохранение выполняется под отдельной блокировкой, чтобы flush()
+        # из основного потока не пересёкся с фоновым сохранением
+        self._save_lock = threading.Lock()
+        self._thread = threading.Thread(
+            target=self._run, name="tasks-autosave", daemon=True
+        )
+        self._thread.start()
+
+    @property
+    def dirty(self) -> bool:
+        """Есть ли несохранённые изменения"""
+        return self._first_change is not None
+
+    def touch(self) -> None:
+        """Отметить, что данные изменились"""
+        with self._condition:
+            now = time.monotonic()
+            if self._first_change is None:
+                self._first_change = now
+            self._last_change = now
+            self._condition.notify()
+
+    def flush(self) -> None:
+        """Немедленно сохранить несохранённые изменения"""
+        with self._save_lock:
+            with self._condition:
+                if self._first_change is None:
+                    return
+                self._first_change = None
+            self._save()
+
+    def stop(self) -> None:
+        """Сохранить изменения и остановить фоновый поток"""
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+        self._thread.join()
+        self.flush()
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                while not self._stopped:
+                    if self._first_change is None:
+                        self._condition.wait()
+                        continue
+                    deadline = min(
+                        self._last_change + self.quiet_period,
+                        self._first_change + self.max_delay,
+                    )
+                    timeout = deadline - time.monotonic()
+                    if timeout <= 0:
+                        break
+                    self._condition.wait(timeout)
+                if self._stopped:
+                    return
+            self.flush()
+
+
+class BatchResult:
+    """Результат пакетной операции TaskManager"""
+
+    def __init__(self):
+        # Идентификаторы задач, для которых операция прошла успешно
+        self.succeeded: List[int] = []
+        # Пары (элемент или id, текст ошибки) для отклонённых элементов
+        self.errors: List[Tuple[Any, str]] = []
+
+    @property
+    def ok(self) -> bool:
+        """Прошла ли операция без ошибок"""
+        return not self.errors
+
+    def __repr__(self) -> str:
+        return (
+            f"BatchResult(succeeded={len(self.succeeded)}, errors={len(self.errors)})"
+        )
+
+
+class ImportResult:
+    """Результат импорта задач из файла
+
+    Хранит счётчики, а не идентификаторы: память не растёт с размером файла.
+    """
+
+    # Сколько первых ошибок запоминать с текстом
+    MAX_ERRORS = 100
+
+    def __init__(self):
+        self.added = 0
+        # Записи, совпавшие с уже имеющейся или ранее прочитанной задачей
+        self.duplicates = 0
+        self.failed = 0
+        # Пары (номер записи с 1, текст ошибки) для первых MAX_ERRORS ошибок
+        self.errors: List[Tuple[int, str]] = []
+
+    @property
+    def ok(self) -> bool:
+        """Прошёл ли импорт без ошибок"""
+        return not self.failed
+
+    def __repr__(self) -> str:
+        return (
+            f"ImportResult(added={self.added}, duplicates={self.duplicates}, "
+            f"failed={self.failed})"
+        )
+
+
+class TaskManager:
+    """Класс для управления списком задач"""
+
+    # Версия формата бинарного кэша tasks.json.cache
+    CACHE_VERSION = 3
+    # Фильтры списка по статусу и соответствующее значение completed
+    STATUS_FILTERS = {"все": None, "невыполненные": False, "выполненные": True}
+
+    def __init__(
+        self,
+        filename: str = "tasks.json",
+        journal: bool = False,
+        journal_max_bytes: int = 1024 * 1024,
+        storage: Optional[TaskStorage] = None,
+        lazy: bool = False,
+        autosave: bool = False,
+        autosave_delay: float = 1.0,
+        autosave_max_delay: float = 5.0,
+        snapshot_cache: bool = False,
+        write_cache: bool = True,
+        archive_after_days: Optional[int] = None,
+        thread_safe: bool = False,
+        shared: bool = False,
+        verbose: bool = True,
+    ):
+        # Хранилище задач: по умолчанию в памяти с сохранением в JSON.
+        # В ленивом режиме файл читается потоком по мере обращения к задачам
+        self.lazy = lazy
+        if storage is None:
+            storage = LazyMemoryStorage() if lazy else MemoryStorage()
+        self._store = storage
+        self._store.attach(self._task_changed)
+        self.filename = filename
+        # Журнал операций: каждое изменение дописывается одной строкой
+        # в файл рядом с tasks.json вместо полной перезаписи списка
+        self.journal = journal
+        self.journal_filename = filename + ".journal"
+        self.journal_max_bytes = journal_max_bytes
+        self._journal_bytes = 0
+        # Контрольная сумма последнего снимка, к которому относится журнал
+        self._snapshot_crc: Optional[int] = None
+        # Контрольная сумма снимка для проверки целостности при запуске
+        self.checksum_filename = filename + ".checksum"
+        # Бинарный кэш снимка: быстрый запуск без разбора JSON. Без
+        # write_cache готовый кэш только читается (например, командами,
+        # которые ничего не меняют)
+        self.snapshot_cache = snapshot_cache
+        self.write_cache = write_cache
+        self.cache_filename = filename + ".cache"
+        self._cache_thread: Optional[threading.Thread] = None
+        # Архив выполненных задач: сжатый файл, который читается только
+        # по запросу, и небольшой индекс к нему
+        self.archive_after_days = archive_after_days
+        self.archive_filename = filename + ".archive.gz"
+        self.archive_index_filename = filename + ".archive.json"
+        self._archive: Optional[List[Task]] = None
+        self._archive_lock = threading.Lock()
+        self._archive_index = {"count": 0, "next_id": 0}
+        self._load_error: Optional[str] = None
+        # Сообщения о загрузке не нужны, когда вывод читает другая программа
+        self.verbose = verbose
+        # Групповая запись: параллельные save_to_file ждут одну общую запись
+        self._commit_condition = threading.Condition()
+        self._save_requested = 0
+        self._save_completed = 0
+        self._saving = False
+        # Состояние пакетного режима batch()
+        self._batch_depth = 0
+        self._batch_records: List[dict] = []
+        self._batch_dirty = False
+        # Изменения берут блокировку на запись, снимок для сохранения — на
+        # чтение. В потокобезопасном режиме чтения тоже берут её на чтение:
+        # читатели идут параллельно, а изменения ждут, пока они закончат
+        self.thread_safe = thread_safe
+        self._lock = ReadWriteLock()
+        # Совместный режим: файл открыт несколькими процессами. Сохранение
+        # идёт под блокировкой файла и сначала вливает чужие изменения;
+        # каждая запись файла несёт номер версии
+        if shared and (journal or lazy or type(self._store) is not MemoryStorage):
+            raise ValueError(
+                "совместный режим работает только с MemoryStorage без журнала"
+            )
+        self.shared = shared
+        self.lock_filename = filename + ".lock"
+        # Версии записей и отметка файла на момент последней синхронизации
+        self._base_versions: Dict[int, int] = {}
+        self._file_stamp: Optional[Tuple[int, int, int]] = None
+        self.load_from_file()
+        self._load_archive_index()
+        # Автосохранение: изменения сохраняются фоновым потоком с задержкой
+        self._autosaver: Optional[Autosaver] = None
+        if autosave:
+            self._autosaver = Autosaver(
+                self.save_to_file, autosave_delay, autosave_max_delay
+            )
+        if archive_after_days is not None:
+            self.archive_completed(archive_after_days)
+
+    def add_task(
+        self, title: str, priority: str = "средний", due_date: str = ""
+    ) -> Optional[Task]:
+        """Добавить новую задачу"""
+        error = self._validate_task(title, priority, due_date)
+        if error:
+            print(f"Ошибка: {error}")
+            return None
+
+        task = self._add(title, priority, due_date)
+        print(f"Задача '{title}' успешно добавлена!")
+        return task
+
+    def remove_task(self, task_id: int) -> bool:
+        """Удалить задачу по идентификатору"""
+        removed_task = self._remove(task_id)
+        if removed_task is None:
+            print(f"Ошибка: задача с номером {task_id} не найдена!")
+            return False
+
+        print(f"Задача '{removed_task.title}' успешно удалена!")
+        return True
+
+    def edit_task(self, task_id: int, **kwargs) -> bool:
+        """Редактировать выбранную задачу"""
+        error = self._validate_fields(kwargs)
+        if error:
+            print(f"Ошибка: {error}")
+            return False
+
+        task = self._edit(task_id, **kwargs)
+        if task is None:
+            print(f"Ошибка: задача с номером {task_id} не найдена!")
+            return False
+
+        print(f"Задача '{task.title}' успешно отредактирована!")
+        return True
+
+    def mark_task_completed(self, task_id: int) -> bool:
+        """Отметить задачу как выполненную"""
+        task = self._complete(task_id)
+        if task is None:
+            print(f"Ошибка: задача с номером {task_id} не найдена!")
+            return False
+
+        print(f"Задача '{task.title}' отмечена как выполненная!")
+        return True
+
+    @contextmanager
+    def batch(self) -> Iterator["TaskManager"]:
+        """Отложить сохранение изменений до выхода из блока with
+
+        Все изменения внутри блока записываются одним действием: одной
+        перезаписью файла, одной порцией журнала или одной транзакцией.
+        """
+        with self._lock.write():
+            self._batch_depth += 1
+            if self._batch_depth == 1:
+                self._store.begin_batch()
+        try:
+            yield self
+        finally:
+            save_needed = False
+            with self._lock.write():
+                self._batch_depth -= 1
+                if self._batch_depth == 0:
+                    self._store.end_batch()
+                    save_needed = self._flush_batch()
+            self._save_if_needed(save_needed)
+
+    def add_tasks(self, items: Iterable[Any]) -> "BatchResult":
+        """Добавить много задач с одним сохранением
+
+        Элемент — словарь с ключами title, priority, due_date или кортеж
+        (title, priority, due_date). Ошибки проверки не печатаются, а
+        возвращаются в результате вместе с самим элементом.
+        """
+        result = BatchResult()
+        with self.batch():
+            for item in items:
+                try:
+                    title, priority, due_date = self._item_fields(item)
+                    error = self._validate_task(title, priority, due_date)
+                except (KeyError, IndexError, TypeError, AttributeError) as e:
+                    error = f"некорректные данные задачи: {e!r}"
+                if error:
+                    result.errors.append((item, error))
+                    continue
+                result.succeeded.append(self._add(title, priority, due_date).id)
+        return result
+
+    def remove_many(self, task_ids: Iterable[int]) -> "BatchResult":
+        """Удалить много задач с одним сохранением"""
+        return self._apply_many(task_ids, self._remove)
+
+    def mark_completed_many(self, task_ids: Iterable[int]) -> "BatchResult":
+        """Отметить много задач выполненными с одним сохранением"""
+        return self._apply_many(task_ids, self._complete)
+
+    def edit_many(self, changes: Any) -> "BatchResult":
+        """Отредактировать много задач с одним сохранением
+
+        changes — словарь {id: {поле: значение}} или пары (id, {поле: значение}).
+        """
+        if isinstance(changes, dict):
+            changes = changes.items()
+        result = BatchResult()
+        with self.batch():
+            for task_id, fields in changes:
+                error = self._validate_fields(fields)
+                if error:
+                    result.errors.append((task_id, error))
+                    continue
+                try:
+                    task = self._edit(task_id, **fields)
+                except TypeError as e:
+                    result.errors.append((task_id, f"некорректные поля: {e}"))
+                    continue
+                if task is None:
+                    result.errors.append((task_id, "задача не найдена"))
+                else:
+                    result.succeeded.append(task_id)
+        return result
+
+    def _apply_many(
+        self, task_ids: Iterable[int], operation: Callable[[int], Optional[Task]]
+    ) -> "BatchResult":
+        result = BatchResult()
+        with self.batch():
+            for task_id in task_ids:
+                if operation(task_id) is None:
+                    result.errors.append((task_id, "задача не найдена"))
+                else:
+                    result.succeeded.append(task_id)
+        return result
+
+    def export_tasks(
+        self,
+        target: Union[str, TextIO],
+        fmt: Optional[str] = None,
+        compression: Optional[str] = None,
+        progress: Optional[Callable[[int], None]] = None,
+        progress_every: int = 10_000,
+    ) -> int:
+        """Записать все задачи в файл потоком; вернуть их число
+
+        target — имя файла или открытый текстовый файл. Формат (json,
+        ndjson, csv) и сжатие (gzip, lzma) по умолчанию определяются по
+        имени файла, например tasks.ndjson.gz (см. stream_format). Задачи
+        пишутся по одной, без общего списка словарей. progress(число)
+        вызывается каждые progress_every задач.
+        """
+        if isinstance(target, str):
+            guessed_fmt, guessed_compression = stream_format(target)
+            out = open_stream(
+                target, "w", compression if compression else guessed_compression
+            )
+        else:
+            guessed_fmt = "json"
+            out = target
+        try:
+            with self._reading():
+                tasks = with_progress(self._store, progress, progress_every)
+                return write_task_records(tasks, out, fmt or guessed_fmt)
+        finally:
+            if out is not target:
+                out.close()
+
+    def import_tasks(
+        self,
+        source: Union[str, TextIO],
+        fmt: Optional[str] = None,
+        compression: Optional[str] = None,
+        dedupe: bool = True,
+        progress: Optional[Callable[[int], None]] = None,
+        progress_every: int = 10_000,
+    ) -> ImportResult:
+        """Добавить задачи из файла потоком, с одним сохранением
+
+        Формат и сжатие — как в export_tasks. Статус и даты задач
+        сохраняются, номера назначаются заново. При dedupe запись с теми же
+        названием, приоритетом, сроком и временем создания, что у
+        имеющейся или уже прочитанной задачи, пропускается. Ошибки в
+        отдельных записях не прерывают импорт, а попадают в результат;
+        на испорченном файле (неверный JSON) — ValueError, а задачи до
+        испорченного места остаются добавленными.
+        """
+        if isinstance(source, str):
+            guessed_fmt, guessed_compression = stream_format(source)
+            f = open_stream(
+                source, "r", compression if compression else guessed_compression
+            )
+        else:
+            guessed_fmt = "json"
+            f = source
+        result = ImportResult()
+        # Вместо самих ключей храним их хэши: на миллионах задач это в разы
+        # меньше памяти, а совпадение 64-битных хэшей разных задач маловероятно
+        seen: Set[int] = set()
+        if dedupe:
+            with self._reading():
+                seen.update(hash(self._import_key(task)) for task in self._store)
+        try:
+            records = iter_task_records(f, fmt or guessed_fmt)
+            with self.batch():
+                for number, data in enumerate(
+                    with_progress(records, progress, progress_every), 1
+                ):
+                    try:
+                        task = self._imported_task(data)
+                    except ValueError as e:
+                        result.failed += 1
+                        if len(result.errors) < result.MAX_ERRORS:
+                            result.errors.append((number, str(e)))
+                        continue
+                    if dedupe:
+                        key = hash(self._import_key(task))
+                        if key in seen:
+                            result.duplicates += 1
+                            continue
+                        seen.add(key)
+                    self._insert(task)
+                    result.added += 1
+        finally:
+            if f is not source:
+                f.close()
+        return result
+
+    @staticmethod
+    def _import_key(task: Task) -> Tuple[str, str, str, str]:
+        return task.title, task.priority, task.due_date, task.created_at
+
+    @classmethod
+    def _imported_task(cls, data: Any) -> Task:
+        """Построить задачу из записи файла; ошибки — ValueError с текстом"""
+        if not isinstance(data, dict):
+            raise ValueError("запись задачи должна быть объектом")
+        title = data.get("title")
+        priority = data.get("priority") or "средний"
+        due_date = data.get("due_date") or ""
+        if not all(isinstance(value, str) for value in (title, priority, due_date)):
+            raise ValueError("title, priority и due_date должны быть строками")
+        error = cls._validate_task(title, priority)
+        if error:
+            raise ValueError(error)
+        try:
+            # Срок разбирается один раз: и проверка, и приведение к ГГГГ-ММ-ДД
+            due_date = parse_due_date(due_date)
+        except ValueError:
+            raise ValueError(
+                f"срок должен быть датой в виде ГГГГ-ММ-ДД: {due_date}"
+            ) from None
+        completed = data.get("completed", False)
+        if isinstance(completed, str):
+            # Так completed записан в CSV
+            completed = completed.strip().lower() in ("1", "true", "да")
+        created_at = data.get("created_at")
+        completed_at = data.get("completed_at") if completed else ""
+        if not created_at or (completed and not completed_at):
+            # Недостающее время — время импорта
+            now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            created_at = created_at or now
+            if completed:
+                completed_at = completed_at or now
+        return Task.from_row(
+            (
+                None,
+                title,
+                priority,
+                due_date,
+                bool(completed),
+                str(created_at),
+                str(completed_at),
+            )
+        )
+
+    @staticmethod
+    def _item_fields(item: Any) -> Tuple[str, str, str]:
+        """Достать (title, priority, due_date) из словаря или кортежа"""
+        if isinstance(item, dict):
+            return (
+                item["title"],
+                item.get("priority", "средний"),
+                item.get("due_date", ""),
+            )
+        values = list(item)
+        priority = values[1] if len(values) > 1 else "средний"
+        due_date = values[2] if len(values) > 2 else ""
+        return values[0], priority, due_date
+
+    @classmethod
+    def _validate_task(
+        cls, title: str, priority: str, due_date: str = ""
+    ) -> Optional[str]:
+        """Проверить данные новой задачи; вернуть текст ошибки или None"""
+        error = cls._validate_fields(
+            {"title": title, "priority": priority, "due_date": due_date}
+        )
+        if error:
+            return error
+        # У новой задачи описание и приоритет обязательны
+        if not title or not title.strip():
+            return "описание задачи не может быть пустым!"
+        if not priority or priority.lower() not in PRIORITY_RANK:
+            return f"приоритет должен быть один из: {', '.join(PRIORITY_RANK)}"
+        return None
+
+    @staticmethod
+    def _validate_fields(fields: Dict[str, Any]) -> Optional[str]:
+        """Проверить изменяемые поля задачи; вернуть текст ошибки или None
+
+        Пустое значение (None или "") означает, что поле не меняется.
+        """
+        for key in ("title", "priority", "due_date"):
+            value = fields.get(key)
+            if value is not None and not isinstance(value, str):
+                return f"поле {key} должно быть строкой, а не {value!r}"
+        title = fields.get("title")
+        if title and not title.strip():
+            return "описание задачи не может быть пустым!"
+        priority = fields.get("priority")
+        if priority and priority.lower() not in PRIORITY_RANK:
+            return f"приоритет должен быть один из: {', '.join(PRIORITY_RANK)}"
+        due_date = fields.get("due_date")
+        if due_date:
+            try:
+                parse_due_date(due_date)
+            except ValueError:
+                return f"срок должен быть датой в виде ГГГГ-ММ-ДД: {due_date}"
+        return None
+
+    def _add(self, title: str, priority: str, due_date: str) -> Task:
+        return self._insert(Task(title, priority, parse_due_date(due_date)))
+
+    def _insert(self, task: Task) -> Task:
+        with self._lock.write():
+            self._store.insert(task)
+            # Хранилище может держать задачу в своём виде (например, ColumnarStorage)
+            task = self._store.get(task.id)
+            save_needed = self._persist({"op": "add", "task": task.to_dict()})
+        self._save_if_needed(save_needed)
+        return task
+
+    def _remove(self, task_id: int) -> Optional[Task]:
+        with self._lock.write():
+            removed_task = self._store.delete(task_id)
+            if removed_task is None:
+                return None
+            save_needed = self._persist({"op": "remove", "id": task_id})
+        self._save_if_needed(save_needed)
+        return removed_task
+
+    def _edit(self, task_id: int, **kwargs) -> Optional[Task]:
+        with self._lock.write():
+            task = self.get_task(task_id)
+            if task is None:
+                return None
+            if kwargs.get("due_date"):
+                kwargs["due_date"] = parse_due_date(kwargs["due_date"])
+            task.edit(**kwargs)
+            fields = {key: value for key, value in kwargs.items() if value}
+            save_needed = self._persist({"op": "edit", "id": task_id, "fields": fields})
+        self._save_if_needed(save_needed)
+        return task
+
+    def _complete(self, task_id: int) -> Optional[Task]:
+        with self._lock.write():
+            task = self.get_task(task_id)
+            if task is None:
+                return None
+            task.mark_completed()
+            # Время выполнения пишем в запись: при повторном применении
+            # журнала оно не должно смениться временем загрузки
+            save_needed = self._persist(
+                {"op": "complete", "id": task_id, "completed_at": task.completed_at}
+            )
+        self._save_if_needed(save_needed)
+        return task
+
+    def get_task(self, task_id: int) -> Optional[Task]:
+        """Найти задачу по идентификатору"""
+        with self._reading():
+            return self._store.get(task_id)
+
+    @property
+    def tasks(self) -> List[Task]:
+        """Список задач в порядке добавления"""
+        with self._reading():
+            return list(self._store)
+
+    @tasks.setter
+    def tasks(self, tasks: Iterable[Task]) -> None:
+        with self._lock.write():
+            self._store.replace_all(tasks)
+
+    def __len__(self) -> int:
+        with self._reading():
+            return len(self._store)
+
+    def __iter__(self) -> Iterator[Task]:
+        if self.thread_safe:
+            # Обход идёт по копии списка: блокировку нельзя держать между шагами
+            return iter(self.tasks)
+        return iter(self._store)
+
+    def find_tasks(
+        self,
+        completed: Optional[bool] = None,
+        priority: Optional[str] = None,
+        due_before: Optional[str] = None,
+    ) -> List[Task]:
+        """Найти задачи по статусу, приоритету и сроку (строго раньше due_before)"""
+        with self._reading():
+            return self._store.query(completed, priority, due_before)
+
+    def search(self, query: str, limit: Optional[int] = 20) -> List[Task]:
+        """Найти задачи по словам в названии
+
+        Каждое слово запроса должно быть началом какого-нибудь слова названия
+        (регистр и ё/е не важны). Выше стоят задачи с большим числом точных
+        совпадений слов, при равенстве — добавленные раньше.
+        """
+        # Повтор слова в запросе ничего не меняет
+        words = list(dict.fromkeys(tokenize(query)))
+        with self._reading():
+            return self._store.search(words, limit)
+
+    def overdue(
+        self, now: Optional[date] = None, limit: Optional[int] = None
+    ) -> List[Task]:
+        """Невыполненные задачи, срок которых прошёл (раньше дня now),
+        начиная с самых просроченных
+        """
+        with self._reading():
+            return self._store.deadlines(None, self._day(now), limit)
+
+    def due_within(
+        self,
+        delta: timedelta,
+        now: Optional[date] = None,
+        limit: Optional[int] = None,
+    ) -> List[Task]:
+        """Невыполненные задачи со сроком от дня now до дня now + delta
+        включительно, в порядке срока
+        """
+        end = self._day(now, delta + timedelta(days=1))
+        with self._reading():
+            return self._store.deadlines(self._day(now), end, limit)
+
+    def next_due(self, n: int = 20, now: Optional[date] = None) -> List[Task]:
+        """n ближайших по сроку невыполненных задач, срок которых не прошёл"""
+        with self._reading():
+            return self._store.deadlines(self._day(now), None, n)
+
+    def select(self, query: Union[str, Query]) -> List[Task]:
+        """Выполнить запрос (см. Query), например
+        "status=pending priority>=средний sort=due limit=20"
+
+        Ошибка в запросе — ValueError.
+        """
+        if isinstance(query, str):
+            query = compile_query(query)
+        with self._reading():
+            plan = self._store.plan(query)
+            return query.apply(plan.candidates(), plan.ordered, plan.presorted)
+
+    def explain(self, query: Union[str, Query]) -> str:
+        """Описать, как будет выполнен запрос: выбранный индекс и число
+        кандидатов, проверки, сортировку и страницу
+        """
+        if isinstance(query, str):
+            query = compile_query(query)
+        with self._reading():
+            plan = self._store.plan(query)
+            total = len(self._store)
+        lines = [
+            f"запрос: {query}",
+            f"план: {plan.description} (кандидатов: {plan.estimate} из {total})",
+        ]
+        if query.conditions:
+            checks = ", ".join(
+                Query._format(*condition) for condition in query.conditions
+            )
+            lines.append(f"проверка: {checks}")
+        order = ", ".join(
+            f"-{field}" if descending else field for field, descending in query.sort
+        )
+        if plan.presorted:
+            order += " (порядок индекса, без сортировки)"
+        lines.append(f"порядок: {order or 'по номеру'}")
+        if query.limit is not None or query.offset:
+            lines.append(f"страница: offset={query.offset} limit={query.limit}")
+        return "\n".join(lines)
+
+    @staticmethod
+    def _day(now: Optional[date], shift: timedelta = timedelta()) -> str:
+        """День now (по умолчанию сегодня) со сдвигом в виде ГГГГ-ММ-ДД"""
+        if now is None:
+            now = date.today()
+        return (now + shift).strftime("%Y-%m-%d")
+
+    def _reading(self) -> ContextManager[None]:
+        """Блокировка для чтения задач (берётся только в потокобезопасном режиме)"""
+        if not self.thread_safe:
+            return nullcontext()
+        # Ленивое хранилище при чтении дочитывает файл, то есть меняется само
+        if getattr(self._store, "fully_loaded", True):
+            return self._lock.read()
+        return self._lock.write()
+
+    def _task_changed(self, task: Task, field: str, old: Any) -> None:
+        """Обработать изменение поля задачи"""
+        self._store.task_changed(task, field, old)
+
+    def archive_completed(self, older_than_days: int = 30) -> int:
+        """Перенести в архив задачи, выполненные больше older_than_days дней назад
+
+        Возвращает количество перенесённых задач.
+        """
+        cutoff = (datetime.now() - timedelta(days=older_than_days)).strftime(
+            "%Y-%m-%d %H:%M:%S"
+        )
+        with self.batch():
+            with self._lock.write():
+                # У задач из старых файлов нет времени выполнения — берём создание
+                old_tasks = [
+                    task
+                    for task in self.find_tasks(completed=True)
+                    if (task.completed_at or task.created_at) <= cutoff
+                ]
+                if not old_tasks:
+                    return 0
+                try:
+                    self._append_archive([task.to_dict() for task in old_tasks])
+                except Exception as e:
+                    print(f"Ошибка при записи архива: {e}")
+                    return 0
+                for task in old_tasks:
+                    self._remove(task.id)
+        print(f"В архив перенесено задач: {len(old_tasks)}")
+        return len(old_tasks)
+
+    def find_archived(
+        self, priority: Optional[str] = None, due_before: Optional[str] = None
+    ) -> List[Task]:
+        """Найти задачи в архиве (файл архива читается при первом обращении)
+
+        Архивные задачи — отдельные копии: их изменения не сохраняются.
+        """
+        with self._reading(), self._archive_lock:
+            tasks = self._load_archive()
+        return [
+            task
+            for task in tasks
+            if (priority is None or task.priority == priority.lower())
+            and (due_before is None or (task.due_date and task.due_date < due_before))
+        ]
+
+    def _load_archive(self) -> List[Task]:
+        """Прочитать архив в память (один раз) и вернуть задачи из него"""
+        if self._archive is None:
+            archived: Dict[int, Task] = {}
+            if os.path.exists(self.archive_filename):
+                import gzip
+
+                try:
+                    with gzip.open(self.archive_filename, "rb") as f:
+                        for line in f:
+                            task = Task.from_dict(json.loads(line.decode("utf-8")))
+                            archived[task.id] = task
+                except (OSError, EOFError, ValueError) as e:
+                    # Недописанная порция после сбоя: всё до неё уже прочитано
+                    print(f"Ошибка при чтении архива: {e}")
+            self._archive = sorted(archived.values(), key=lambda task: task.id)
+        # После сбоя между записью архива и снимка задача может остаться
+        # и в основном списке — там её копия главнее
+        return [task for task in self._archive if self.get_task(task.id) is None]
+
+    def _append_archive(self, records: List[dict]) -> None:
+        """Дописать задачи в архив отдельной порцией gzip"""
+        index = {
+            "count": self._archive_index["count"] + len(records),
+            "next_id": max(
+                self._archive_index["next_id"],
+                max(record["id"] for record in records) + 1,
+            ),
+        }
+        # Индекс пишем первым: даже после сбоя идентификаторы архивных задач
+        # не будут выданы новым задачам
+        atomic_write(self.archive_index_filename, json.dumps(index).encode("utf-8"))
+        import gzip
+
+        data = "".join(self._journal_line(record) for record in records)
+        with open(self.archive_filename, "ab") as raw:
+            # Каждая порция — отдельный член gzip, старые данные не перепаковываются
+            with gzip.GzipFile(fileobj=raw, mode="ab") as f:
+                f.write(data.encode("utf-8"))
+            raw.flush()
+            os.fsync(raw.fileno())
+        self._archive_index = index
+        self._store.reserve_ids(index["next_id"])
+        if self._archive is not None:
+            self._archive.extend(Task.from_dict(record) for record in records)
+
+    def _load_archive_index(self) -> None:
+        """Прочитать индекс архива, не трогая сам архив"""
+        if not os.path.exists(self.archive_index_filename):
+            return
+        try:
+            with open(self.archive_index_filename, "r", encoding="utf-8") as f:
+                index = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Ошибка при чтении индекса архива: {e}")
+            return
+        self._archive_index = {
+            "count": index.get("count", 0),
+            "next_id": index.get("next_id", 0),
+        }
+        self._store.reserve_ids(self._archive_index["next_id"])
+
+    def iter_tasks(
+        self,
+        completed: Optional[bool] = None,
+        priority: Optional[str] = None,
+        due_before: Optional[str] = None,
+        offset: int = 0,
+        limit: Optional[int] = None,
+        archived: bool = False,
+    ) -> Iterator[Task]:
+        """Задачи по фильтрам в порядке номеров, начиная с offset-й подходящей
+
+        Задачи проверяются по мере обхода: с limit обход останавливается на
+        последней нужной задаче и не читает остаток списка. С archived=True
+        к выполненным задачам добавляются архивные.
+        """
+        if priority is not None:
+            priority = priority.lower()
+
+        def matches(task: Task) -> bool:
+            return (
+                (completed is None or task.completed == completed)
+                and (priority is None or task.priority == priority)
+                and (
+                    due_before is None
+                    or bool(task.due_date and task.due_date < due_before)
+                )
+            )
+
+        stop = None if limit is None else offset + limit
+
+        def generate() -> Iterator[Task]:
+            tasks: Iterable[Task]
+            if completed is None and priority is None and due_before is None:
+                # Без фильтров хранилище само пропускает первые offset задач
+                if not archived:
+                    return self._store.page(offset, stop)
+                tasks = self._store
+            else:
+                tasks = self._filtered(matches, completed, priority, due_before, stop)
+            if archived and completed is not False:
+                # Обе последовательности уже упорядочены по номеру
+                tasks = merge(
+                    tasks,
+                    self.find_archived(priority, due_before),
+                    key=lambda task: task.id,
+                )
+            return islice(tasks, offset, stop)
+
+        if self.thread_safe:
+            # Блокировку нельзя держать между шагами обхода — берём страницу
+            with self._reading():
+                return iter(list(generate()))
+        return generate()
+
+    def _filtered(
+        self,
+        matches: Callable[[Task], bool],
+        completed: Optional[bool],
+        priority: Optional[str],
+        due_before: Optional[str],
+        wanted: Optional[int],
+    ) -> Iterable[Task]:
+        """Задачи под фильтры iter_tasks по возрастанию номера
+
+        Кандидаты берутся из индексов хранилища (см. TaskStorage.plan).
+        Обход всего списка остаётся, когда подходящих задач много (особенно
+        если нужны лишь первые wanted: обход остановится раньше, чем
+        переберётся индекс), и когда файл ленивого хранилища ещё не дочитан.
+        """
+        import shlex
+
+        store = self._store
+        if wanted is not None and not getattr(store, "fully_loaded", True):
+            return filter(matches, store)
+        terms = []
+        if completed is not None:
+            terms.append("status=done" if completed else "status=pending")
+        if priority is not None:
+            terms.append(f"priority={priority}")
+        if due_before is not None:
+            terms.append(f"due<{due_before}")
+        try:
+            query = compile_query(" ".join(map(shlex.quote, terms)))
+        except ValueError:
+            # Значение не годится для запроса (например, приоритет, которого
+            # нет в PRIORITY_RANK) — фильтры учтёт query() хранилища
+            return store.query(completed, priority, due_before)
+        plan = store.plan(query)
+        if plan.ordered:
+            return filter(matches, plan.candidates())
+        # Подходящие задачи встречаются в списке с частотой estimate / размер,
+        # поэтому обход по номерам остановится, пройдя около expected задач.
+        # Кандидат из индекса обходится примерно вдвое дороже (поиск задачи по
+        # номеру и сортировка), и индекс выгоден, только когда их заметно меньше
+        expected = len(store)
+        if wanted is not None:
+            expected = min(expected, wanted * expected // max(plan.estimate, 1))
+        if expected < 2 * plan.estimate:
+            return filter(matches, store)
+        return sorted(filter(matches, plan.candidates()), key=lambda task: task.id)
+
+    def list_tasks(
+        self,
+        status_filter: str = "все",
+        offset: int = 0,
+        limit: Optional[int] = None,
+        fmt: str = "text",
+        out: Optional[TextIO] = None,
+    ) -> int:
+        """Вывести список задач с фильтрацией; вернуть число выведенных задач
+
+        status_filter — "все", "невыполненные", "выполненные" или запрос
+        (см. Query), например "priority>=средний sort=due". offset и limit
+        выводят одну страницу списка. Форматы tsv и ndjson выводят только
+        строки задач, без заголовка и итогов (см. render_tasks).
+        """
+        # Весь вывод строится по одному согласованному состоянию списка
+        with self._reading():
+            return self._print_tasks(status_filter, offset, limit, fmt, out)
+
+    def _print_tasks(
+        self,
+        status_filter: str,
+        offset: int,
+        limit: Optional[int],
+        fmt: str,
+        out: Optional[TextIO],
+        page: Optional[Iterator[Task]] = None,
+    ) -> int:
+        # page — готовые задачи страницы (например, продолжение обхода,
+        # с которого выведены предыдущие страницы); offset тогда только для
+        # нумерации в итогах
+        tasks: Iterator[Task]
+        if status_filter in self.STATUS_FILTERS:
+            completed = self.STATUS_FILTERS[status_filter]
+            if page is not None:
+                tasks = page
+            else:
+                tasks = self.iter_tasks(
+                    completed, offset=offset, limit=limit, archived=bool(completed)
+                )
+        else:
+            # Любой другой фильтр — запрос (см. Query); архив в нём не участвует
+            try:
+                query = compile_query(status_filter)
+            except ValueError as e:
+                print(f"Ошибка: {e}", file=out)
+                return 0
+            completed = None
+            stop = None if limit is None else offset + limit
+            tasks = islice(self.select(query), offset, stop)
+        if fmt != "text":
+            return write_buffered(render_tasks(tasks, fmt), out)
+
+        archived_count = self._archive_index["count"]
+        # Проверяем пустоту по первой задаче, не подсчитывая весь список
+        if next(iter(self._store), None) is None and not archived_count:
+            print("Список задач пуст!", file=out)
+            return 0
+
+        first = next(tasks, None)
+        if first is None:
+            print(f"Нет задач с фильтром '{status_filter}'!", file=out)
+            if archived_count and status_filter != "выполненные":
+                print(f"В архиве выполненных задач: {archived_count}", file=out)
+            return 0
+
+        archived_ids = set()
+        if completed:
+            # Только здесь нужен архив: он читается при первом таком запросе
+            archived_ids = {task.id for task in self.find_archived()}
+
+        print("\n" + "=" * 50, file=out)
+        print(f"СПИСОК ЗАДАЧ (фильтр: {status_filter}):", file=out)
+        print("=" * 50, file=out)
+        # Печатаем постоянный идентификатор: по нему задачу можно выбрать
+        # из любого отфильтрованного списка. Задачи уходят в вывод крупными
+        # порциями, а не print на каждую
+        shown = write_buffered(
+            render_tasks(chain([first], tasks), fmt, archived_ids), out
+        )
+        if offset or shown == limit:
+            # Сколько задач дальше, неизвестно: остаток списка не просматривался
+            print(f"\nПоказаны задачи: {offset + 1}–{offset + shown}", file=out)
+        else:
+            print(f"\nВсего задач: {shown}", file=out)
+        if archived_count and status_filter != "выполненные":
+            print(f"В архиве выполненных задач: {archived_count}", file=out)
+        return shown
+
+    def save_to_file(self) -> None:
+        """Сохранить список задач в файл JSON
+
+        Файл заменяется атомарно: новая версия пишется во временный файл,
+        сбрасывается на диск и переименовывается поверх старой, поэтому сбой
+        посреди записи не оставляет обрезанный tasks.json. Одновременные
+        вызовы из разных потоков объединяются: пока идёт запись, остальные
+        ждут, и следующая запись сохраняет изменения их всех за один fsync.
+        """
+        if self._store.persistent:
+            # Хранилище уже сохранило каждое изменение, файл JSON не нужен
+            with self._lock.write():
+                self._store.flush()
+            return
+
+        with self._commit_condition:
+            self._save_requested += 1
+            request = self._save_requested
+            while self._save_completed < request:
+                if not self._saving:
+                    self._saving = True
+                    break
+                self._commit_condition.wait()
+            else:
+                # Запись, начатая после нашего запроса, уже всё сохранила
+                return
+            # Снимок ниже включит изменения всех запросов, поступивших до этого
+            covered = self._save_requested
+
+        try:
+            self._write_snapshot()
+        finally:
+            with self._commit_condition:
+                self._saving = False
+                self._save_completed = max(self._save_completed, covered)
+                self._commit_condition.notify_all()
+
+    def _write_snapshot(self) -> None:
+        """Записать полный снимок задач в файл JSON"""
+        try:
+            self._preserve_unreadable_file()
+            with self._file_lock(exclusive=True):
+                self._write_snapshot_locked()
+        except Exception as e:
+            print(f"Ошибка при сохранении файла: {e}")
+
+    def _write_snapshot_locked(self) -> None:
+        """Записать снимок (в совместном режиме — под блокировкой файла)"""
+        if self.shared:
+            # Снимок и сброс отметок изменений должны совпасть, поэтому здесь
+            # изменения других потоков ждут, пока снимок не будет взят
+            with self._lock.write():
+                self._merge_from_file()
+                tasks_data = self._stamp_versions()
+                journal_mark = self._journal_bytes
+        else:
+            # Снимок словарей берём под блокировкой, сериализуем уже без неё
+            with self._lock.read():
+                tasks_data = [task.to_dict() for task in self._store]
+                journal_mark = self._journal_bytes
+        content = json.dumps(tasks_data, ensure_ascii=False, indent=2)
+        data = content.encode("utf-8")
+        crc = zlib.crc32(data)
+        # Контрольную сумму пишем до замены файла и храним рядом прежнюю:
+        # после сбоя между двумя записями подойдёт одна из них
+        previous = self._snapshot_crc
+        if previous is None and os.path.exists(self.filename):
+            previous = file_crc(self.filename)
+        checksum = {"crc32": crc, "size": len(data), "previous": previous}
+        atomic_write(self.checksum_filename, json.dumps(checksum).encode("utf-8"))
+        atomic_write(self.filename, data)
+        with self._lock.write():
+            self._snapshot_crc = crc
+            self._rotate_journal(journal_mark)
+            if self.shared:
+                self._file_stamp = self._stat_stamp()
+        self._write_cache_soon(tasks_data, crc)
+
+    def refresh(self) -> None:
+        """Влить изменения, сохранённые другими процессами (совместный режим)
+
+        Перечитываются только записи, версия которых изменилась.
+        """
+        if not self.shared:
+            return
+        try:
+            with self._file_lock(exclusive=False), self._lock.write():
+                self._merge_from_file()
+        except Exception as e:
+            print(f"Ошибка при чтении файла: {e}")
+
+    @contextmanager
+    def _file_lock(self, exclusive: bool) -> Iterator[None]:
+        """Рекомендательная блокировка файла задач между процессами
+
+        Блокируется отдельный файл рядом: сам tasks.json заменяется при
+        каждом сохранении, и блокировка старого файла ничего бы не дала.
+        """
+        if not self.shared:
+            yield
+            return
+        if not (
+            exclusive
+            or os.path.exists(self.filename)
+            or os.path.exists(self.journal_filename)
+        ):
+            # Читать нечего — и файл блокировки заводить незачем
+            yield
+            return
+        with lock_file(self.lock_filename, exclusive):
+            yield
+
+    def _stat_stamp(self) -> Optional[Tuple[int, int, int]]:
+        """Отметка файла задач: меняется при каждой его замене"""
+        try:
+            stat = os.stat(self.filename)
+        except FileNotFoundError:
+            return None
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    def _merge_from_file(self) -> None:
+        """Влить в память изменения из файла, если его заменил другой процесс,
+        и записи, дописанные другими процессами в журнал
+
+        Вызывается под блокировкой файла и блокировкой на запись.
+        """
+        stamp = self._stat_stamp()
+        # Если файл не менялся с нашей последней синхронизации, его не читаем
+        if stamp is not None and stamp != self._file_stamp:
+            with open(self.filename, "rb") as f:
+                data = f.read()
+            crc = zlib.crc32(data)
+            self._merge_records(
+                json.loads(data.decode("utf-8")) if data.strip() else []
+            )
+            self._verify_checksum(crc)
+            self._snapshot_crc = crc
+            self._file_stamp = stamp
+            # Журнал рядом с новым снимком читается с начала
+            self._journal_bytes = 0
+        self._merge_journal()
+
+    def _merge_journal(self) -> None:
+        """Применить ещё не прочитанные записи журнала другого процесса
+
+        Журнал дописывают команды командной строки (см. main). Как и при
+        слиянии снимка, наши несохранённые правки полей побеждают, наша
+        удалённая задача не возвращается, а наша новая задача с занятым
+        идентификатором получает новый.
+        """
+        try:
+            size = os.path.getsize(self.journal_filename)
+        except OSError:
+            return
+        if size <= self._journal_bytes:
+            return
+        try:
+            with open(self.journal_filename, "rb") as f:
+                if self._journal_bytes == 0:
+                    header_line = f.readline()
+                    header = json.loads(header_line.decode("utf-8") or "null")
+                    if not header or header.get("crc") != self._snapshot_crc:
+                        # Журнал от другого снимка: его записи уже в файле
+                        return
+                    self._journal_bytes = len(header_line)
+                else:
+                    f.seek(self._journal_bytes)
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break
+                    self._merge_journal_record(json.loads(line.decode("utf-8")))
+                    self._journal_bytes += len(line)
+        except Exception as e:
+            print(f"Ошибка при чтении журнала: {e}")
+
+    def _merge_journal_record(self, record: dict) -> None:
+        """Применить запись чужого журнала поверх наших изменений"""
+        op = record["op"]
+        if op == "add":
+            task = Task.from_dict(record["task"])
+            ours = self._store.delete(task.id) if task.id is not None else None
+            self._store.insert(task)
+            if ours is not None:
+                # Чужая новая задача заняла идентификатор нашей новой
+                ours.id = None
+                self._store.insert(ours)
+            return
+        task = self._store.get(record["id"])
+        if task is None:
+            # Мы удалили задачу: запись уйдёт при сохранении
+            return
+        dirty = task.dirty_fields
+        if op == "remove":
+            self._store.delete(task.id)
+        elif op == "edit":
+            task.edit(
+                **{
+                    field: value
+                    for field, value in record["fields"].items()
+                    if field not in dirty
+                }
+            )
+        elif op == "complete" and "completed" not in dirty:
+            task.mark_completed()
+            if record.get("completed_at"):
+                task.completed_at = record["completed_at"]
+
+    def _merge_records(self, records: List[dict]) -> None:
+        """Слить записи файла с задачами в памяти по версиям записей
+
+        Записи с прежней версией пропускаются, не превращаясь в задачи. Из
+        изменённых записей берутся поля, которые мы сами не меняли. Удаление
+        побеждает изменение, а наши новые задачи, чьи идентификаторы уже
+        заняты чужими, получают новые.
+        """
+        base = self._base_versions
+        on_disk = set()
+        relocated = []
+        for record in records:
+            task_id = record.get("id")
+            if task_id is None:
+                continue
+            on_disk.add(task_id)
+            version = record.get("version", 0)
+            if base.get(task_id) == version:
+                continue
+            task = self._store.get(task_id)
+            if task is not None and task_id not in base:
+                # Чужая новая задача заняла идентификатор нашей новой
+                relocated.append(self._store.delete(task_id))
+                task = None
+            if task is None:
+                if task_id not in base:
+                    self._store.insert(Task.from_dict(record))
+                # Иначе мы удалили эту задачу: запись уйдёт при сохранении
+            else:
+                self._update_from_record(task, record)
+            base[task_id] = version
+
+        for task_id in [task_id for task_id in base if task_id not in on_disk]:
+            # Другой процесс удалил задачу: удаление побеждает и наши
+            # несохранённые правки, иначе сохранение вернуло бы её в файл
+            del base[task_id]
+            self._store.delete(task_id)
+
+        for task in relocated:
+            task.id = None
+            self._store.insert(task)
 
-    def mark_completed(self) -> None:
-        """Отметить задачу как выполненную"""
-        self.completed = True
+    @staticmethod
+    def _update_from_record(task: Task, record: dict) -> None:
+        """Перенести в задачу поля записи, которые не менялись у нас"""
+        dirty = task.dirty_fields
+        for field in ("title", "priority", "due_date", "completed"):
+            if field not in dirty:
+                setattr(task, field, record[field])
+        if "completed" not in dirty:
+            task.completed_at = record.get("completed_at", "")
+        # Поля из файла уже сохранены — отметки изменений оставляем только наши
+        task._dirty = set(dirty) or None
 
-    def edit(
-        self,
-        title: Optional[str] = None,
-        priority: Optional[str] = None,
-        due_date: Optional[str] = None,
-    ) -> None:
-        """Редактировать параметры задачи"""
-        if title:
-            self.title = title
-        if priority:
-            self.priority = priority.lower()
-        if due_date:
-            self.due_date = due_date
+    def _stamp_versions(self) -> List[dict]:
+        """Словари задач для снимка с версиями записей
 
-    def show(self) -> str:
-        """Вывести информацию о задаче в виде строки"""
-        status = "ВЫПОЛНЕНО" if self.completed else "НЕ ВЫПОЛНЕНО"
-        priority_display = f"{self.priority.upper()}"
+        Версия растёт только у новых и изменённых задач; вызывается под
+        блокировкой на запись, отметки изменений сбрасываются.
+        """
+        base = {}
+        tasks_data = []
+        for task in self._store:
+            version = self._base_versions.get(task.id)
+            if version is None or task.dirty_fields:
+                version = (version or 0) + 1
+                task.clear_dirty()
+            item = task.to_dict()
+            item["version"] = version
+            base[task.id] = version
+            tasks_data.append(item)
+        self._base_versions = base
+        return tasks_data
 
-        result = f"[{status}] {self.title}\n"
-        result += f"   Приоритет: {priority_display}\n"
-        result += f"   Создана: {self.created_at}\n"
-        if self.due_date:
-            result += f"   Срок: {self.due_date}\n"
-        return result
+    def load_from_file(self) -> None:
+        """Загрузить список задач из файла JSON"""
+        if self._store.persistent:
+            # Задачи читаются из хранилища по требованию
+            return
 
-    def to_dict(self) -> dict:
-        """Преобразовать задачу в словарь для сохранения в файл"""
-        return {
-            "title": self.title,
-            "priority": self.priority,
-            "due_date": self.due_date,
-            "completed": self.completed,
-            "created_at": self.created_at,
-        }
+        self._snapshot_crc = None
+        self._load_error = None
+        if self.lazy and isinstance(self._store, LazyMemoryStorage):
+            self._load_lazily()
+            return
 
-    @classmethod
-    def from_dict(cls, data: dict) -> "Task":
-        """Создать задачу из словаря (при загрузке из файла)"""
-        task = cls(data["title"], data["priority"], data["due_date"], data["completed"])
-        task.created_at = data["created_at"]
-        return task
+        with self._file_lock(exclusive=False):
+            loaded = self._load_snapshot()
+            # Журнал читается под той же блокировкой: в совместном режиме
+            # его может дописывать другой процесс
+            replayed = self._replay_journal() if loaded else 0
+        if not loaded:
+            return
 
+        if self.verbose and (os.path.exists(self.filename) or replayed):
+            print(f"Загружено {len(self)} задач из файла")
 
-class TaskManager:
-    """Класс для управления списком задач"""
+    def _load_snapshot(self) -> bool:
+        """Прочитать снимок из кэша или JSON; False, если файл не читается"""
+        if self.snapshot_cache and self._load_from_cache():
+            pass
+        elif os.path.exists(self.filename):
+            try:
+                with open(self.filename, "rb") as f:
+                    data = f.read()
 
-    def __init__(self, filename: str = "tasks.json"):
-        self.tasks: List[Task] = []
-        self.filename = filename
-        self.load_from_file()
+                crc = zlib.crc32(data)
+                # Пустой файл (например, только что созданный) — пустой список
+                tasks_data = json.loads(data.decode("utf-8")) if data.strip() else []
+                self.tasks = (Task.from_dict(item) for item in tasks_data)
+                self._verify_checksum(crc)
+                self._snapshot_crc = crc
+                if self.shared:
+                    self._base_versions = {
+                        item["id"]: item.get("version", 0)
+                        for item in tasks_data
+                        if item.get("id") is not None
+                    }
+                # Кэш устарел или отсутствует — пересоздаём его
+                self._write_cache_soon(tasks_data, crc)
+            except Exception as e:
+                print(f"Ошибка при загрузке файла: {e}")
+                self._load_error = str(e)
+                self.tasks = []
+                self._preserve_unreadable_file()
+                return False
+        if self.shared:
+            self._file_stamp = self._stat_stamp()
+        return True
 
-    def add_task(
-        self, title: str, priority: str = "средний", due_date: str = ""
-    ) -> None:
-        """Добавить новую задачу"""
-        if not title.strip():
-            print("Ошибка: описание задачи не может быть пустым!")
+    def _load_from_cache(self) -> bool:
+        """Загрузить задачи из бинарного кэша, если он соответствует файлу JSON
+
+        Кэш считается свежим, если совпадают время изменения, размер и
+        контрольная сумма файла JSON, записанные в заголовке кэша.
+        """
+        if not (os.path.exists(self.filename) and os.path.exists(self.cache_filename)):
+            return False
+        try:
+            stat = os.stat(self.filename)
+            with open(self.cache_filename, "rb") as f:
+                # Заголовок читаем отдельно, чтобы не читать устаревший кэш
+                (header_size,) = struct.unpack("<I", f.read(4))
+                header = marshal.loads(f.read(header_size))
+                if (
+                    header.get("version") != self.CACHE_VERSION
+                    or header.get("mtime_ns") != stat.st_mtime_ns
+                    or header.get("size") != stat.st_size
+                ):
+                    return False
+                # Контрольную сумму JSON берём из файла рядом, чтобы не читать
+                # сам JSON; без него считаем её по содержимому
+                if os.path.exists(self.checksum_filename):
+                    with open(self.checksum_filename, "r", encoding="utf-8") as c:
+                        expected = json.load(c).get("crc32")
+                else:
+                    expected = file_crc(self.filename)
+                if header.get("crc32") != expected:
+                    return False
+                # marshal.loads по байтам заметно быстрее marshal.load по файлу
+                rows = marshal.loads(f.read())
+            self.tasks = (Task.from_row(row) for row in rows)
+            if self.shared:
+                self._base_versions = {row[0]: row[7] for row in rows}
+        except Exception:
+            # Повреждённый кэш не страшен — читаем JSON
+            return False
+        self._snapshot_crc = expected
+        return True
+
+    def _write_cache_soon(self, tasks_data: List[dict], crc: int) -> None:
+        """Пересоздать бинарный кэш в фоне, не задерживая загрузку и запись
+
+        Размер и время изменения берутся сейчас, у только что прочитанного
+        или записанного файла: если его успеют заменить, кэш просто не
+        подойдёт к новому файлу.
+        """
+        if not (self.snapshot_cache and self.write_cache):
+            return
+        try:
+            stat = os.stat(self.filename)
+        except OSError:
             return
+        previous = self._cache_thread
+        if previous is not None:
+            # Кэши пишутся по порядку: более старый не затрёт новый
+            previous.join()
+
+        def write() -> None:
+            self._write_cache([_dict_to_row(item) for item in tasks_data], crc, stat)
+
+        self._cache_thread = threading.Thread(
+            target=write, name="tasks-cache", daemon=True
+        )
+        self._cache_thread.start()
+
+    def _write_cache(self, rows: List[tuple], crc: int, stat: os.stat_result) -> None:
+        """Записать бинарный кэш для файла JSON с данными stat"""
+        try:
+            header = {
+                "version": self.CACHE_VERSION,
+                "mtime_ns": stat.st_mtime_ns,
+                "size": stat.st_size,
+                "crc32": crc,
+            }
+            header_data = marshal.dumps(header)
+            atomic_write(
+                self.cache_filename,
+                struct.pack("<I", len(header_data)) + header_data + marshal.dumps(rows),
+            )
+        except Exception as e:
+            print(f"Ошибка при записи кэша: {e}")
+
+    def _verify_checksum(self, crc: int) -> None:
+        """Сверить контрольную сумму прочитанного файла с сохранённой рядом
 
-        valid_priorities = ["низкий", "средний", "высокий"]
-        if priority.lower() not in valid_priorities:
+        Файл, который разобрался без ошибок, но не совпал по сумме, скорее
+        всего изменили вне программы: он загружается, а сумма обновится
+        при следующем сохранении. В сторону откладываются только файлы,
+        которые не удалось разобрать.
+        """
+        if not os.path.exists(self.checksum_filename):
+            # Файл сохранён старой версией программы — проверять нечем
+            return
+        try:
+            with open(self.checksum_filename, "r", encoding="utf-8") as f:
+                checksum = json.load(f)
+        except (OSError, ValueError):
+            checksum = {}
+        if crc not in (checksum.get("crc32"), checksum.get("previous")):
             print(
-                f"Ошибка: приоритет должен быть один из: {', '.join(valid_priorities)}"
+                "Предупреждение: контрольная сумма файла не совпадает "
+                "(файл изменён вне программы)"
             )
+
+    def _preserve_unreadable_file(self) -> None:
+        """Отложить в сторону файл, который не удалось прочитать
+
+        Иначе следующее сохранение перезапишет его, и данные пропадут
+        безвозвратно. Копия остаётся рядом для ручного восстановления.
+        """
+        error = self._load_error or getattr(self._store, "load_error", None)
+        if not error or not os.path.exists(self.filename):
             return
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        backup = f"{self.filename}.corrupt-{stamp}"
+        os.replace(self.filename, backup)
+        if os.path.exists(self.checksum_filename):
+            os.remove(self.checksum_filename)
+        print(f"Повреждённый файл сохранён как {backup}")
+        self._load_error = None
+        if hasattr(self._store, "load_error"):
+            self._store.load_error = None
 
-        task = Task(title, priority, due_date)
-        self.tasks.append(task)
-        print(f"Задача '{title}' успешно добавлена!")
+    def _load_lazily(self) -> None:
+        """Открыть файл для потокового чтения без разбора всего списка"""
+        has_journal = os.path.exists(self.journal_filename)
+        if not os.path.exists(self.filename):
+            self.tasks = []
+        else:
+            try:
+                if self.journal or has_journal:
+                    # Журнал относится к снимку с определённой контрольной
+                    # суммой — без неё его нельзя ни применить, ни продолжить
+                    self._snapshot_crc = file_crc(self.filename)
+                    self._verify_checksum(self._snapshot_crc)
+                    self.tasks = iter_tasks_from_file(self.filename)
+                else:
+                    # Иначе файл сверяется, когда его дочитают: открытие не
+                    # должно читать весь файл ради контрольной суммы
+                    self.tasks = self._verified_tasks()
+            except Exception as e:
+                print(f"Ошибка при загрузке файла: {e}")
+                self._load_error = str(e)
+                self.tasks = []
+                self._preserve_unreadable_file()
+                return
+        if has_journal:
+            self._replay_journal()
+
+    def _verified_tasks(self) -> Iterator[Task]:
+        """Задачи файла для ленивого чтения; контрольная сумма сверяется,
+        когда файл дочитан до конца
+
+        Ошибка разбора — ошибка чтения (см. LazyMemoryStorage.load_error):
+        такой файл не будет перезаписан, а отложится в сторону.
+        """
+        yield from iter_tasks_from_file(self.filename)
+        crc = file_crc(self.filename)
+        self._verify_checksum(crc)
+        self._snapshot_crc = crc
+
+    def compact_journal(self) -> None:
+        """Свернуть журнал операций в новый снимок tasks.json"""
         self.save_to_file()
 
-    def remove_task(self, task_index: int) -> bool:
-        """Удалить задачу по индексу"""
-        if 0 <= task_index < len(self.tasks):
-            removed_task = self.tasks.pop(task_index)
-            print(f"Задача '{removed_task.title}' успешно удалена!")
-            self.save_to_file()
+    def _persist(self, record: dict) -> bool:
+        """Сохранить изменение строкой в журнал (вызывается под блокировкой)
+
+        Возвращает True, если нужна полная перезапись файла: её выполняет
+        _save_if_needed уже после снятия блокировки, чтобы параллельные
+        изменения успели попасть в одну общую запись.
+        """
+        if self._store.persistent:
+            # Хранилище записывает изменение само; внутри batch() — в конце пакета
+            if not self._batch_depth:
+                self._store.flush()
+            return False
+
+        if self._batch_depth:
+            # Внутри batch() только запоминаем изменение до выхода из блока
+            if self.journal:
+                self._batch_records.append(record)
+            self._batch_dirty = True
+            return False
+
+        if not self.journal:
             return True
-        else:
-            print(f"Ошибка: задача с индексом {task_index} не найдена!")
+
+        return self._write_journal([record])
+
+    def _save_if_needed(self, save_needed: bool) -> None:
+        if save_needed:
+            self._save_soon()
+
+    def _flush_batch(self) -> bool:
+        """Сохранить изменения, накопленные в batch(), одним действием
+
+        Вызывается под блокировкой; возвращает True, если нужна полная
+        перезапись файла (её выполняет _save_if_needed).
+        """
+        records, self._batch_records = self._batch_records, []
+        dirty, self._batch_dirty = self._batch_dirty, False
+        if not dirty or self._store.persistent:
             return False
+        if self.journal:
+            return self._write_journal(records)
+        return True
 
-    def edit_task(self, task_index: int, **kwargs) -> bool:
-        """Редактировать выбранную задачу"""
-        if 0 <= task_index < len(self.tasks):
-            self.tasks[task_index].edit(**kwargs)
-            print(f"Задача '{self.tasks[task_index].title}' успешно отредактирована!")
+    def _save_soon(self) -> None:
+        """Сохранить файл сразу или поручить это автосохранению"""
+        if self._autosaver is not None:
+            self._autosaver.touch()
+        else:
             self.save_to_file()
+
+    def flush(self) -> None:
+        """Немедленно сохранить изменения, отложенные автосохранением"""
+        if self._autosaver is not None:
+            self._autosaver.flush()
+        self._store.flush()
+
+    def close(self) -> None:
+        """Сохранить отложенные изменения и освободить ресурсы"""
+        if self._autosaver is not None:
+            self._autosaver.stop()
+            self._autosaver = None
+        if self._cache_thread is not None:
+            # Недописанный кэш не страшен, но процесс не должен обрывать запись
+            self._cache_thread.join()
+            self._cache_thread = None
+        self._store.flush()
+        self._store.close()
+
+    def _write_journal(self, records: List[dict]) -> bool:
+        """Дописать записи в журнал
+
+        Возвращает True, если нужен новый снимок: журнал превысил порог
+        или запись в него не удалась. Сам снимок пишется уже после снятия
+        блокировки — иначе он ждал бы сам себя.
+        """
+        try:
+            self._append_journal(records)
+        except Exception as e:
+            print(f"Ошибка при записи журнала: {e}")
             return True
-        else:
-            print(f"Ошибка: задача с индексом {task_index} не найдена!")
+
+        return self._journal_bytes >= self.journal_max_bytes
+
+    def _append_journal(self, records: List[dict]) -> None:
+        """Дописать компактные записи в журнал операций одной записью в файл"""
+        lines = []
+        if self._journal_bytes == 0:
+            # Заголовок связывает журнал с конкретным снимком: после сбоя
+            # между записью снимка и очисткой журнала он не применится повторно
+            lines.append(self._journal_line({"op": "base", "crc": self._snapshot_crc}))
+        lines.extend(self._journal_line(record) for record in records)
+        data = "".join(lines).encode("utf-8")
+        # Новый журнал начинается с чистого файла, старый устаревший затирается
+        mode = "ab" if self._journal_bytes else "wb"
+        with open(self.journal_filename, mode) as f:
+            f.write(data)
+        self._journal_bytes += len(data)
+
+    @staticmethod
+    def _journal_line(record: dict) -> str:
+        """Сериализовать запись журнала в одну компактную строку"""
+        return json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n"
+
+    def _rotate_journal(self, mark: int) -> None:
+        """Убрать из журнала записи, вошедшие в новый снимок
+
+        Вызывается под блокировкой. Записи, дописанные другими потоками уже
+        после того, как снимок был взят (после смещения mark), переносятся
+        в новый журнал, привязанный к новому снимку.
+        """
+        if self._journal_bytes <= mark:
+            self._reset_journal()
+            return
+        with open(self.journal_filename, "rb") as f:
+            f.seek(mark)
+            tail = f.read()
+        if mark == 0:
+            # Журнал начат после снимка: его заголовок ссылается на старый снимок
+            tail = tail.split(b"\n", 1)[1]
+        header = self._journal_line({"op": "base", "crc": self._snapshot_crc})
+        data = header.encode("utf-8") + tail
+        atomic_write(self.journal_filename, data)
+        self._journal_bytes = len(data)
+
+    def _reset_journal(self) -> None:
+        """Удалить журнал после записи нового снимка"""
+        if os.path.exists(self.journal_filename):
+            os.remove(self.journal_filename)
+        self._journal_bytes = 0
+
+    def _replay_journal(self) -> int:
+        """Применить записи журнала поверх загруженного снимка"""
+        self._journal_bytes = 0
+        if not os.path.exists(self.journal_filename):
+            return 0
+
+        applied = 0
+        try:
+            with open(self.journal_filename, "rb") as f:
+                header_line = f.readline()
+                header = json.loads(header_line.decode("utf-8") or "null")
+                if not header or header.get("crc") != self._snapshot_crc:
+                    print("Журнал операций не соответствует снимку и будет пропущен")
+                    return 0
+
+                valid_bytes = len(header_line)
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        # Недописанная строка после сбоя: всё до неё уже применено
+                        break
+                    try:
+                        record = json.loads(line.decode("utf-8"))
+                    except ValueError:
+                        break
+                    self._apply_record(record)
+                    valid_bytes += len(line)
+                    applied += 1
+
+            # Отрезаем повреждённый хвост, чтобы новые записи шли следом за
+            # целыми. Это дело того, кто дописывает журнал: читатель мог бы
+            # отрезать строку, которую другой процесс ещё записывает
+            if self.journal:
+                with open(self.journal_filename, "r+b") as f:
+                    f.truncate(valid_bytes)
+            self._journal_bytes = valid_bytes
+        except Exception as e:
+            print(f"Ошибка при чтении журнала: {e}")
+            # Журнал применён не до конца: новые записи дописываются следом,
+            # а не затирают оставшиеся
+            if os.path.exists(self.journal_filename):
+                self._journal_bytes = os.path.getsize(self.journal_filename)
+        return applied
+
+    def _apply_record(self, record: dict) -> None:
+        """Применить одну запись журнала к списку задач"""
+        op = record["op"]
+        if op == "add":
+            self._store.insert(Task.from_dict(record["task"]))
+        elif op == "remove":
+            self._store.delete(record["id"])
+        elif op == "edit":
+            self._store.get(record["id"]).edit(**record["fields"])
+        elif op == "complete":
+            task = self._store.get(record["id"])
+            task.mark_completed()
+            # В журналах прежних версий времени выполнения в записи нет
+            if record.get("completed_at"):
+                task.completed_at = record["completed_at"]
+
+
+class _AsyncSaver:
+    """Заменяет Autosaver внутри TaskManager, которым владеет AsyncTaskManager
+
+    Изменение не сохраняется сразу, а планирует сохранение в цикле asyncio.
+    """
+
+    def __init__(self, owner: "AsyncTaskManager"):
+        self._owner = owner
+
+    def touch(self) -> None:
+        self._owner._schedule_flush()
+
+    def flush(self) -> None:
+        # Сохранение выполняет сам AsyncTaskManager в пуле потоков
+        pass
+
+    def stop(self) -> None:
+        pass
+
+
+class AsyncTaskManager:
+    """Асинхронный интерфейс к TaskManager для программ на asyncio
+
+    Задачи, проверка данных и индексы — те же, что у TaskManager: изменения
+    и запросы в памяти выполняются прямо в цикле событий, а чтение файла,
+    сериализация и запись уходят в пул потоков. Изменения, сделанные, пока
+    идёт или ожидает запуска одно сохранение, записываются следующим одним
+    сохранением; каждое изменение возвращает управление, когда оно записано.
+    Создаётся через await AsyncTaskManager.open(...).
+    """
+
+    def __init__(self, manager: TaskManager, executor: Optional["Executor"] = None):
+        import asyncio
+
+        self._manager = manager
+        self._executor = executor
+        self._loop = asyncio.get_running_loop()
+        # Сохранение, которое запишет ещё не сохранённые изменения
+        self._next_flush: Optional[asyncio.Future] = None
+        self._flush_task: Optional[asyncio.Task] = None
+        # Сохранения по изменениям теперь планирует этот менеджер
+        if manager._autosaver is not None:
+            manager._autosaver.stop()
+        manager._autosaver = _AsyncSaver(self)
+
+    @classmethod
+    async def open(
+        cls,
+        filename: str = "tasks.json",
+        executor: Optional["Executor"] = None,
+        **kwargs,
+    ) -> "AsyncTaskManager":
+        """Загрузить задачи в пуле потоков и вернуть готовый менеджер
+
+        Остальные аргументы передаются TaskManager.
+        """
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        manager = await loop.run_in_executor(
+            executor, functools.partial(TaskManager, filename, **kwargs)
+        )
+        return cls(manager, executor)
+
+    @property
+    def manager(self) -> TaskManager:
+        """Синхронный TaskManager, с которым работает этот менеджер"""
+        return self._manager
+
+    # Сообщения TaskManager.add_task и т.п. печатаются для человека; здесь
+    # те же проверки и изменения без вывода, результат — в возвращаемом значении
+
+    async def add_task(
+        self, title: str, priority: str = "средний", due_date: str = ""
+    ) -> Optional[Task]:
+        """Добавить новую задачу; None, если данные не прошли проверку"""
+        if self._manager._validate_task(title, priority, due_date):
+            return None
+        task = self._manager._add(title, priority, due_date)
+        await self._saved()
+        return task
+
+    async def remove_task(self, task_id: int) -> bool:
+        """Удалить задачу по идентификатору"""
+        removed = self._manager._remove(task_id) is not None
+        await self._saved()
+        return removed
+
+    async def edit_task(self, task_id: int, **kwargs) -> bool:
+        """Редактировать выбранную задачу"""
+        if self._manager._validate_fields(kwargs):
             return False
+        edited = self._manager._edit(task_id, **kwargs) is not None
+        await self._saved()
+        return edited
 
-    def mark_task_completed(self, task_index: int) -> bool:
+    async def mark_task_completed(self, task_id: int) -> bool:
         """Отметить задачу как выполненную"""
-        if 0 <= task_index < len(self.tasks):
-            self.tasks[task_index].mark_completed()
-            print(f"Задача '{self.tasks[task_index].title}' отмечена как выполненная!")
-            self.save_to_file()
-            return True
+        completed = self._manager._complete(task_id) is not None
+        await self._saved()
+        return completed
+
+    async def add_tasks(self, items: Iterable[Any]) -> BatchResult:
+        """Добавить много задач с одним сохранением"""
+        result = self._manager.add_tasks(items)
+        await self._saved()
+        return result
+
+    async def get_task(self, task_id: int) -> Optional[Task]:
+        """Найти задачу по идентификатору"""
+        return self._manager.get_task(task_id)
+
+    async def find_tasks(
+        self,
+        completed: Optional[bool] = None,
+        priority: Optional[str] = None,
+        due_before: Optional[str] = None,
+    ) -> List[Task]:
+        """Найти задачи по статусу, приоритету и сроку"""
+        return self._manager.find_tasks(completed, priority, due_before)
+
+    def __len__(self) -> int:
+        return len(self._manager)
+
+    async def flush(self) -> None:
+        """Дождаться записи всех сделанных изменений"""
+        await self._saved()
+
+    async def close(self) -> None:
+        """Записать изменения и освободить ресурсы"""
+        await self._saved()
+        await self._loop.run_in_executor(self._executor, self._manager.close)
+
+    def _schedule_flush(self) -> None:
+        """Запланировать сохранение (вызывается TaskManager при изменении)"""
+        if self._next_flush is None:
+            self._next_flush = self._loop.create_future()
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = self._loop.create_task(self._flush_loop())
+
+    async def _flush_loop(self) -> None:
+        """Сохранять файл, пока есть несохранённые изменения"""
+        while self._next_flush is not None:
+            # Изменения, пришедшие во время записи, дождутся следующей
+            done, self._next_flush = self._next_flush, None
+            try:
+                await self._loop.run_in_executor(
+                    self._executor, self._manager.save_to_file
+                )
+            except Exception as e:
+                done.set_exception(e)
+            else:
+                done.set_result(None)
+
+    async def _saved(self) -> None:
+        """Дождаться сохранения, которое запишет текущие изменения"""
+        if self._next_flush is not None:
+            import asyncio
+
+            await asyncio.shield(self._next_flush)
+
+
+class TaskRequestHandler:
+    """Обработчик запросов HTTP/JSON к задачам менеджера, живущего в памяти
+
+    Методы-примесь к http.server.BaseHTTPRequestHandler: make_server
+    соединяет их, чтобы http.server импортировался только для сервера.
+
+    GET    /tasks?completed=&priority=&due_before=&offset=&limit=
+    POST   /tasks              {"title", "priority", "due_date"}
+    GET    /tasks/<id>
+    PATCH  /tasks/<id>         {"title", "priority", "due_date", "completed": true}
+    DELETE /tasks/<id>
+    """
+
+    # HTTP/1.1: соединение остаётся открытым между запросами клиента.
+    # Без TCP_NODELAY заголовки и тело ответа, отправленные отдельно, ждали
+    # бы отложенного подтверждения клиента (~40 мс на каждый запрос)
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    # Размер страницы списка по умолчанию и наибольший допустимый
+    PAGE_SIZE = 50
+    MAX_PAGE_SIZE = 1000
+
+    @property
+    def manager(self) -> TaskManager:
+        return self.server.task_manager
+
+    def do_GET(self) -> None:
+        path, query = self._parse_path()
+        if path == ["tasks"]:
+            self._list_tasks(query)
+        elif len(path) == 2 and path[0] == "tasks":
+            task_id = self._task_id(path[1])
+            task = self.manager.get_task(task_id) if task_id is not None else None
+            if task is None:
+                self._send_error(404, "задача не найдена")
+            else:
+                self._send_json(200, task.to_dict())
         else:
-            print(f"Ошибка: задача с индексом {task_index} не найдена!")
-            return False
+            self._send_error(404, "неизвестный адрес")
 
-    def list_tasks(self, status_filter: str = "все") -> None:
-        """Вывести список задач с фильтрацией"""
-        if not self.tasks:
-            print("Список задач пуст!")
+    def do_POST(self) -> None:
+        path, _ = self._parse_path()
+        if path != ["tasks"]:
+            self._send_error(404, "неизвестный адрес")
             return
+        data = self._read_json()
+        if data is None:
+            return
+        try:
+            title, priority, due_date = TaskManager._item_fields(data)
+            error = TaskManager._validate_task(title, priority, due_date)
+        except (KeyError, TypeError, AttributeError) as e:
+            error = f"некорректные данные задачи: {e!r}"
+        if error:
+            self._send_error(400, error)
+            return
+        task = self.manager._add(title, priority, due_date)
+        self._send_json(201, task.to_dict())
 
-        filtered_tasks = []
-
-        if status_filter == "выполненные":
-            filtered_tasks = [task for task in self.tasks if task.completed]
-        elif status_filter == "невыполненные":
-            filtered_tasks = [task for task in self.tasks if not task.completed]
-        else:  # 'все'
-            filtered_tasks = self.tasks
+    def do_PATCH(self) -> None:
+        task_id = self._task_path()
+        if task_id is None:
+            return
+        data = self._read_json()
+        if data is None:
+            return
+        fields = {
+            key: data[key] for key in ("title", "priority", "due_date") if key in data
+        }
+        completed = data.get("completed")
+        if completed is False:
+            self._send_error(400, "снять отметку о выполнении нельзя")
+            return
+        if completed not in (None, True):
+            self._send_error(400, "поле completed должно быть true")
+            return
+        try:
+            error = TaskManager._validate_fields(fields)
+        except (TypeError, AttributeError) as e:
+            error = f"некорректные поля: {e!r}"
+        if error:
+            self._send_error(400, error)
+            return
+        # Правка и отметка о выполнении сохраняются одной записью
+        with self.manager.batch():
+            task = self.manager.get_task(task_id)
+            if task is not None and fields:
+                task = self.manager._edit(task_id, **fields)
+            if task is not None and completed:
+                task = self.manager._complete(task_id)
+        if task is None:
+            self._send_error(404, "задача не найдена")
+        else:
+            self._send_json(200, task.to_dict())
 
-        if not filtered_tasks:
-            print(f"Нет задач с фильтром '{status_filter}'!")
+    def do_DELETE(self) -> None:
+        task_id = self._task_path()
+        if task_id is None:
             return
+        if self.manager._remove(task_id) is None:
+            self._send_error(404, "задача не найдена")
+        else:
+            self._send_json(204, None)
 
-        print(f"\n" + "=" * 50)
-        print(f"СПИСОК ЗАДАЧ (фильтр: {status_filter}):")
-        print("=" * 50)
+    def _list_tasks(self, query: Dict[str, List[str]]) -> None:
+        """Отфильтрованный список задач страницами: offset и limit
+
+        Страница берётся обходом, который останавливается на её последней
+        задаче, поэтому общее число подходящих задач не считается: вместо
+        него ответ сообщает, есть ли следующая страница (has_more).
+        """
+        try:
+            completed = query.get("completed", [None])[0]
+            if completed is not None:
+                completed = {"true": True, "false": False}[completed.lower()]
+            offset = int(query.get("offset", ["0"])[0])
+            limit = int(query.get("limit", [str(self.PAGE_SIZE)])[0])
+            if offset < 0 or not 0 < limit <= self.MAX_PAGE_SIZE:
+                raise ValueError(offset, limit)
+        except (KeyError, ValueError):
+            self._send_error(400, "некорректные параметры списка")
+            return
+        # Лишняя задача за страницей показывает, что список не закончился
+        page = [
+            task.to_dict()
+            for task in self.manager.iter_tasks(
+                completed,
+                query.get("priority", [None])[0],
+                query.get("due_before", [None])[0],
+                offset=offset,
+                limit=limit + 1,
+            )
+        ]
+        self._send_json(
+            200,
+            {
+                "tasks": page[:limit],
+                "has_more": len(page) > limit,
+                "offset": offset,
+                "limit": limit,
+            },
+        )
 
-        for i, task in enumerate(filtered_tasks):
-            print(f"\nЗадача #{i}:")
-            print(task.show())
+    def _parse_path(self) -> Tuple[List[str], Dict[str, List[str]]]:
+        from urllib.parse import parse_qs, urlsplit
 
-        print(f"\nВсего задач: {len(filtered_tasks)}")
+        parsed = urlsplit(self.path)
+        return [part for part in parsed.path.split("/") if part], parse_qs(parsed.query)
 
-    def save_to_file(self) -> None:
-        """Сохранить список задач в файл JSON"""
+    @staticmethod
+    def _task_id(value: str) -> Optional[int]:
         try:
-            tasks_data = [task.to_dict() for task in self.tasks]
-            with open(self.filename, "w", encoding="utf-8") as f:
-                json.dump(tasks_data, f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            print(f"Ошибка при сохранении файла: {e}")
+            return int(value)
+        except ValueError:
+            return None
 
-    def load_from_file(self) -> None:
-        """Загрузить список задач из файла JSON"""
-        if not os.path.exists(self.filename):
-            return
+    def _task_path(self) -> Optional[int]:
+        """Идентификатор из адреса /tasks/<id>; при ошибке отправляет ответ"""
+        path, _ = self._parse_path()
+        task_id = None
+        if len(path) == 2 and path[0] == "tasks":
+            task_id = self._task_id(path[1])
+        if task_id is None:
+            self._send_error(404, "неизвестный адрес")
+        return task_id
 
+    def _read_json(self) -> Optional[dict]:
+        """Прочитать тело запроса как объект JSON; при ошибке отправляет ответ"""
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            length = -1
+        if length < 0:
+            # Без верной длины тело не отделить от следующего запроса
+            self.close_connection = True
+            self._send_error(400, "некорректный заголовок Content-Length")
+            return None
         try:
-            with open(self.filename, "r", encoding="utf-8") as f:
-                tasks_data = json.load(f)
+            data = json.loads(self.rfile.read(length).decode("utf-8") or "{}")
+        except ValueError:
+            data = None
+        if not isinstance(data, dict):
+            self._send_error(400, "тело запроса должно быть объектом JSON")
+            return None
+        return data
 
-            self.tasks = [Task.from_dict(data) for data in tasks_data]
-            print(f"Загружено {len(self.tasks)} задач из файла")
-        except Exception as e:
-            print(f"Ошибка при загрузке файла: {e}")
-            self.tasks = []
+    def _send_json(self, status: int, data: Any) -> None:
+        body = b""
+        if data is not None:
+            body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        if body:
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_error(self, status: int, message: str) -> None:
+        self._send_json(status, {"error": message})
+
+
+def make_server(
+    manager: TaskManager, host: str = "127.0.0.1", port: int = 8000
+) -> "ThreadingHTTPServer":
+    """Создать HTTP-сервер над менеджером задач (порт 0 — любой свободный)
+
+    Запросы обрабатываются в отдельных потоках, поэтому менеджеру нужен
+    потокобезопасный режим.
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    handler = type(
+        "TaskHTTPRequestHandler", (TaskRequestHandler, BaseHTTPRequestHandler), {}
+    )
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.task_manager = manager
+    return server
+
+
+def serve(filename: str = "tasks.json", host: str = "127.0.0.1", port: int = 8000):
+    """Запустить сервер задач и работать до Ctrl+C или SIGTERM"""
+    # Задачи загружаются один раз и живут в памяти; изменения пишутся
+    # автосохранением пачками, а не по файлу на каждый запрос
+    manager = TaskManager(
+        filename, autosave=True, snapshot_cache=True, thread_safe=True, shared=True
+    )
+    server = make_server(manager, host, port)
+
+    def handle_signal(signum, frame):
+        raise KeyboardInterrupt
+
+    previous = signal.signal(signal.SIGTERM, handle_signal)
+    print(f"Сервер задач запущен: http://{host}:{server.server_port}/tasks")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        signal.signal(signal.SIGTERM, previous)
+        server.server_close()
+        manager.close()
+        print("Сервер остановлен, изменения сохранены")
 
 
 class ToDoApp:
     """Класс приложения To-Do List"""
 
-    def __init__(self):
+    # Задач на одной странице списка в меню
+    PAGE_SIZE = 20
+
+    def __init__(self, filename: str = "tasks.json", autosave: bool = False):
         """Инициализация приложения"""
-        self.task_manager = TaskManager()
+        # С автосохранением действия меню не ждут записи файла на диск,
+        # бинарный кэш ускоряет запуск на больших списках, давно выполненные
+        # задачи уходят в архив и не читаются при запуске, а совместный режим
+        # не даёт нескольким запущенным копиям затереть изменения друг друга.
+        # Поток автосохранения вливает чужие изменения в память, поэтому с
+        # ним нужен потокобезопасный режим
+        self.task_manager = TaskManager(
+            filename,
+            autosave=autosave,
+            snapshot_cache=True,
+            archive_after_days=30,
+            shared=True,
+            thread_safe=autosave,
+        )
 
     def show_menu(self) -> None:
         """Показать главное меню"""
@@ -207,6 +5298,29 @@ class ToDoApp:
         print("0. Выйти")
         print("=" * 50)
 
+    def show_tasks(self, status_filter: str = "все") -> None:
+        """Показать список задач постранично"""
+        manager = self.task_manager
+        completed = TaskManager.STATUS_FILTERS.get(status_filter)
+        # Все страницы берутся из одного обхода, собранного до первого
+        # вопроса: пока пользователь листает, автосохранение может влить в
+        # список изменения другого процесса
+        with manager._reading():
+            tasks = list(manager.iter_tasks(completed, archived=bool(completed)))
+        offset = 0
+        while True:
+            page = tasks[offset : offset + self.PAGE_SIZE]
+            with manager._reading():
+                manager._print_tasks(
+                    status_filter, offset, self.PAGE_SIZE, "text", None, iter(page)
+                )
+            offset += len(page)
+            if offset >= len(tasks):
+                return
+            answer = input("\nEnter — следующая страница, q — хватит: ")
+            if answer.strip().lower() == "q":
+                return
+
     def get_user_choice(self) -> str:
         """Получить выбор пользователя"""
         return input("\nВыберите действие (0-9): ").strip()
@@ -239,31 +5353,28 @@ class ToDoApp:
 
     def edit_task_interactive(self) -> None:
         """Интерактивное редактирование задачи"""
-        if not self.task_manager.tasks:
+        if not len(self.task_manager):
             print("Нет задач для редактирования!")
             return
 
-        self.task_manager.list_tasks("все")
+        self.show_tasks("все")
 
         try:
-            task_index = int(
-                input("\nВведите номер задачи для редактирования: ").strip()
-            )
+            task_id = int(input("\nВведите номер задачи для редактирования: ").strip())
         except ValueError:
             print("Ошибка: введите число!")
             return
 
-        if not (0 <= task_index < len(self.task_manager.tasks)):
-            print(f"Ошибка: задача с номером {task_index} не найдена!")
+        task = self.task_manager.get_task(task_id)
+        if task is None:
+            print(f"Ошибка: задача с номером {task_id} не найдена!")
             return
 
         print("\n" + "-" * 40)
         print("РЕДАКТИРОВАНИЕ ЗАДАЧИ")
         print("-" * 40)
 
-        title = input(
-            f"Новое описание [{self.task_manager.tasks[task_index].title}]: "
-        ).strip()
+        title = input(f"Новое описание [{task.title}]: ").strip()
         title = title if title else None
 
         print("\nВыберите новый приоритет:")
@@ -275,53 +5386,78 @@ class ToDoApp:
         priority_map = {"1": "низкий", "2": "средний", "3": "высокий"}
         priority = priority_map.get(priority_choice) if priority_choice else None
 
-        current_due = self.task_manager.tasks[task_index].due_date
-        due_date = input(f"Новый срок выполнения [{current_due}]: ").strip()
+        due_date = input(f"Новый срок выполнения [{task.due_date}]: ").strip()
         due_date = due_date if due_date else None
 
         self.task_manager.edit_task(
-            task_index, title=title, priority=priority, due_date=due_date
+            task_id, title=title, priority=priority, due_date=due_date
         )
 
     def mark_task_completed_interactive(self) -> None:
         """Интерактивная отметка задачи как выполненной"""
-        if not self.task_manager.tasks:
+        if not len(self.task_manager):
             print("Нет задач!")
             return
 
-        self.task_manager.list_tasks("невыполненные")
+        self.show_tasks("невыполненные")
 
         try:
-            task_index = int(
+            task_id = int(
                 input("\nВведите номер задачи для отметки как выполненной: ").strip()
             )
         except ValueError:
             print("Ошибка: введите число!")
             return
 
-        self.task_manager.mark_task_completed(task_index)
+        self.task_manager.mark_task_completed(task_id)
 
     def remove_task_interactive(self) -> None:
         """Интерактивное удаление задачи"""
-        if not self.task_manager.tasks:
+        if not len(self.task_manager):
             print("Нет задач для удаления!")
             return
 
-        self.task_manager.list_tasks("все")
+        self.show_tasks("все")
 
         try:
-            task_index = int(input("\nВведите номер задачи для удаления: ").strip())
+            task_id = int(input("\nВведите номер задачи для удаления: ").strip())
         except ValueError:
             print("Ошибка: введите число!")
             return
 
-        self.task_manager.remove_task(task_index)
+        self.task_manager.remove_task(task_id)
 
     def start(self) -> None:
         """Запуск основного цикла программы"""
         print("Добро пожаловать в To-Do List Manager!")
         print("Версия 1.0")
 
+        previous_handlers = self._install_signal_handlers()
+        try:
+            self._main_loop()
+        finally:
+            # Отложенные автосохранением изменения не должны потеряться
+            self.task_manager.flush()
+            for signum, handler in previous_handlers.items():
+                signal.signal(signum, handler)
+
+    def _install_signal_handlers(self) -> Dict[int, Any]:
+        """Завершать программу по сигналам так же, как по выходу из меню"""
+        previous: Dict[int, Any] = {}
+        if threading.current_thread() is not threading.main_thread():
+            return previous
+
+        def handle_signal(signum, frame):
+            raise SystemExit(128 + signum)
+
+        for name in ("SIGTERM", "SIGHUP"):
+            if hasattr(signal, name):
+                signum = getattr(signal, name)
+                previous[signum] = signal.signal(signum, handle_signal)
+        return previous
+
+    def _main_loop(self) -> None:
+        """Основной цикл меню"""
         while True:
             self.show_menu()
             choice = self.get_user_choice()
@@ -331,13 +5467,13 @@ class ToDoApp:
                 break
 
             elif choice == "1":
-                self.task_manager.list_tasks("все")
+                self.show_tasks("все")
 
             elif choice == "2":
-                self.task_manager.list_tasks("невыполненные")
+                self.show_tasks("невыполненные")
 
             elif choice == "3":
-                self.task_manager.list_tasks("выполненные")
+                self.show_tasks("выполненные")
 
             elif choice == "4":
                 self.add_task_interactive()
@@ -364,10 +5500,273 @@ class ToDoApp:
             input("\nНажмите Enter для продолжения...")
 
 
-def main():
-    app = ToDoApp()
+def _open_manager(args: Any, **kwargs) -> TaskManager:
+    """Открыть файл задач для одной команды без лишних сообщений
+
+    Команды, которые только читают задачи, открывают готовый кэш с
+    write_cache=False: они не оставляют новых файлов рядом с данными.
+    """
+    return TaskManager(args.file, verbose=False, **kwargs)
+
+
+@contextmanager
+def _changing_manager(args: Any) -> Iterator[TaskManager]:
+    """Открыть файл задач для команды, которая их меняет
+
+    Изменение дописывается строкой в журнал, а не переписывает весь файл.
+    Файл заблокирован на всё время команды так же, как при сохранении в
+    совместном режиме: меню и сервер (см. TaskManager._merge_journal)
+    читают журнал целиком, а не на середине записи.
+    """
+    with lock_file(args.file + ".lock", exclusive=True):
+        manager = _open_manager(args, snapshot_cache=True, journal=True)
+        try:
+            yield manager
+        finally:
+            manager.close()
+
+
+def _command_add(args: Any) -> int:
+    error = TaskManager._validate_task(args.title, args.priority, args.due)
+    if error:
+        print(f"Ошибка: {error}", file=sys.stderr)
+        return 1
+    with _changing_manager(args) as manager:
+        task = manager._add(args.title, args.priority.lower(), args.due)
+    print(task.id)
+    return 0
+
+
+def _command_update(args: Any) -> int:
+    with _changing_manager(args) as manager:
+        if args.command == "done":
+            task = manager._complete(args.id)
+        else:
+            task = manager._remove(args.id)
+    if task is None:
+        print(f"Ошибка: задача с номером {args.id} не найдена!", file=sys.stderr)
+        return 1
+    return 0
+
+
+def _command_ls(args: Any) -> int:
+    # Файл читается потоком: задачи фильтруются по мере чтения, а с --limit
+    # чтение заканчивается на последней нужной задаче
+    manager = _open_manager(args, lazy=True)
+    completed = TaskManager.STATUS_FILTERS[args.status]
+    tasks = manager.iter_tasks(
+        completed,
+        args.priority,
+        args.due_before,
+        offset=args.offset,
+        limit=args.limit,
+        archived=bool(completed),
+    )
+    try:
+        write_buffered(render_tasks(tasks, args.format))
+    finally:
+        manager.close()
+    return 0
+
+
+def _command_search(args: Any) -> int:
+    # Поиску нужен весь список: индекс слов строится по всем задачам
+    manager = _open_manager(args, snapshot_cache=True, write_cache=False)
+    try:
+        write_buffered(
+            render_tasks(manager.search(args.query, args.limit), args.format)
+        )
+    finally:
+        manager.close()
+    return 0
+
+
+def _command_due(args: Any) -> int:
+    manager = _open_manager(args, snapshot_cache=True, write_cache=False)
+    try:
+        if args.overdue:
+            tasks = manager.overdue(limit=args.limit)
+        elif args.within is not None:
+            tasks = manager.due_within(timedelta(days=args.within), limit=args.limit)
+        else:
+            tasks = manager.next_due(args.limit)
+        write_buffered(render_tasks(tasks, args.format))
+    finally:
+        manager.close()
+    return 0
+
+
+def _command_query(args: Any) -> int:
+    try:
+        query = compile_query(args.query)
+    except ValueError as e:
+        print(f"Ошибка: {e}", file=sys.stderr)
+        return 1
+    manager = _open_manager(args, snapshot_cache=True, write_cache=False)
+    try:
+        if args.explain:
+            print(manager.explain(query))
+        else:
+            write_buffered(render_tasks(manager.select(query), args.format))
+    finally:
+        manager.close()
+    return 0
+
+
+def _print_progress(count: int) -> None:
+    print(f"\rобработано задач: {count}", end="", file=sys.stderr, flush=True)
+
+
+def _command_import(args: Any) -> int:
+    source = sys.stdin if args.source == "-" else args.source
+    try:
+        with _changing_manager(args) as manager:
+            result = manager.import_tasks(
+                source,
+                fmt=args.format,
+                dedupe=not args.keep_duplicates,
+                progress=_print_progress if args.progress else None,
+            )
+    except (OSError, EOFError, ValueError) as e:
+        print(f"Ошибка при импорте: {e}", file=sys.stderr)
+        return 1
+    finally:
+        if args.progress:
+            print(file=sys.stderr)
+    for number, error in result.errors:
+        print(f"Ошибка в записи {number}: {error}", file=sys.stderr)
+    if result.failed > len(result.errors):
+        print(f"Других ошибок: {result.failed - len(result.errors)}", file=sys.stderr)
+    message = f"Импортировано задач: {result.added}"
+    if result.duplicates:
+        message += f", пропущено повторов: {result.duplicates}"
+    print(message)
+    return 0 if result.ok else 1
+
+
+def _command_export(args: Any) -> int:
+    manager = _open_manager(args, lazy=True)
+    target = sys.stdout if args.target == "-" else args.target
+    try:
+        manager.export_tasks(
+            target,
+            fmt=args.format,
+            progress=_print_progress if args.progress else None,
+        )
+    except (OSError, ValueError) as e:
+        print(f"Ошибка при экспорте: {e}", file=sys.stderr)
+        return 1
+    finally:
+        manager.close()
+        if args.progress:
+            print(file=sys.stderr)
+    return 0
+
+
+def _command_serve(args: Any) -> int:
+    serve(args.file, port=args.port)
+    return 0
+
+
+def build_parser() -> Any:
+    """Собрать разбор аргументов командной строки"""
+    # argparse нужен только командам, а не интерактивному меню
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        prog="python -m tasks",
+        description="Менеджер задач. Без команды запускается интерактивное меню.",
+    )
+    parser.add_argument("--file", default="tasks.json", help="файл задач")
+    commands = parser.add_subparsers(dest="command", metavar="команда")
+
+    add = commands.add_parser("add", help="добавить задачу и вывести её номер")
+    add.add_argument("title")
+    add.add_argument("--priority", default="средний")
+    add.add_argument("--due", default="", help="срок, например 2024-12-31")
+    add.set_defaults(handler=_command_add)
+
+    for name, help_text in (
+        ("done", "отметить задачу выполненной"),
+        ("rm", "удалить задачу"),
+    ):
+        command = commands.add_parser(name, help=help_text)
+        command.add_argument("id", type=int)
+        command.set_defaults(handler=_command_update)
+
+    ls = commands.add_parser("ls", help="вывести задачи, по строке на задачу")
+    ls.add_argument("--status", choices=list(TaskManager.STATUS_FILTERS), default="все")
+    ls.add_argument("--priority")
+    ls.add_argument("--due-before", help="срок строго раньше этой даты")
+    ls.add_argument("--offset", type=int, default=0, help="пропустить задач")
+    ls.add_argument("--limit", type=int, help="вывести не больше задач")
+    ls.add_argument("--format", choices=["tsv", "ndjson"], default="tsv")
+    ls.set_defaults(handler=_command_ls)
+
+    search = commands.add_parser("search", help="найти задачи по словам названия")
+    search.add_argument("query")
+    search.add_argument("--limit", type=int, default=20)
+    search.add_argument("--format", choices=["tsv", "ndjson"], default="tsv")
+    search.set_defaults(handler=_command_search)
+
+    query = commands.add_parser(
+        "query", help='выполнить запрос, например "priority>=средний sort=due"'
+    )
+    query.add_argument("query")
+    query.add_argument("--explain", action="store_true", help="показать план")
+    query.add_argument("--format", choices=["tsv", "ndjson"], default="tsv")
+    query.set_defaults(handler=_command_query)
+
+    due = commands.add_parser("due", help="ближайшие по сроку невыполненные задачи")
+    when = due.add_mutually_exclusive_group()
+    when.add_argument("--overdue", action="store_true", help="только просроченные")
+    when.add_argument("--within", type=int, metavar="ДНЕЙ", help="срок в ближайшие дни")
+    due.add_argument("--limit", type=int, default=20)
+    due.add_argument("--format", choices=["tsv", "ndjson"], default="tsv")
+    due.set_defaults(handler=_command_due)
+
+    # Формат и сжатие файла по умолчанию — по расширению (см. stream_format)
+    formats = ["json", "ndjson", "csv"]
+    import_ = commands.add_parser(
+        "import", help="добавить задачи из файла JSON, NDJSON или CSV (.gz, .xz)"
+    )
+    import_.add_argument("source", help="файл или - для стандартного ввода")
+    import_.add_argument("--format", choices=formats)
+    import_.add_argument(
+        "--keep-duplicates", action="store_true", help="не пропускать повторы"
+    )
+    import_.add_argument("--progress", action="store_true", help="показывать ход")
+    import_.set_defaults(handler=_command_import)
+
+    export = commands.add_parser(
+        "export", help="записать задачи в файл JSON, NDJSON или CSV (.gz, .xz)"
+    )
+    export.add_argument("target", help="файл или - для стандартного вывода")
+    export.add_argument("--format", choices=formats)
+    export.add_argument("--progress", action="store_true", help="показывать ход")
+    export.set_defaults(handler=_command_export)
+
+    serve_ = commands.add_parser("serve", help="запустить сервер HTTP/JSON")
+    serve_.add_argument("port", type=int, nargs="?", default=8000)
+    serve_.set_defaults(handler=_command_serve)
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Запустить команду из аргументов или интерактивное меню"""
+    if argv is None:
+        argv = sys.argv[1:]
+    filename = "tasks.json"
+    if argv:
+        args = build_parser().parse_args(argv)
+        if args.command is not None:
+            return args.handler(args)
+        # Без команды --file выбирает файл для интерактивного меню
+        filename = args.file
+    app = ToDoApp(filename, autosave=True)
     app.start()
+    return 0
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -0,0 +1,130 @@
+"""Замеры производительности TaskManager на больших наборах задач
+
+Не входят в обычный прогон; запуск:
+
+    python -m pytest -m benchmark
+    python -m pytest -m benchmark --bench-sizes=1k,100k,1m --bench-due=clustered
+    python -m pytest -m benchmark --bench-save-baseline
+
+Результаты печатаются таблицей и пишутся в .benchmarks/latest.json. После
+--bench-save-baseline каждый следующий замер сравнивается с
+.benchmarks/baseline.json и проваливается при ухудшении больше
+--bench-threshold. Базовая линия зависит от машины и в репозиторий не
+попадает. Набор 1m задач требует больше 1 ГиБ памяти и десятков минут.
+"""
+
+import os
+
+import pytest
+from tasks import RENDER_CACHE, TaskManager
+
+
+@pytest.fixture(autouse=True)
+def quiet_output(capsys):
+    """Сообщения TaskManager не должны попадать в вывод замеров"""
+    yield
+    capsys.readouterr()
+
+
+@pytest.mark.benchmark
+class TestBenchmarks:
+    """Горячие пути TaskManager на наборах 1k/100k/1m задач"""
+
+    def test_load_from_file(self, bench, bench_file, bench_size):
+        bench(lambda: TaskManager(bench_file, verbose=False), items=bench_size)
+
+    def test_save_to_file(self, bench, bench_copy, bench_size):
+        manager = TaskManager(bench_copy, verbose=False)
+        bench(manager.save_to_file, items=bench_size)
+
+    def test_add_task(self, bench, bench_copy):
+        # Каждое добавление сохраняет весь список: цена растёт с его размером
+        manager = TaskManager(bench_copy, verbose=False)
+        bench(lambda: manager.add_task("Новая задача", "высокий", "2025-03-01"))
+
+    def test_add_tasks_batch(self, bench, bench_copy):
+        manager = TaskManager(bench_copy, verbose=False)
+        items = [(f"Задача {i}", "средний", "2025-03-01") for i in range(1000)]
+        bench(lambda: manager.add_tasks(items), items=len(items))
+
+    def test_list_tasks(self, bench, bench_file, bench_size):
+        manager = TaskManager(bench_file, verbose=False)
+        with open(os.devnull, "w", encoding="utf-8") as out:
+            bench(lambda: manager.list_tasks(out=out), items=bench_size)
+
+    def test_list_tasks_page(self, bench, bench_file):
+        manager = TaskManager(bench_file, verbose=False)
+        with open(os.devnull, "w", encoding="utf-8") as out:
+            bench(lambda: manager.list_tasks(limit=20, out=out), items=20)
+
+    def test_list_tasks_query(self, bench, bench_file):
+        manager = TaskManager(bench_file, verbose=False)
+        with open(os.devnull, "w", encoding="utf-8") as out:
+            bench(
+                lambda: manager.list_tasks("status=pending sort=due limit=20", out=out),
+                items=20,
+            )
+
+    def test_show_cold(self, bench, bench_file, bench_size):
+        tasks = TaskManager(bench_file, verbose=False).tasks
+
+        def forget_shown():
+            # Сбросить запомненные строки: show() строит их заново
+            maxsize = RENDER_CACHE.maxsize
+            RENDER_CACHE.resize(0)
+            RENDER_CACHE.resize(maxsize)
+
+        bench(lambda: [task.show() for task in tasks], forget_shown, bench_size)
+
+    def test_show_warm(self, bench, bench_file, bench_size):
+        tasks = TaskManager(bench_file, verbose=False).tasks
+        for task in tasks:
+            task.show()
+        bench(lambda: [task.show() for task in tasks], items=bench_size)
+
+
+class TestBenchmarkDataset:
+    """Генератор синтетических наборов задач для замеров"""
+
+    def test_reproducible(self, task_generator):
+        first = [task.to_row() for task in task_generator(200, seed=7)]
+        second = [task.to_row() for task in task_generator(200, seed=7)]
+        other = [task.to_row() for task in task_generator(200, seed=8)]
+
+        assert first == second
+        assert first != other
+
+    def test_completed_ratio(self, task_generator):
+        tasks = task_generator(2000, completed_ratio=0.25)
+        completed = [task for task in tasks if task.completed]
+
+        assert 400 < len(completed) < 600
+        assert all(task.completed_at for task in completed)
+        assert [task.id for task in tasks] == list(range(2000))
+
+    def test_due_distributions(self, task_generator):
+        none = task_generator(500, due_distribution="none")
+        overdue = task_generator(500, due_distribution="overdue")
+        clustered = task_generator(500, due_distribution="clustered")
+
+        assert not any(task.due_date for task in none)
+        dated = [task.due_date for task in overdue if task.due_date]
+        assert 350 < len(dated) < 450
+        assert all(due <= "2025-01-01" for due in dated)
+        # Сроки собраны вокруг нескольких дат, а не размазаны по году
+        assert len({task.due_date for task in clustered}) < 100
+
+    def test_unknown_distribution(self, task_generator):
+        with pytest.raises(ValueError):
+            task_generator(10, due_distribution="weekly")
+
+    def test_generated_tasks_round_trip(self, task_generator, temp_json_file):
+        manager = TaskManager(temp_json_file, verbose=False)
+        manager._store.replace_all(task_generator(300, seed=3))
+        manager.save_to_file()
+
+        loaded = TaskManager(temp_json_file, verbose=False)
+
+        assert [task.to_row() for task in loaded.tasks] == [
+            task.to_row() for task in task_generator(300, seed=3)
+        ]
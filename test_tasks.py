@@ -1,6 +1,40 @@
 import pytest
+import asyncio
+import builtins
+import glob
+import gzip
+import http.client
+import json
 import os
-from tasks import Task, TaskManager, ToDoApp
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+import urllib.parse
+from datetime import date, datetime, timedelta
+from tasks import (
+    AsyncTaskManager,
+    ColumnarStorage,
+    MemoryStorage,
+    MmapNdjsonStorage,
+    NdjsonStorage,
+    Query,
+    RENDER_CACHE,
+    ReadWriteLock,
+    SqliteStorage,
+    TitleIndex,
+    Task,
+    TaskManager,
+    ToDoApp,
+    iter_json_array,
+    main,
+    migrate_json_to_sqlite,
+    render_tasks,
+    tokenize,
+    write_buffered,
+)
 
 
 class TestTask:
@@ -96,6 +130,7 @@ class TestTask:
         task = Task("Test Task", "средний", "2024-12-31", True)
         task_dict = task.to_dict()
 
+        assert task_dict["id"] is None
         assert task_dict["title"] == "Test Task"
         assert task_dict["priority"] == "средний"
         assert task_dict["due_date"] == "2024-12-31"
@@ -242,6 +277,31 @@ class TestTaskManager:
         assert "не найдена" in captured.out
         assert manager.tasks[0].title == "Task 1"
 
+    def test_edit_task_invalid_priority(self, temp_json_file, capsys):
+        """Тест: неверный приоритет при редактировании не сохраняется"""
+        manager = TaskManager(temp_json_file)
+        manager.add_task("Task 1", "высокий")
+
+        result = manager.edit_task(0, priority="bogus")
+
+        captured = capsys.readouterr()
+        assert result == False
+        assert "приоритет должен быть" in captured.out
+        assert manager.tasks[0].priority == "высокий"
+        assert manager.find_tasks(priority="высокий") == manager.tasks
+
+    def test_edit_task_invalid_title(self, temp_json_file, capsys):
+        """Тест: описание из пробелов или не строка при редактировании отклоняется"""
+        manager = TaskManager(temp_json_file)
+        manager.add_task("Task 1", "высокий")
+
+        assert manager.edit_task(0, title="   ") == False
+        assert manager.edit_task(0, title=123) == False
+        assert manager.edit_task(0, priority=5) == False
+
+        assert manager.tasks[0].title == "Task 1"
+        assert manager.search("task") == manager.tasks
+
     def test_mark_task_completed(self, temp_json_file):
         """Тест отметки задачи как выполненной"""
         manager = TaskManager(temp_json_file)
@@ -405,6 +465,2675 @@ class TestTaskManager:
         assert len(new_manager.tasks) == 2
 
 
+class TestJournal:
+    """Тесты для журнала операций TaskManager"""
+
+    def test_journal_does_not_rewrite_snapshot(self, temp_json_file):
+        """Тест: изменения дописываются в журнал, снимок не перезаписывается"""
+        manager = TaskManager(temp_json_file, journal=True)
+        manager.add_task("Task 1", "высокий")
+        manager.save_to_file()
+        snapshot = open(temp_json_file, encoding="utf-8").read()
+
+        manager.add_task("Task 2", "низкий")
+        manager.mark_task_completed(0)
+
+        assert open(temp_json_file, encoding="utf-8").read() == snapshot
+        with open(manager.journal_filename, encoding="utf-8") as f:
+            lines = f.readlines()
+        assert len(lines) == 3  # заголовок + две операции
+
+    def test_journal_replay_on_load(self, temp_json_file):
+        """Тест восстановления состояния из снимка и журнала"""
+        manager1 = TaskManager(temp_json_file, journal=True)
+        manager1.add_task("Task 1", "высокий", "2024-12-31")
+        manager1.add_task("Task 2", "средний")
+        manager1.add_task("Task 3", "низкий")
+        manager1.edit_task(1, title="Updated Task 2")
+        manager1.mark_task_completed(0)
+        manager1.remove_task(2)
+
+        manager2 = TaskManager(temp_json_file, journal=True)
+
+        assert [task.title for task in manager2.tasks] == ["Task 1", "Updated Task 2"]
+        assert manager2.tasks[0].completed == True
+        assert manager2.tasks[0].due_date == "2024-12-31"
+
+    def test_replay_keeps_completed_at(self, temp_json_file):
+        """Тест: время выполнения из журнала не сдвигается при повторном открытии"""
+        manager = TaskManager(temp_json_file, journal=True)
+        manager.add_task("Task 1")
+        manager.save_to_file()
+        manager.mark_task_completed(0)
+        completed_at = manager.get_task(0).completed_at
+        with open(manager.journal_filename, "r", encoding="utf-8") as f:
+            records = [json.loads(line) for line in f]
+        assert records[-1]["completed_at"] == completed_at
+
+        # Выполнена давно: после открытия время должно остаться прежним
+        records[-1]["completed_at"] = "2020-01-01 10:00:00"
+        with open(manager.journal_filename, "w", encoding="utf-8") as f:
+            f.writelines(json.dumps(record) + "\n" for record in records)
+        reopened = TaskManager(temp_json_file, journal=True)
+
+        assert reopened.get_task(0).completed == True
+        assert reopened.get_task(0).completed_at == "2020-01-01 10:00:00"
+        assert reopened.archive_completed(30) == 1
+
+    def test_journal_compaction(self, temp_json_file):
+        """Тест свёртки журнала в снимок после превышения порога"""
+        manager = TaskManager(temp_json_file, journal=True, journal_max_bytes=500)
+        for i in range(20):
+            manager.add_task(f"Task {i}", "средний")
+
+        journal_size = (
+            os.path.getsize(manager.journal_filename)
+            if os.path.exists(manager.journal_filename)
+            else 0
+        )
+        assert journal_size < 500
+
+        reloaded = TaskManager(temp_json_file, journal=True)
+        assert len(reloaded.tasks) == 20
+
+    def test_journal_torn_tail(self, temp_json_file):
+        """Тест: недописанная последняя запись журнала отбрасывается"""
+        manager = TaskManager(temp_json_file, journal=True)
+        manager.add_task("Task 1", "высокий")
+        with open(manager.journal_filename, "a", encoding="utf-8") as f:
+            f.write('{"op":"add","task":{"title":"Обре')
+
+        reloaded = TaskManager(temp_json_file, journal=True)
+        assert len(reloaded.tasks) == 1
+
+        reloaded.add_task("Task 2", "средний")
+        assert len(TaskManager(temp_json_file, journal=True).tasks) == 2
+
+    def test_failed_replay_keeps_journal(self, temp_json_file, capsys):
+        """Тест: после ошибки применения журнала новые записи его не затирают"""
+        manager = TaskManager(temp_json_file, journal=True)
+        manager.add_task("Task 1", "высокий")
+        with open(manager.journal_filename, "a", encoding="utf-8") as f:
+            f.write('{"op":"edit","id":5,"fields":{"title":"Нет такой"}}\n')
+        journal = open(manager.journal_filename, encoding="utf-8").read()
+
+        reloaded = TaskManager(temp_json_file, journal=True)
+        assert "Ошибка при чтении журнала" in capsys.readouterr().out
+        reloaded.add_task("Task 2", "средний")
+
+        with open(manager.journal_filename, encoding="utf-8") as f:
+            assert f.read().startswith(journal)
+
+    def test_stale_journal_is_ignored(self, temp_json_file, capsys):
+        """Тест: журнал от другого снимка не применяется"""
+        manager = TaskManager(temp_json_file, journal=True)
+        manager.add_task("Task 1", "высокий")
+        journal = open(manager.journal_filename, encoding="utf-8").read()
+        manager.save_to_file()
+        with open(manager.journal_filename, "w", encoding="utf-8") as f:
+            f.write(journal)
+
+        reloaded = TaskManager(temp_json_file, journal=True)
+
+        captured = capsys.readouterr()
+        assert "не соответствует снимку" in captured.out
+        assert len(reloaded.tasks) == 1
+
+
+class TestTaskIds:
+    """Тесты для постоянных идентификаторов задач"""
+
+    def test_ids_are_assigned_sequentially(self, temp_json_file):
+        """Тест назначения идентификаторов при добавлении"""
+        manager = TaskManager(temp_json_file)
+        task1 = manager.add_task("Task 1")
+        task2 = manager.add_task("Task 2")
+
+        assert task1.id == 0
+        assert task2.id == 1
+        assert manager.get_task(1) is task2
+
+    def test_ids_survive_removal(self, temp_json_file):
+        """Тест: удаление не сдвигает идентификаторы остальных задач"""
+        manager = TaskManager(temp_json_file)
+        manager.add_task("Task 1")
+        manager.add_task("Task 2")
+        manager.add_task("Task 3")
+
+        manager.remove_task(0)
+        task4 = manager.add_task("Task 4")
+
+        assert manager.get_task(2).title == "Task 3"
+        assert task4.id == 3
+        assert manager.remove_task(0) == False
+
+    def test_ids_persisted(self, temp_json_file):
+        """Тест сохранения идентификаторов в файл"""
+        manager1 = TaskManager(temp_json_file)
+        manager1.add_task("Task 1")
+        manager1.add_task("Task 2")
+        manager1.remove_task(0)
+
+        manager2 = TaskManager(temp_json_file)
+
+        assert [task.id for task in manager2.tasks] == [1]
+        assert manager2.add_task("Task 3").id == 2
+
+    def test_ids_assigned_for_legacy_file(self, temp_json_file):
+        """Тест загрузки старого файла без идентификаторов"""
+        legacy = [
+            {
+                "title": f"Task {i}",
+                "priority": "средний",
+                "due_date": "",
+                "completed": False,
+                "created_at": "2024-01-01 10:00:00",
+            }
+            for i in range(3)
+        ]
+        with open(temp_json_file, "w", encoding="utf-8") as f:
+            json.dump(legacy, f)
+
+        manager = TaskManager(temp_json_file)
+
+        assert [task.id for task in manager.tasks] == [0, 1, 2]
+
+    def test_filtered_list_shows_real_ids(self, temp_json_file, capsys):
+        """Тест: номера в отфильтрованном списке совпадают с идентификаторами"""
+        manager = TaskManager(temp_json_file)
+        manager.add_task("Task 1")
+        manager.add_task("Task 2")
+        manager.mark_task_completed(0)
+        capsys.readouterr()
+
+        manager.list_tasks("невыполненные")
+
+        captured = capsys.readouterr()
+        assert "Задача #1:" in captured.out
+        assert "Задача #0:" not in captured.out
+
+
+class TestSecondaryIndexes:
+    """Тесты для вторичных индексов TaskManager"""
+
+    def test_find_by_status(self, filled_manager):
+        """Тест выборки по статусу"""
+        filled_manager.mark_task_completed(1)
+
+        assert [t.id for t in filled_manager.find_tasks(completed=True)] == [1]
+        assert [t.id for t in filled_manager.find_tasks(completed=False)] == [0, 2, 3]
+
+    def test_find_by_priority(self, filled_manager):
+        """Тест выборки по приоритету"""
+        assert [t.id for t in filled_manager.find_tasks(priority="ВЫСОКИЙ")] == [0, 2]
+        assert filled_manager.find_tasks(priority="неизвестный") == []
+
+    def test_find_due_before(self, filled_manager):
+        """Тест выборки задач со сроком раньше заданной даты"""
+        assert [t.id for t in filled_manager.find_tasks(due_before="2024-07-01")] == [
+            1,
+            3,
+        ]
+
+    def test_indexes_follow_task_edits(self, filled_manager):
+        """Тест обновления индексов при изменении задачи"""
+        task = filled_manager.get_task(0)
+        task.edit(priority="низкий", due_date="2024-02-01")
+        task.completed = True
+
+        assert [t.id for t in filled_manager.find_tasks(priority="низкий")] == [0, 3]
+        assert [t.id for t in filled_manager.find_tasks(due_before="2024-03-01")] == [
+            0,
+            3,
+        ]
+        assert [t.id for t in filled_manager.find_tasks(completed=True)] == [0]
+        assert [
+            t.id for t in filled_manager.find_tasks(completed=False, priority="высокий")
+        ] == [2]
+
+    def test_indexes_follow_removal(self, filled_manager):
+        """Тест очистки индексов при удалении задачи"""
+        filled_manager.remove_task(0)
+
+        assert [t.id for t in filled_manager.find_tasks(priority="высокий")] == [2]
+        assert [t.id for t in filled_manager.find_tasks(due_before="2025-01-01")] == [
+            1,
+            3,
+        ]
+
+
+class TestSqliteStorage:
+    """Тесты для хранилища SQLite"""
+
+    def test_crud_persisted(self, temp_db_file):
+        """Тест: изменения сохраняются в базе без файла JSON"""
+        manager = TaskManager(storage=SqliteStorage(temp_db_file))
+        task1 = manager.add_task("Task 1", "высокий", "2024-12-31")
+        task2 = manager.add_task("Task 2", "средний")
+        task3 = manager.add_task("Task 3", "низкий")
+        manager.edit_task(task2.id, title="Updated Task 2")
+        manager.mark_task_completed(task1.id)
+        manager.remove_task(task3.id)
+        manager._store.close()
+
+        reopened = TaskManager(storage=SqliteStorage(temp_db_file))
+
+        assert len(reopened) == 2
+        assert [task.title for task in reopened.tasks] == ["Task 1", "Updated Task 2"]
+        assert reopened.get_task(task1.id).completed == True
+        assert reopened.get_task(task3.id) is None
+
+    def test_ids_not_reused(self, temp_db_file):
+        """Тест: идентификатор удалённой задачи не выдаётся повторно"""
+        manager = TaskManager(storage=SqliteStorage(temp_db_file))
+        manager.add_task("Task 1")
+        task2 = manager.add_task("Task 2")
+        manager.remove_task(task2.id)
+
+        assert manager.add_task("Task 3").id == task2.id + 1
+
+    def test_ids_start_at_zero(self, temp_db_file):
+        """Тест: нумерация с 0, как в остальных хранилищах"""
+        manager = TaskManager(storage=SqliteStorage(temp_db_file))
+        assert [manager.add_task(f"Task {i}").id for i in range(3)] == [0, 1, 2]
+        manager._store.close()
+
+        reopened = TaskManager(storage=SqliteStorage(temp_db_file))
+        assert reopened.add_task("Task 3").id == 3
+        reopened._store.replace_all([Task("Task 4")])
+        assert [task.id for task in reopened.tasks] == [0]
+
+    def test_completed_at_persisted(self, temp_db_file):
+        """Тест: время выполнения хранится в базе"""
+        manager = TaskManager(storage=SqliteStorage(temp_db_file))
+        task = manager.add_task("Task 1")
+        manager.mark_task_completed(task.id)
+        completed_at = task.completed_at
+        manager._store.close()
+
+        reopened = TaskManager(storage=SqliteStorage(temp_db_file))
+        assert completed_at
+        assert reopened.get_task(task.id).completed_at == completed_at
+
+    def test_old_database_gets_completed_at(self, temp_db_file):
+        """Тест: в базу без столбца completed_at он добавляется при открытии"""
+        conn = sqlite3.connect(temp_db_file)
+        conn.executescript("""
+            CREATE TABLE tasks (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                title TEXT NOT NULL,
+                priority TEXT NOT NULL,
+                due_date TEXT NOT NULL DEFAULT '',
+                completed INTEGER NOT NULL DEFAULT 0,
+                created_at TEXT NOT NULL
+            );
+            INSERT INTO tasks (title, priority, completed, created_at)
+                VALUES ('Old task', 'средний', 1, '2024-01-01 10:00:00');
+            """)
+        conn.close()
+
+        manager = TaskManager(storage=SqliteStorage(temp_db_file))
+
+        assert manager.get_task(1).completed_at == ""
+        assert manager.add_task("New task").id == 2
+
+    def test_query_filters(self, temp_db_file):
+        """Тест фильтрации запросами SQL"""
+        manager = TaskManager(storage=SqliteStorage(temp_db_file))
+        task1 = manager.add_task("Task 1", "высокий", "2024-12-31")
+        task2 = manager.add_task("Task 2", "средний", "2024-06-30")
+        task3 = manager.add_task("Task 3", "высокий")
+        task3.mark_completed()
+
+        assert manager.find_tasks(priority="высокий") == [task1, task3]
+        assert manager.find_tasks(completed=True) == [task3]
+        assert manager.find_tasks(due_before="2024-07-01") == [task2]
+
+    def test_due_date_query_uses_index(self, temp_db_file):
+        """Тест: запрос по сроку использует индекс"""
+        storage = SqliteStorage(temp_db_file)
+        plan = storage._conn.execute(
+            "EXPLAIN QUERY PLAN SELECT id FROM tasks "
+            "WHERE due_date != '' AND due_date < ?",
+            ("2024-01-01",),
+        ).fetchall()
+
+        assert "idx_tasks_due_date" in str(plan)
+
+    def test_migrate_json_to_sqlite(self, temp_json_file, temp_db_file):
+        """Тест переноса задач из JSON в SQLite"""
+        manager = TaskManager(temp_json_file)
+        manager.add_task("Task 1", "высокий")
+        manager.add_task("Task 2", "средний")
+        manager.remove_task(0)
+        manager.mark_task_completed(1)
+
+        count = migrate_json_to_sqlite(temp_json_file, temp_db_file)
+        migrated = TaskManager(storage=SqliteStorage(temp_db_file))
+
+        assert count == 1
+        assert migrated.get_task(1).title == "Task 2"
+        assert migrated.get_task(1).completed == True
+
+
+class TestLazyLoading:
+    """Тесты для потоковой ленивой загрузки"""
+
+    def test_iter_json_array_small_chunks(self, temp_json_file):
+        """Тест потокового разбора при маленьком размере фрагмента"""
+        data = [
+            {"title": f"Задача №{i}", "n": i * 1.5, "tags": [i, "x"]} for i in range(50)
+        ]
+        with open(temp_json_file, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+
+        assert list(iter_json_array(temp_json_file, chunk_size=7)) == data
+
+    def test_iter_json_array_invalid(self, temp_json_file):
+        """Тест ошибки при повреждённом массиве"""
+        with open(temp_json_file, "w", encoding="utf-8") as f:
+            f.write('[{"title": "a"}, {"title": ')
+
+        with pytest.raises(ValueError):
+            list(iter_json_array(temp_json_file, chunk_size=4))
+
+    def test_lazy_manager_builds_tasks_on_access(self, temp_json_file):
+        """Тест: задачи строятся только при обращении к ним"""
+        manager = TaskManager(temp_json_file)
+        for i in range(10):
+            manager.add_task(f"Task {i}")
+
+        lazy = TaskManager(temp_json_file, lazy=True)
+        assert len(lazy._store._tasks) == 0
+
+        assert lazy.get_task(2).title == "Task 2"
+        assert len(lazy._store._tasks) == 3
+
+        first = next(iter(lazy))
+        assert first.title == "Task 0"
+        assert not lazy._store.fully_loaded
+
+        assert len(lazy) == 10
+        assert lazy._store.fully_loaded
+
+    def test_lazy_manager_mutations(self, temp_json_file):
+        """Тест изменений и сохранения в ленивом режиме"""
+        manager = TaskManager(temp_json_file)
+        for i in range(5):
+            manager.add_task(f"Task {i}")
+
+        lazy = TaskManager(temp_json_file, lazy=True)
+        lazy.remove_task(1)
+        lazy.mark_task_completed(3)
+        lazy.add_task("Task 5")
+
+        reloaded = TaskManager(temp_json_file)
+        assert [task.id for task in reloaded.tasks] == [0, 2, 3, 4, 5]
+        assert reloaded.get_task(3).completed == True
+
+    def test_lazy_manager_with_journal(self, temp_json_file):
+        """Тест воспроизведения журнала поверх ленивой загрузки"""
+        manager = TaskManager(temp_json_file, journal=True)
+        manager.add_task("Task 1")
+        manager.save_to_file()
+        manager.edit_task(0, title="Updated Task 1")
+
+        lazy = TaskManager(temp_json_file, journal=True, lazy=True)
+
+        assert lazy.get_task(0).title == "Updated Task 1"
+
+    def test_lazy_open_does_not_read_whole_file(self, temp_json_file, mocker):
+        """Тест: ленивое открытие не считает контрольную сумму всего файла"""
+        manager = TaskManager(temp_json_file)
+        manager.add_tasks([f"Task {i}"] for i in range(100))
+        file_crc = mocker.spy(sys.modules["tasks"], "file_crc")
+
+        lazy = TaskManager(temp_json_file, lazy=True)
+
+        assert lazy.get_task(0).title == "Task 0"
+        assert file_crc.call_count == 0
+        assert len(lazy) == 100
+        assert file_crc.call_count == 1
+
+    def test_lazy_checksum_checked_after_full_read(self, temp_json_file, capsys):
+        """Тест: несовпадение суммы ленивого файла видно, когда он дочитан"""
+        manager = TaskManager(temp_json_file)
+        manager.add_tasks([f"Task {i}"] for i in range(3))
+        with open(temp_json_file, "r", encoding="utf-8") as f:
+            edited = f.read().replace("Task 1", "Tusk 1")
+        with open(temp_json_file, "w", encoding="utf-8") as f:
+            f.write(edited)
+
+        lazy = TaskManager(temp_json_file, lazy=True)
+        assert "контрольная сумма" not in capsys.readouterr().out
+        lazy.add_task("Task 3")
+
+        assert "контрольная сумма" in capsys.readouterr().out
+        assert glob.glob(temp_json_file + ".corrupt-*") == []
+        assert [task.title for task in TaskManager(temp_json_file)] == [
+            "Task 0",
+            "Tusk 1",
+            "Task 2",
+            "Task 3",
+        ]
+
+    def test_lazy_unparsable_file_preserved(self, temp_json_file, capsys):
+        """Тест: ленивый файл, который не разбирается, откладывается в сторону"""
+        manager = TaskManager(temp_json_file)
+        manager.add_tasks([f"Task {i}"] for i in range(3))
+        with open(temp_json_file, "r", encoding="utf-8") as f:
+            damaged = f.read()[:-20]
+        with open(temp_json_file, "w", encoding="utf-8") as f:
+            f.write(damaged)
+
+        lazy = TaskManager(temp_json_file, lazy=True)
+        lazy.add_task("Task 3")
+
+        assert "Ошибка" in capsys.readouterr().out
+        backups = glob.glob(temp_json_file + ".corrupt-*")
+        assert len(backups) == 1
+        with open(backups[0], "r", encoding="utf-8") as f:
+            assert f.read() == damaged
+
+
+class TestCompactStorage:
+    """Тесты для компактного представления задач"""
+
+    def test_task_has_no_dict(self, sample_task):
+        """Тест: у задачи нет __dict__ благодаря __slots__"""
+        assert not hasattr(sample_task, "__dict__")
+        with pytest.raises(AttributeError):
+            sample_task.unknown_field = 1
+
+    def test_columnar_round_trip(self):
+        """Тест: поля сохраняются в столбцах без потерь"""
+        storage = ColumnarStorage()
+        task1 = Task("Task 1", "высокий", "2024-12-31", True)
+        task1.created_at = "2024-01-01 10:00:00"
+        task2 = Task("Task 2", "срочный", "до пятницы")
+        task2.created_at = "вчера"
+        storage.insert(task1)
+        storage.insert(task2)
+
+        assert storage.get(0).to_dict() == task1.to_dict()
+        assert storage.get(1).to_dict() == task2.to_dict()
+
+    def test_columnar_keeps_completed_at(self, temp_json_file):
+        """Тест: время выполнения хранится в столбце и определяет возраст в архиве"""
+        manager = TaskManager(temp_json_file, storage=ColumnarStorage())
+        old = manager.add_task("Old done")
+        recent = manager.add_task("Recent done")
+        manager.mark_task_completed(old.id)
+        manager.mark_task_completed(recent.id)
+        old.completed_at = "2020-01-02 10:00:00"
+
+        assert recent.completed_at
+        assert manager.archive_completed(30) == 1
+        assert [task.title for task in manager] == ["Recent done"]
+        assert manager.find_archived()[0].completed_at == "2020-01-02 10:00:00"
+
+        completed_at = recent.completed_at
+        assert manager._store.delete(recent.id).completed_at == completed_at
+        recent = manager.add_task("Reopened")
+        recent.completed = True
+        recent.completed = False
+        assert recent.completed_at == ""
+
+    def test_columnar_manager_workflow(self, temp_json_file):
+        """Тест работы менеджера поверх ColumnarStorage"""
+        manager = TaskManager(temp_json_file, storage=ColumnarStorage())
+        manager.add_task("Task 1", "высокий", "2024-12-31")
+        task2 = manager.add_task("Task 2", "низкий", "2024-06-30")
+        manager.add_task("Task 3", "средний")
+        manager.remove_task(0)
+        task2.mark_completed()
+        manager.edit_task(2, due_date="2024-01-01")
+
+        assert len(manager) == 2
+        assert [t.id for t in manager.find_tasks(completed=True)] == [1]
+        assert [t.id for t in manager.find_tasks(due_before="2024-03-01")] == [2]
+        assert [t.id for t in manager.find_tasks(priority="средний")] == [2]
+
+        reloaded = TaskManager(temp_json_file, storage=ColumnarStorage())
+        assert [task.to_dict() for task in reloaded] == [
+            task.to_dict() for task in manager
+        ]
+
+    def test_columnar_uses_less_memory(self):
+        """Тест: столбцы занимают в разы меньше памяти, чем объекты Task"""
+        tasks = [
+            Task(f"Task {i}", "средний", "2024-12-31", i % 2 == 0) for i in range(2000)
+        ]
+
+        def measure(storage):
+            tracemalloc.start()
+            storage.replace_all(Task.from_dict(task.to_dict()) for task in tasks)
+            size = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+            return size
+
+        assert measure(ColumnarStorage()) * 3 < measure(MemoryStorage())
+
+
+class TestBatchOperations:
+    """Тесты для пакетных операций TaskManager"""
+
+    def test_add_tasks_saves_once(self, temp_json_file, mocker, capsys):
+        """Тест: пакетное добавление сохраняет файл один раз и ничего не печатает"""
+        manager = TaskManager(temp_json_file)
+        save = mocker.spy(manager, "save_to_file")
+        capsys.readouterr()
+
+        result = manager.add_tasks(
+            [
+                {"title": "Task 1", "priority": "высокий", "due_date": "2024-12-31"},
+                ("Task 2", "низкий"),
+                ("Task 3",),
+            ]
+        )
+
+        assert result.ok
+        assert result.succeeded == [0, 1, 2]
+        assert save.call_count == 1
+        assert capsys.readouterr().out == ""
+        assert [task.priority for task in manager] == ["высокий", "низкий", "средний"]
+
+    def test_add_tasks_reports_errors(self, temp_json_file):
+        """Тест: ошибки проверки возвращаются в результате"""
+        manager = TaskManager(temp_json_file)
+
+        result = manager.add_tasks(
+            [
+                ("", "высокий"),
+                ("Task 2", "неправильный"),
+                {"priority": "низкий"},
+                ("Ok",),
+            ]
+        )
+
+        assert result.succeeded == [0]
+        assert len(result.errors) == 3
+        assert "не может быть пустым" in result.errors[0][1]
+        assert "приоритет должен быть" in result.errors[1][1]
+        assert not result.ok
+
+    def test_many_operations(self, temp_json_file):
+        """Тест пакетных отметки, редактирования и удаления"""
+        manager = TaskManager(temp_json_file)
+        manager.add_tasks([(f"Task {i}",) for i in range(5)])
+
+        completed = manager.mark_completed_many([0, 1, 42])
+        edited = manager.edit_many({2: {"title": "Edited"}, 3: {"priority": "высокий"}})
+        removed = manager.remove_many([4, 4])
+
+        assert completed.succeeded == [0, 1]
+        assert completed.errors == [(42, "задача не найдена")]
+        assert edited.ok
+        assert removed.succeeded == [4] and len(removed.errors) == 1
+
+        reloaded = TaskManager(temp_json_file)
+        assert [task.id for task in reloaded.find_tasks(completed=True)] == [0, 1]
+        assert reloaded.get_task(2).title == "Edited"
+        assert reloaded.get_task(3).priority == "высокий"
+        assert len(reloaded) == 4
+
+    def test_batch_context_defers_save(self, temp_json_file, mocker):
+        """Тест: внутри batch() одиночные операции не сохраняют файл"""
+        manager = TaskManager(temp_json_file)
+        save = mocker.spy(manager, "save_to_file")
+
+        with manager.batch():
+            manager.add_task("Task 1")
+            manager.add_task("Task 2")
+            manager.mark_task_completed(0)
+            assert save.call_count == 0
+
+        assert save.call_count == 1
+
+    def test_batch_with_journal_single_append(self, temp_json_file, mocker):
+        """Тест: в режиме журнала пакет дописывается одной порцией"""
+        manager = TaskManager(temp_json_file, journal=True)
+        open_spy = mocker.spy(builtins, "open")
+        manager.add_tasks([(f"Task {i}",) for i in range(3)])
+
+        assert open_spy.call_count == 1
+        reloaded = TaskManager(temp_json_file, journal=True)
+        assert len(reloaded) == 3
+
+    def test_batch_sqlite_transaction(self, temp_db_file):
+        """Тест пакетного добавления в SQLite одной транзакцией"""
+        manager = TaskManager(storage=SqliteStorage(temp_db_file))
+
+        result = manager.add_tasks([(f"Task {i}",) for i in range(100)])
+
+        assert len(result.succeeded) == 100
+        assert not manager._store._conn.in_transaction
+        assert len(TaskManager(storage=SqliteStorage(temp_db_file))) == 100
+
+
+class TestAutosave:
+    """Тесты для фонового автосохранения"""
+
+    def test_mutations_coalesced_into_one_save(self, temp_json_file, mocker):
+        """Тест: несколько изменений сохраняются одной записью после паузы"""
+        manager = TaskManager(
+            temp_json_file, autosave=True, autosave_delay=0.05, autosave_max_delay=1
+        )
+        save = mocker.spy(manager._autosaver, "_save")
+
+        manager.add_task("Task 1")
+        manager.add_task("Task 2")
+        manager.mark_task_completed(0)
+        assert save.call_count == 0
+
+        time.sleep(0.3)
+        assert save.call_count == 1
+        assert len(TaskManager(temp_json_file)) == 2
+        manager.close()
+
+    def test_max_delay_forces_save(self, temp_json_file, mocker):
+        """Тест: при непрерывных изменениях сохранение не откладывается бесконечно"""
+        manager = TaskManager(
+            temp_json_file, autosave=True, autosave_delay=0.1, autosave_max_delay=0.2
+        )
+        save = mocker.spy(manager._autosaver, "_save")
+
+        for i in range(12):
+            manager.add_task(f"Task {i}")
+            time.sleep(0.05)
+
+        assert save.call_count >= 1
+        manager.close()
+
+    def test_close_flushes(self, temp_json_file):
+        """Тест: close() сохраняет отложенные изменения"""
+        manager = TaskManager(temp_json_file, autosave=True, autosave_delay=60)
+        manager.add_task("Task 1")
+        assert len(TaskManager(temp_json_file)) == 0
+
+        manager.close()
+
+        assert len(TaskManager(temp_json_file)) == 1
+
+    @pytest.mark.ui
+    def test_exit_choice_flushes(self, monkeypatch, temp_json_file):
+        """Тест: выход из меню сохраняет отложенные изменения"""
+        app = ToDoApp()
+        app.task_manager = TaskManager(temp_json_file, autosave=True, autosave_delay=60)
+        app.task_manager.add_task("Task 1")
+
+        monkeypatch.setattr("builtins.input", lambda _: "0")
+        app.start()
+
+        assert len(TaskManager(temp_json_file)) == 1
+        app.task_manager.close()
+
+
+class TestAtomicSave:
+    """Тесты для атомарного сохранения и проверки целостности"""
+
+    def test_save_writes_checksum_without_temp_files(self, temp_json_file):
+        """Тест: после сохранения нет временных файлов, есть контрольная сумма"""
+        manager = TaskManager(temp_json_file)
+        manager.add_task("Task 1")
+
+        directory = os.path.dirname(temp_json_file)
+        prefix = os.path.basename(temp_json_file)
+        leftovers = [
+            name
+            for name in os.listdir(directory)
+            if name.startswith(prefix) and name.endswith(".tmp")
+        ]
+        assert leftovers == []
+        assert os.path.exists(manager.checksum_filename)
+
+    def test_failed_write_keeps_old_file(self, temp_json_file, mocker):
+        """Тест: сбой во время записи не портит прежний файл"""
+        manager = TaskManager(temp_json_file)
+        manager.add_task("Task 1")
+        mocker.patch("tasks.os.replace", side_effect=OSError("disk full"))
+
+        manager.add_task("Task 2")
+        mocker.stopall()
+
+        reloaded = TaskManager(temp_json_file)
+        assert [task.title for task in reloaded] == ["Task 1"]
+
+    def test_external_edit_survives_reload(self, temp_json_file, capsys):
+        """Тест: файл, изменённый вне программы, загружается, а не теряется"""
+        manager = TaskManager(temp_json_file)
+        manager.add_task("Task 1")
+        with open(temp_json_file, "r", encoding="utf-8") as f:
+            edited = f.read().replace('"средний"', '"высокий"')
+        with open(temp_json_file, "w", encoding="utf-8") as f:
+            f.write(edited)
+
+        reloaded = TaskManager(temp_json_file)
+        assert "контрольная сумма" in capsys.readouterr().out
+        assert reloaded.get_task(0).priority == "высокий"
+        reloaded.add_task("Task 2")
+
+        assert glob.glob(temp_json_file + ".corrupt-*") == []
+        again = TaskManager(temp_json_file)
+        assert "контрольная сумма" not in capsys.readouterr().out
+        assert [task.title for task in again] == ["Task 1", "Task 2"]
+        assert again.get_task(0).priority == "высокий"
+
+    def test_unparsable_file_preserved(self, temp_json_file, capsys):
+        """Тест: файл, который не разбирается, не теряется при сохранении"""
+        manager = TaskManager(temp_json_file)
+        manager.add_task("Task 1")
+        with open(temp_json_file, "r", encoding="utf-8") as f:
+            damaged = f.read().replace("}", "", 1)
+        with open(temp_json_file, "w", encoding="utf-8") as f:
+            f.write(damaged)
+
+        reloaded = TaskManager(temp_json_file)
+        reloaded.add_task("Task 2")
+
+        captured = capsys.readouterr()
+        assert "Ошибка при загрузке файла" in captured.out
+        backups = glob.glob(temp_json_file + ".corrupt-*")
+        assert len(backups) == 1
+        with open(backups[0], "r", encoding="utf-8") as f:
+            assert f.read() == damaged
+        assert [task.title for task in TaskManager(temp_json_file)] == ["Task 2"]
+
+    def test_concurrent_saves_share_one_write(self, temp_json_file, mocker):
+        """Тест: одновременные сохранения объединяются в общую запись"""
+        manager = TaskManager(temp_json_file)
+        original = manager._write_snapshot
+
+        def slow_write():
+            time.sleep(0.05)
+            original()
+
+        write = mocker.patch.object(manager, "_write_snapshot", side_effect=slow_write)
+        threads = [
+            threading.Thread(target=manager.add_task, args=(f"Task {i}",))
+            for i in range(10)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert write.call_count < 10
+        assert len(TaskManager(temp_json_file)) == 10
+
+
+class TestSnapshotCache:
+    """Тесты для бинарного кэша снимка"""
+
+    def test_cache_used_when_fresh(self, temp_json_file, mocker):
+        """Тест: свежий кэш загружается без чтения JSON"""
+        manager = TaskManager(temp_json_file, snapshot_cache=True)
+        manager.add_task("Task 1", "высокий", "2024-12-31")
+        manager.add_task("Task 2")
+        manager.mark_task_completed(1)
+        # Кэш пересоздаётся в фоне после каждой записи
+        manager._cache_thread.join()
+        assert os.path.exists(manager.cache_filename)
+
+        from_dict = mocker.spy(Task, "from_dict")
+        cached = TaskManager(temp_json_file, snapshot_cache=True)
+
+        assert from_dict.call_count == 0
+        assert [task.to_dict() for task in cached] == [
+            task.to_dict() for task in manager
+        ]
+        assert [task.id for task in cached.find_tasks(completed=True)] == [1]
+
+    def test_stale_cache_regenerated(self, temp_json_file, mocker):
+        """Тест: после правки JSON кэш не используется и пересоздаётся"""
+        manager = TaskManager(temp_json_file, snapshot_cache=True)
+        manager.add_task("Task 1")
+        # Файл JSON изменён другой программой без кэша
+        other = TaskManager(temp_json_file)
+        other.add_task("Task 2")
+
+        stale = TaskManager(temp_json_file, snapshot_cache=True)
+        assert len(stale) == 2
+        stale._cache_thread.join()
+
+        from_dict = mocker.spy(Task, "from_dict")
+        fresh = TaskManager(temp_json_file, snapshot_cache=True)
+        assert from_dict.call_count == 0
+        assert len(fresh) == 2
+
+    def test_corrupt_cache_ignored(self, temp_json_file):
+        """Тест: повреждённый кэш не мешает загрузке из JSON"""
+        manager = TaskManager(temp_json_file, snapshot_cache=True)
+        manager.add_task("Task 1")
+        with open(manager.cache_filename, "r+b") as f:
+            f.seek(10)
+            f.write(b"\xff\xff\xff")
+
+        reloaded = TaskManager(temp_json_file, snapshot_cache=True)
+
+        assert [task.title for task in reloaded] == ["Task 1"]
+
+
+class TestNdjsonStorage:
+    """Тесты для хранилища NDJSON с перезаписью отдельных записей"""
+
+    def test_task_tracks_dirty_fields(self, sample_task):
+        """Тест: задача запоминает изменённые поля до сохранения"""
+        assert sample_task.dirty_fields == frozenset()
+
+        sample_task.edit(title="New title", priority="низкий")
+        sample_task.mark_completed()
+
+        assert sample_task.dirty_fields == {"title", "priority", "completed"}
+        sample_task.clear_dirty()
+        assert sample_task.dirty_fields == frozenset()
+
+    def test_round_trip(self, temp_ndjson_file):
+        """Тест: изменения сохраняются в файл и читаются обратно"""
+        manager = TaskManager(storage=NdjsonStorage(temp_ndjson_file))
+        first = manager.add_task("Task 1", "высокий", "2024-12-31")
+        second = manager.add_task("Task 2")
+        third = manager.add_task("Task 3", "низкий")
+        manager.edit_task(second.id, title="Task 2 edited")
+        manager.mark_task_completed(third.id)
+        manager.remove_task(first.id)
+
+        reloaded = TaskManager(storage=NdjsonStorage(temp_ndjson_file))
+
+        assert [task.to_dict() for task in reloaded] == [
+            task.to_dict() for task in manager
+        ]
+        assert [task.id for task in reloaded.find_tasks(completed=True)] == [2]
+
+    def test_edit_rewrites_only_changed_record(self, temp_ndjson_file, mocker):
+        """Тест: изменение задачи перезаписывает только её слот"""
+        manager = TaskManager(storage=NdjsonStorage(temp_ndjson_file))
+        for i in range(5):
+            manager.add_task(f"Task {i}")
+        with open(temp_ndjson_file, "rb") as f:
+            before = f.read()
+        offset, size = manager._store._slots[2]
+        to_dict = mocker.spy(Task, "to_dict")
+
+        manager.mark_task_completed(2)
+
+        with open(temp_ndjson_file, "rb") as f:
+            after = f.read()
+        assert to_dict.call_count == 1
+        assert len(after) == len(before)
+        assert after[:offset] == before[:offset]
+        assert after[offset + size :] == before[offset + size :]
+        assert b'"completed":true' in after[offset : offset + size]
+
+    def test_grown_record_moves_and_slot_is_reused(self, temp_ndjson_file):
+        """Тест: выросшая запись переезжает, а её старый слот занимают снова"""
+        manager = TaskManager(storage=NdjsonStorage(temp_ndjson_file))
+        for i in range(4):
+            manager.add_task(f"Task {i}")
+        old_slot = manager._store._slots[1]
+
+        manager.edit_task(1, title="Task 1 " + "x" * 200)
+        assert manager._store._slots[1] != old_slot
+        size = os.path.getsize(temp_ndjson_file)
+
+        added = manager.add_task("Task 4")
+        assert manager._store._slots[added.id] == old_slot
+        assert os.path.getsize(temp_ndjson_file) == size
+
+        reloaded = TaskManager(storage=NdjsonStorage(temp_ndjson_file))
+        assert [task.title for task in reloaded] == [
+            "Task 0",
+            "Task 1 " + "x" * 200,
+            "Task 2",
+            "Task 3",
+            "Task 4",
+        ]
+
+    def test_batch_flushes_once(self, temp_ndjson_file, mocker):
+        """Тест: пакет изменений записывается в файл один раз"""
+        storage = NdjsonStorage(temp_ndjson_file)
+        manager = TaskManager(storage=storage)
+        write_slot = mocker.spy(storage, "_write_slot")
+        flush = mocker.spy(storage, "flush")
+
+        result = manager.add_tasks([("Task 1",), ("Task 2",), ("Task 3",)])
+
+        assert result.ok
+        assert flush.call_count == 1
+        assert write_slot.call_count == 0  # первая запись создаёт файл целиком
+        assert len(TaskManager(storage=NdjsonStorage(temp_ndjson_file))) == 3
+
+    def test_torn_tail_is_truncated(self, temp_ndjson_file):
+        """Тест: недописанный слот после сбоя отбрасывается при загрузке"""
+        manager = TaskManager(storage=NdjsonStorage(temp_ndjson_file))
+        manager.add_task("Task 1")
+        size = os.path.getsize(temp_ndjson_file)
+        with open(temp_ndjson_file, "ab") as f:
+            f.write(b'{"id":1,"title":"Tas')
+
+        reloaded = TaskManager(storage=NdjsonStorage(temp_ndjson_file))
+        assert [task.title for task in reloaded] == ["Task 1"]
+        assert os.path.getsize(temp_ndjson_file) == size
+
+        reloaded.add_task("Task 2")
+        again = TaskManager(storage=NdjsonStorage(temp_ndjson_file))
+        assert [task.title for task in again] == ["Task 1", "Task 2"]
+
+
+class TestArchive:
+    """Тесты для архива выполненных задач"""
+
+    @staticmethod
+    def make_manager(filename):
+        """Менеджер с давно выполненной, недавно выполненной и открытой задачей"""
+        manager = TaskManager(filename)
+        old = manager.add_task("Old done", "низкий", "2024-01-15")
+        recent = manager.add_task("Recent done")
+        manager.add_task("Open")
+        manager.mark_task_completed(old.id)
+        manager.mark_task_completed(recent.id)
+        old.completed_at = "2020-01-01 10:00:00"
+        return manager
+
+    def test_completed_at_tracked(self, sample_task):
+        """Тест: время выполнения ставится при выполнении и сохраняется"""
+        assert sample_task.completed_at == ""
+
+        sample_task.mark_completed()
+        assert sample_task.completed_at
+        assert Task.from_dict(sample_task.to_dict()).completed_at == (
+            sample_task.completed_at
+        )
+
+        sample_task.completed = False
+        assert sample_task.completed_at == ""
+
+    def test_archive_moves_old_completed_tasks(self, temp_json_file, mocker):
+        """Тест: старые выполненные задачи уходят из основного файла в архив"""
+        manager = self.make_manager(temp_json_file)
+
+        assert manager.archive_completed(30) == 1
+        assert [task.title for task in manager] == ["Recent done", "Open"]
+        with open(temp_json_file, "r", encoding="utf-8") as f:
+            assert "Old done" not in f.read()
+
+        gzip_open = mocker.spy(gzip, "open")
+        reloaded = TaskManager(temp_json_file)
+        assert len(reloaded) == 2
+        assert gzip_open.call_count == 0
+
+        archived = reloaded.find_archived()
+        assert [task.title for task in archived] == ["Old done"]
+        assert archived[0].id == 0
+        assert reloaded.find_archived(priority="высокий") == []
+        assert gzip_open.call_count == 1
+
+    def test_archived_ids_not_reused(self, temp_json_file):
+        """Тест: идентификаторы архивных задач не выдаются новым задачам"""
+        manager = TaskManager(temp_json_file)
+        manager.add_task("Task 1")
+        last = manager.add_task("Task 2")
+        manager.mark_task_completed(last.id)
+        manager.archive_completed(0)
+
+        reloaded = TaskManager(temp_json_file)
+        added = reloaded.add_task("Task 3")
+
+        assert added.id == 2
+
+    def test_archive_appends_portions(self, temp_json_file):
+        """Тест: повторная архивация дописывает архив, не теряя прежние задачи"""
+        manager = self.make_manager(temp_json_file)
+        manager.archive_completed(30)
+        manager.archive_completed(0)
+
+        reloaded = TaskManager(temp_json_file)
+        assert [task.title for task in reloaded.find_archived()] == [
+            "Old done",
+            "Recent done",
+        ]
+        assert [task.title for task in reloaded] == ["Open"]
+
+    def test_list_completed_includes_archive(self, temp_json_file, capsys):
+        """Тест: список выполненных задач показывает и архивные"""
+        manager = self.make_manager(temp_json_file)
+        manager.archive_completed(30)
+        capsys.readouterr()
+
+        manager.list_tasks("выполненные")
+        output = capsys.readouterr().out
+        assert "Задача #0 (в архиве):" in output
+        assert "Recent done" in output
+        assert "Всего задач: 2" in output
+
+        manager.list_tasks("все")
+        output = capsys.readouterr().out
+        assert "Old done" not in output
+        assert "В архиве выполненных задач: 1" in output
+
+    def test_archive_on_startup(self, temp_json_file):
+        """Тест: менеджер с archive_after_days архивирует задачи при запуске"""
+        self.make_manager(temp_json_file).save_to_file()
+
+        manager = TaskManager(temp_json_file, archive_after_days=30)
+
+        assert [task.title for task in manager] == ["Recent done", "Open"]
+        assert [task.title for task in manager.find_archived()] == ["Old done"]
+
+
+class TestThreadSafety:
+    """Тесты для потокобезопасного режима TaskManager"""
+
+    def test_readers_do_not_block_each_other(self):
+        """Тест: несколько читателей держат блокировку одновременно"""
+        lock = ReadWriteLock()
+        barrier = threading.Barrier(3, timeout=5)
+        errors = []
+
+        def reader():
+            with lock.read():
+                try:
+                    barrier.wait()
+                except threading.BrokenBarrierError as e:
+                    errors.append(e)
+
+        threads = [threading.Thread(target=reader) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert errors == []
+
+    def test_writer_excludes_readers(self):
+        """Тест: читатель ждёт, пока писатель не отпустит блокировку"""
+        lock = ReadWriteLock()
+        entered = threading.Event()
+
+        def reader():
+            with lock.read():
+                entered.set()
+
+        with lock.write():
+            # Писатель может повторно взять запись и чтение
+            with lock.write(), lock.read():
+                pass
+            thread = threading.Thread(target=reader)
+            thread.start()
+            assert not entered.wait(0.1)
+        assert entered.wait(5)
+        thread.join()
+
+    def test_read_cannot_be_upgraded(self):
+        """Тест: попытка повысить чтение до записи — ошибка, а не зависание"""
+        lock = ReadWriteLock()
+        with lock.read():
+            with pytest.raises(RuntimeError):
+                lock.acquire_write()
+
+    @pytest.mark.parametrize("journal", [False, True])
+    def test_stress_concurrent_writers_and_readers(self, temp_json_file, journal):
+        """Тест: параллельные изменения и чтения сохраняют инварианты"""
+        manager = TaskManager(
+            temp_json_file, journal=journal, journal_max_bytes=4096, thread_safe=True
+        )
+        writers, operations = 8, 30
+        expected = {}
+        errors = []
+        stop = threading.Event()
+
+        def writer(number):
+            try:
+                for i in range(operations):
+                    task = manager.add_task(f"w{number}-{i}", "низкий")
+                    manager.edit_task(task.id, priority="высокий")
+                    if i % 3 == 0:
+                        manager.remove_task(task.id)
+                        continue
+                    if i % 2 == 0:
+                        manager.mark_task_completed(task.id)
+                    expected[task.id] = (task.title, i % 2 == 0)
+            except Exception as e:
+                errors.append(e)
+
+        def reader():
+            try:
+                while not stop.is_set():
+                    done = manager.find_tasks(completed=True)
+                    assert all(task.completed for task in done)
+                    ids = [task.id for task in manager]
+                    assert len(ids) == len(set(ids))
+                    for task_id in ids[-5:]:
+                        task = manager.get_task(task_id)
+                        assert task is None or task.id == task_id
+                    time.sleep(0.001)
+            except Exception as e:
+                errors.append(e)
+
+        readers = [threading.Thread(target=reader) for _ in range(4)]
+        threads = [threading.Thread(target=writer, args=(n,)) for n in range(writers)]
+        for thread in readers + threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        stop.set()
+        for thread in readers:
+            thread.join()
+
+        assert errors == []
+        actual = {task.id: (task.title, task.completed) for task in manager}
+        assert actual == expected
+        assert all(task.priority == "высокий" for task in manager)
+        assert [task.id for task in manager.find_tasks(completed=True)] == sorted(
+            task_id for task_id, (_, done) in expected.items() if done
+        )
+
+        reloaded = TaskManager(temp_json_file)
+        assert {task.id: (task.title, task.completed) for task in reloaded} == (
+            expected
+        )
+
+
+class TestSharedFile:
+    """Тесты для совместной работы нескольких процессов с одним файлом"""
+
+    def test_concurrent_adds_are_merged(self, temp_json_file):
+        """Тест: задачи, добавленные двумя менеджерами, не теряются"""
+        first = TaskManager(temp_json_file, shared=True)
+        second = TaskManager(temp_json_file, shared=True)
+
+        first.add_task("From first")
+        added = second.add_task("From second")
+
+        assert added.id == 1
+        reloaded = TaskManager(temp_json_file)
+        assert {task.id: task.title for task in reloaded} == {
+            0: "From first",
+            1: "From second",
+        }
+
+    def test_field_level_merge(self, temp_json_file):
+        """Тест: разные поля одной задачи, изменённые в двух менеджерах, сливаются"""
+        first = TaskManager(temp_json_file, shared=True)
+        first.add_task("Task", "низкий")
+        second = TaskManager(temp_json_file, shared=True)
+
+        first.edit_task(0, title="Renamed")
+        second.mark_task_completed(0)
+
+        task = TaskManager(temp_json_file).get_task(0)
+        assert task.title == "Renamed"
+        assert task.completed
+        assert second.get_task(0).title == "Renamed"
+
+    def test_removal_is_not_undone_by_stale_manager(self, temp_json_file):
+        """Тест: менеджер со старыми данными не возвращает удалённую задачу"""
+        first = TaskManager(temp_json_file, shared=True)
+        first.add_task("Task 1")
+        first.add_task("Task 2")
+        second = TaskManager(temp_json_file, shared=True)
+
+        first.remove_task(0)
+        second.edit_task(1, title="Task 2 edited")
+
+        assert [task.title for task in TaskManager(temp_json_file)] == ["Task 2 edited"]
+        assert second.get_task(0) is None
+
+    def test_removal_wins_over_concurrent_edit(self, temp_json_file):
+        """Тест: правка в другом менеджере не возвращает удалённую задачу"""
+        first = TaskManager(temp_json_file, shared=True)
+        first.add_task("Task 1")
+        first.add_task("Task 2")
+        second = TaskManager(temp_json_file, shared=True)
+
+        first.remove_task(0)
+        second.edit_task(0, title="Task 1 edited")
+
+        assert [task.title for task in TaskManager(temp_json_file)] == ["Task 2"]
+        assert second.get_task(0) is None
+
+    def test_only_changed_records_reloaded(self, temp_json_file, mocker):
+        """Тест: при слиянии задачи строятся только из изменившихся записей"""
+        first = TaskManager(temp_json_file, shared=True)
+        first.add_tasks([(f"Task {i}",) for i in range(50)])
+        second = TaskManager(temp_json_file, shared=True)
+        first.edit_task(10, title="Edited")
+        first.add_task("New")
+
+        from_dict = mocker.spy(Task, "from_dict")
+        merge = mocker.spy(second, "_merge_records")
+        second.refresh()
+
+        assert from_dict.call_count == 1
+        assert second.get_task(10).title == "Edited"
+        assert len(second) == 51
+
+        # Файл с тех пор не менялся — сохранение не перечитывает его
+        second.add_task("Another")
+        assert merge.call_count == 1
+
+    def test_processes_do_not_lose_updates(self, temp_json_file):
+        """Тест: одновременные процессы сохраняют все свои задачи"""
+        script = (
+            "import sys\n"
+            "from tasks import TaskManager\n"
+            "manager = TaskManager(sys.argv[1], shared=True)\n"
+            "for i in range(15):\n"
+            "    manager.add_task(f'{sys.argv[2]}-{i}')\n"
+        )
+        here = os.path.dirname(os.path.abspath(__file__))
+        processes = [
+            subprocess.Popen(
+                [sys.executable, "-c", script, temp_json_file, f"p{n}"],
+                cwd=here,
+                stdout=subprocess.DEVNULL,
+            )
+            for n in range(4)
+        ]
+        for process in processes:
+            assert process.wait(timeout=60) == 0
+
+        tasks = list(TaskManager(temp_json_file))
+        assert len(tasks) == 60
+        assert len({task.id for task in tasks}) == 60
+        assert {task.title for task in tasks} == {
+            f"p{n}-{i}" for n in range(4) for i in range(15)
+        }
+
+    def test_shared_requires_plain_json_storage(self, temp_json_file):
+        """Тест: совместный режим несовместим с журналом"""
+        with pytest.raises(ValueError):
+            TaskManager(temp_json_file, journal=True, shared=True)
+
+
+class TestAsyncTaskManager:
+    """Тесты для асинхронного интерфейса AsyncTaskManager"""
+
+    def test_operations(self, temp_json_file):
+        """Тест: асинхронные операции меняют задачи и сохраняют файл"""
+
+        async def scenario():
+            manager = await AsyncTaskManager.open(temp_json_file)
+            first = await manager.add_task("Task 1", "высокий", "2024-12-31")
+            second = await manager.add_task("Task 2")
+            assert await manager.add_task("   ") is None
+            assert await manager.edit_task(second.id, title="Task 2 edited")
+            assert await manager.mark_task_completed(first.id)
+            assert await manager.remove_task(99) is False
+            done = await manager.find_tasks(completed=True)
+            await manager.close()
+            return [task.title for task in done], len(manager)
+
+        done, count = asyncio.run(scenario())
+
+        assert done == ["Task 1"]
+        assert count == 2
+        reloaded = TaskManager(temp_json_file)
+        assert [task.title for task in reloaded] == ["Task 1", "Task 2 edited"]
+        assert reloaded.get_task(0).completed
+
+    def test_operations_print_nothing(self, temp_json_file, capsys):
+        """Тест: асинхронные операции не печатают сообщений для человека"""
+
+        async def scenario():
+            manager = await AsyncTaskManager.open(temp_json_file, verbose=False)
+            task = await manager.add_task("Task 1")
+            assert await manager.add_task("Task 2", "bogus") is None
+            assert await manager.edit_task(task.id, priority="высокий")
+            assert await manager.edit_task(task.id, priority="bogus") is False
+            assert await manager.edit_task(99, title="X") is False
+            assert await manager.mark_task_completed(task.id)
+            assert await manager.mark_task_completed(99) is False
+            assert await manager.remove_task(task.id)
+            await manager.close()
+
+        capsys.readouterr()
+        asyncio.run(scenario())
+
+        assert capsys.readouterr().out == ""
+
+    def test_concurrent_writes_share_one_save(self, temp_json_file, mocker):
+        """Тест: одновременные изменения записываются одним сохранением"""
+
+        async def scenario():
+            manager = await AsyncTaskManager.open(temp_json_file)
+            save = mocker.spy(manager.manager, "save_to_file")
+            tasks = await asyncio.gather(
+                *(manager.add_task(f"Task {i}") for i in range(20))
+            )
+            await manager.close()
+            return save.call_count, tasks
+
+        save_count, tasks = asyncio.run(scenario())
+
+        assert save_count == 1
+        assert len({task.id for task in tasks}) == 20
+        assert len(TaskManager(temp_json_file)) == 20
+
+    def test_save_does_not_block_event_loop(self, temp_json_file, mocker):
+        """Тест: пока идёт медленное сохранение, цикл событий продолжает работу"""
+
+        async def scenario():
+            manager = await AsyncTaskManager.open(temp_json_file)
+            original = manager.manager.save_to_file
+
+            def slow_save():
+                time.sleep(0.3)
+                original()
+
+            mocker.patch.object(manager.manager, "save_to_file", slow_save)
+            ticks = 0
+
+            async def ticker():
+                nonlocal ticks
+                while True:
+                    await asyncio.sleep(0.01)
+                    ticks += 1
+
+            ticking = asyncio.ensure_future(ticker())
+            await manager.add_task("Task")
+            ticking.cancel()
+            await manager.close()
+            return ticks
+
+        assert asyncio.run(scenario()) >= 10
+
+
+class TestHttpServer:
+    """Тесты для сервера HTTP/JSON"""
+
+    @staticmethod
+    def request(connection, method, path, body=None):
+        """Выполнить запрос и вернуть (статус, разобранный JSON или None)"""
+        headers = {}
+        data = None
+        if body is not None:
+            data = json.dumps(body).encode("utf-8")
+            headers["Content-Type"] = "application/json"
+        connection.request(method, path, body=data, headers=headers)
+        response = connection.getresponse()
+        payload = response.read()
+        return response.status, json.loads(payload) if payload else None
+
+    @pytest.mark.integration
+    def test_crud_over_one_connection(self, task_server):
+        """Тест: создание, чтение, изменение и удаление по одному соединению"""
+        connection = http.client.HTTPConnection("127.0.0.1", task_server.server_port)
+
+        status, created = self.request(
+            connection,
+            "POST",
+            "/tasks",
+            {"title": "Task 1", "priority": "высокий", "due_date": "2024-12-31"},
+        )
+        assert status == 201
+        assert created["title"] == "Task 1"
+        sock = connection.sock
+
+        status, task = self.request(connection, "GET", f"/tasks/{created['id']}")
+        assert (status, task["priority"]) == (200, "высокий")
+
+        status, task = self.request(
+            connection,
+            "PATCH",
+            f"/tasks/{created['id']}",
+            {"title": "Task 1 edited", "completed": True},
+        )
+        assert status == 200
+        assert (task["title"], task["completed"]) == ("Task 1 edited", True)
+
+        status, _ = self.request(connection, "DELETE", f"/tasks/{created['id']}")
+        assert status == 204
+        status, error = self.request(connection, "GET", f"/tasks/{created['id']}")
+        assert status == 404
+        assert "error" in error
+        # Соединение не закрывалось между запросами
+        assert connection.sock is sock
+        connection.close()
+
+    @pytest.mark.integration
+    def test_paginated_filtered_list(self, task_server):
+        """Тест: список задач с фильтром отдаётся страницами"""
+        connection = http.client.HTTPConnection("127.0.0.1", task_server.server_port)
+        for i in range(7):
+            priority = "высокий" if i % 2 == 0 else "низкий"
+            self.request(
+                connection,
+                "POST",
+                "/tasks",
+                {"title": f"Task {i}", "priority": priority},
+            )
+
+        query = urllib.parse.quote("высокий")
+        status, page = self.request(
+            connection, "GET", f"/tasks?priority={query}&offset=1&limit=2"
+        )
+
+        assert status == 200
+        assert page["has_more"] == True
+        assert [task["title"] for task in page["tasks"]] == ["Task 2", "Task 4"]
+        status, page = self.request(connection, "GET", "/tasks?completed=false")
+        assert len(page["tasks"]) == 7
+        assert page["has_more"] == False
+        connection.close()
+
+    @pytest.mark.integration
+    def test_invalid_requests(self, task_server):
+        """Тест: ошибочные запросы получают понятный ответ, а не обрыв соединения"""
+        connection = http.client.HTTPConnection("127.0.0.1", task_server.server_port)
+
+        assert self.request(connection, "POST", "/tasks", {"title": "  "})[0] == 400
+        assert self.request(connection, "POST", "/tasks", {})[0] == 400
+        assert self.request(connection, "GET", "/tasks?limit=0")[0] == 400
+        assert self.request(connection, "GET", "/tasks/abc")[0] == 404
+        assert self.request(connection, "PATCH", "/tasks/5", {"title": "X"})[0] == 404
+        assert self.request(connection, "GET", "/unknown")[0] == 404
+        connection.close()
+
+    @pytest.mark.integration
+    def test_patch_saved_once(self, task_server, mocker):
+        """Тест: правка с отметкой о выполнении сохраняется одной записью"""
+        connection = http.client.HTTPConnection("127.0.0.1", task_server.server_port)
+        self.request(connection, "POST", "/tasks", {"title": "Task 1"})
+        save_soon = mocker.spy(task_server.task_manager, "_save_soon")
+
+        status, task = self.request(
+            connection, "PATCH", "/tasks/0", {"title": "Done", "completed": True}
+        )
+
+        assert status == 200
+        assert task["title"] == "Done" and task["completed"] == True
+        assert save_soon.call_count == 1
+        connection.close()
+
+    @pytest.mark.integration
+    def test_invalid_patch(self, task_server):
+        """Тест: PATCH с неверными полями получает 400 и не меняет задачу"""
+        connection = http.client.HTTPConnection("127.0.0.1", task_server.server_port)
+        _, created = self.request(
+            connection, "POST", "/tasks", {"title": "Task 1", "priority": "низкий"}
+        )
+        path = f"/tasks/{created['id']}"
+
+        for body in (
+            {"priority": "bogus"},
+            {"priority": 5},
+            {"title": 123},
+            {"title": "   "},
+            {"due_date": "31.12.2024"},
+            {"completed": "yes"},
+        ):
+            status, error = self.request(connection, "PATCH", path, body)
+            assert status == 400, body
+            assert "error" in error
+
+        _, task = self.request(connection, "GET", path)
+        assert (task["title"], task["priority"]) == ("Task 1", "низкий")
+        assert task_server.task_manager.search("task")[0].id == created["id"]
+        connection.close()
+
+    @pytest.mark.integration
+    def test_malformed_content_length(self, task_server):
+        """Тест: неверный Content-Length получает 400, а не обрыв соединения"""
+        connection = http.client.HTTPConnection("127.0.0.1", task_server.server_port)
+        connection.putrequest("POST", "/tasks")
+        connection.putheader("Content-Type", "application/json")
+        connection.putheader("Content-Length", "abc")
+        connection.endheaders()
+
+        response = connection.getresponse()
+
+        assert response.status == 400
+        assert "Content-Length" in json.loads(response.read())["error"]
+        connection.close()
+
+    @pytest.mark.integration
+    def test_changes_persisted_in_batches(self, task_server, temp_json_file, mocker):
+        """Тест: изменения сохраняются в файл автосохранением, а не на каждый запрос"""
+        save = mocker.spy(task_server.task_manager._autosaver, "_save")
+        connection = http.client.HTTPConnection("127.0.0.1", task_server.server_port)
+        for i in range(10):
+            self.request(connection, "POST", "/tasks", {"title": f"Task {i}"})
+        connection.close()
+
+        task_server.task_manager.flush()
+
+        assert save.call_count <= 2
+        assert len(TaskManager(temp_json_file)) == 10
+
+
+class TestCommandLine:
+    """Тесты для команд командной строки"""
+
+    @staticmethod
+    def run(temp_json_file, *argv):
+        """Выполнить команду над временным файлом и вернуть код выхода"""
+        return main(["--file", temp_json_file, *argv])
+
+    def test_add_done_rm(self, temp_json_file, capsys):
+        """Тест: add печатает номер, done и rm меняют файл"""
+        assert self.run(temp_json_file, "add", "Task 1", "--priority", "высокий") == 0
+        assert self.run(temp_json_file, "add", "Task 2") == 0
+        first, second = capsys.readouterr().out.split()
+
+        assert self.run(temp_json_file, "done", first) == 0
+        assert self.run(temp_json_file, "rm", second) == 0
+        assert capsys.readouterr().out == ""
+
+        tasks = list(TaskManager(temp_json_file))
+        assert [(task.title, task.completed) for task in tasks] == [("Task 1", True)]
+
+    def test_changes_appended_to_journal(self, temp_json_file, capsys):
+        """Тест: add, done и rm дописывают журнал, а не переписывают файл"""
+        TaskManager(temp_json_file).add_tasks([f"Task {i}"] for i in range(3))
+        with open(temp_json_file, "rb") as f:
+            snapshot = f.read()
+
+        assert self.run(temp_json_file, "add", "Task 3") == 0
+        assert self.run(temp_json_file, "done", "0") == 0
+        assert self.run(temp_json_file, "rm", "1") == 0
+
+        with open(temp_json_file, "rb") as f:
+            assert f.read() == snapshot
+        with open(temp_json_file + ".journal", encoding="utf-8") as f:
+            assert len(f.readlines()) == 4  # заголовок + три операции
+        capsys.readouterr()
+        assert self.run(temp_json_file, "ls", "--format", "tsv") == 0
+        assert capsys.readouterr().out.splitlines() == [
+            "0\tвыполнено\tсредний\t\tTask 0",
+            "2\tне выполнено\tсредний\t\tTask 2",
+            "3\tне выполнено\tсредний\t\tTask 3",
+        ]
+
+    def test_shared_manager_merges_journal(self, temp_json_file, capsys):
+        """Тест: открытый совместный менеджер вливает записи журнала команд"""
+        TaskManager(temp_json_file).add_tasks([f"Task {i}"] for i in range(2))
+        shared = TaskManager(
+            temp_json_file, shared=True, autosave=True, autosave_delay=60
+        )
+        mine = shared.add_task("Mine")
+        shared.edit_task(0, title="Edited")
+
+        assert self.run(temp_json_file, "add", "Theirs") == 0
+        assert self.run(temp_json_file, "done", "0") == 0
+        assert self.run(temp_json_file, "rm", "1") == 0
+        shared.close()
+
+        tasks = {task.title: task for task in TaskManager(temp_json_file)}
+        assert set(tasks) == {"Edited", "Theirs", "Mine"}
+        assert tasks["Edited"].completed
+        # Наша несохранённая задача уступила номер задаче из журнала
+        assert tasks["Theirs"].id == 2 and mine.id == tasks["Mine"].id == 3
+        assert not os.path.exists(temp_json_file + ".journal")
+
+    def test_read_commands_do_not_write_cache(self, temp_json_file, capsys):
+        """Тест: команды чтения не создают кэш рядом с файлом задач"""
+        TaskManager(temp_json_file).add_task("Купить хлеб", due_date="2024-01-01")
+        capsys.readouterr()
+
+        assert self.run(temp_json_file, "search", "хлеб") == 0
+        assert self.run(temp_json_file, "due", "--overdue") == 0
+        assert self.run(temp_json_file, "query", "status=pending") == 0
+        assert capsys.readouterr().out.count("Купить хлеб") == 3
+        assert not os.path.exists(temp_json_file + ".cache")
+
+    def test_save_writes_cache_in_background(self, temp_json_file, mocker):
+        """Тест: кэш пишется не в потоке, который сохраняет файл"""
+        manager = TaskManager(temp_json_file, snapshot_cache=True)
+        threads = []
+        write_cache = manager._write_cache
+
+        def record_thread(*args):
+            threads.append(threading.current_thread())
+            write_cache(*args)
+
+        mocker.patch.object(manager, "_write_cache", side_effect=record_thread)
+        manager.add_task("Task 1")
+        manager.close()
+
+        assert threads and threading.current_thread() not in threads
+        assert os.path.exists(manager.cache_filename)
+
+    def test_menu_uses_file_option(self, temp_json_file, mocker):
+        """Тест: без команды --file выбирает файл интерактивного меню"""
+        TaskManager(temp_json_file).add_task("Task 1")
+        apps = []
+        mocker.patch.object(ToDoApp, "start", autospec=True, side_effect=apps.append)
+
+        assert main(["--file", temp_json_file]) == 0
+
+        manager = apps[0].task_manager
+        manager.close()
+        assert manager.filename == temp_json_file
+        assert [task.title for task in manager] == ["Task 1"]
+
+    def test_errors_go_to_stderr(self, temp_json_file, capsys):
+        """Тест: ошибки печатаются в stderr с ненулевым кодом выхода"""
+        assert self.run(temp_json_file, "add", "   ") == 1
+        assert self.run(temp_json_file, "done", "42") == 1
+        captured = capsys.readouterr()
+        assert captured.out == ""
+        assert "не найдена" in captured.err
+
+    def test_ls_filters(self, temp_json_file, capsys):
+        """Тест: ls выводит строку на задачу и применяет фильтры"""
+        manager = TaskManager(temp_json_file)
+        manager.add_task("Task 1", "высокий", "2024-01-10")
+        manager.add_task("Task 2", "низкий", "2024-03-01")
+        manager.add_task("Task 3", "высокий")
+        manager.mark_task_completed(2)
+        capsys.readouterr()
+
+        self.run(temp_json_file, "ls")
+        lines = capsys.readouterr().out.splitlines()
+        assert lines[0] == "0\tне выполнено\tвысокий\t2024-01-10\tTask 1"
+        assert len(lines) == 3
+
+        self.run(
+            temp_json_file, "ls", "--priority", "высокий", "--status", "невыполненные"
+        )
+        assert capsys.readouterr().out.splitlines() == [lines[0]]
+
+        self.run(temp_json_file, "ls", "--due-before", "2024-02-01")
+        assert capsys.readouterr().out.splitlines() == [lines[0]]
+
+    def test_ls_limit_and_ndjson(self, temp_json_file, capsys):
+        """Тест: ls --offset --limit --format ndjson"""
+        TaskManager(temp_json_file).add_tasks([f"Task {i}"] for i in range(5))
+        capsys.readouterr()
+
+        self.run(
+            temp_json_file, "ls", "--offset", "1", "--limit", "2", "--format", "ndjson"
+        )
+        lines = capsys.readouterr().out.splitlines()
+        assert [json.loads(line)["title"] for line in lines] == ["Task 1", "Task 2"]
+
+    def test_ls_completed_includes_archive(self, temp_json_file, capsys):
+        """Тест: ls --status выполненные показывает и задачи из архива"""
+        manager = TaskManager(temp_json_file)
+        manager.add_task("Старая")
+        manager.mark_task_completed(0)
+        manager.archive_completed(older_than_days=-1)
+        capsys.readouterr()
+
+        self.run(temp_json_file, "ls", "--status", "выполненные")
+        assert capsys.readouterr().out.split("\t")[-1] == "Старая\n"
+
+    def test_export_import_round_trip(self, temp_json_file, tmp_path, capsys):
+        """Тест: экспорт и импорт сохраняют задачи и их статус"""
+        manager = TaskManager(temp_json_file)
+        manager.add_task("Task 1", "высокий", "2024-12-31")
+        manager.add_task("Task 2")
+        manager.mark_task_completed(1)
+        exported = str(tmp_path / "export.json")
+        target = str(tmp_path / "copy.json")
+
+        assert self.run(temp_json_file, "export", exported) == 0
+        assert main(["--file", target, "import", exported]) == 0
+        assert "Импортировано задач: 2" in capsys.readouterr().out
+
+        copy = [task.to_dict() for task in TaskManager(target)]
+        assert [
+            (task["title"], task["priority"], task["due_date"], task["completed"])
+            for task in copy
+        ] == [
+            ("Task 1", "высокий", "2024-12-31", False),
+            ("Task 2", "средний", "", True),
+        ]
+
+    def test_export_to_stdout(self, temp_json_file, capsys):
+        """Тест: export - пишет массив JSON в стандартный вывод"""
+        TaskManager(temp_json_file).add_task("Task 1")
+        capsys.readouterr()
+        self.run(temp_json_file, "export", "-")
+        assert [item["title"] for item in json.loads(capsys.readouterr().out)] == [
+            "Task 1"
+        ]
+
+    def test_import_does_not_load_heavy_modules(self):
+        """Тест: импорт модуля не тянет asyncio, http.server и sqlite3"""
+        here = os.path.dirname(os.path.abspath(__file__))
+        script = (
+            "import sys, tasks\n"
+            "print(sorted(m for m in ('asyncio', 'http.server', 'sqlite3',"
+            " 'argparse', 'gzip') if m in sys.modules))\n"
+        )
+        output = subprocess.run(
+            [sys.executable, "-c", script],
+            cwd=here,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+        assert output.strip() == "[]"
+
+    @pytest.mark.benchmark
+    def test_startup_time(self, temp_json_file):
+        """Тест: ls добавляет к запуску интерпретатора немного времени"""
+        here = os.path.dirname(os.path.abspath(__file__))
+        TaskManager(temp_json_file).add_task("Task 1")
+
+        def best_of(args, rounds=5):
+            best = float("inf")
+            for _ in range(rounds):
+                start = time.perf_counter()
+                subprocess.run(args, cwd=here, stdout=subprocess.DEVNULL, check=True)
+                best = min(best, time.perf_counter() - start)
+            return best
+
+        bare = best_of([sys.executable, "-c", "pass"])
+        ls = best_of([sys.executable, "-m", "tasks", "--file", temp_json_file, "ls"])
+        # Без кэша байт-кода модуль компилируется при каждом запуске
+        assert ls - bare < 0.25
+
+
+class TestRendering:
+    """Тесты для буферизованного постраничного вывода списка"""
+
+    class CountingWriter:
+        """Поток вывода, который считает вызовы write"""
+
+        def __init__(self):
+            self.parts = []
+
+        def write(self, text):
+            self.parts.append(text)
+
+        def getvalue(self):
+            return "".join(self.parts)
+
+    def test_render_formats(self):
+        """Тест: форматы text, tsv и ndjson"""
+        task = Task("Task 1", "высокий", "2024-12-31")
+        task.id = 7
+
+        text = "".join(render_tasks([task]))
+        assert text == f"\nЗадача #7:\n{task.show()}\n"
+        assert "".join(render_tasks([task], "tsv")) == (
+            "7\tне выполнено\tвысокий\t2024-12-31\tTask 1\n"
+        )
+        assert json.loads("".join(render_tasks([task], "ndjson"))) == task.to_dict()
+        with pytest.raises(ValueError):
+            list(render_tasks([task], "xml"))
+
+    def test_write_buffered_batches_writes(self):
+        """Тест: куски объединяются в крупные записи"""
+        out = self.CountingWriter()
+        count = write_buffered((f"{i}\n" for i in range(10000)), out, 4096)
+
+        assert count == 10000
+        assert out.getvalue() == "".join(f"{i}\n" for i in range(10000))
+        assert len(out.parts) < 20
+
+    def test_list_tasks_pages(self, filled_manager, capsys):
+        """Тест: offset и limit выводят одну страницу"""
+        capsys.readouterr()
+        shown = filled_manager.list_tasks("все", offset=1, limit=2)
+
+        output = capsys.readouterr().out
+        assert shown == 2
+        assert "Задача #0:" not in output
+        assert "Задача #1:" in output and "Задача #2:" in output
+        assert "Показаны задачи: 2–3" in output
+
+    def test_list_tasks_machine_format(self, filled_manager):
+        """Тест: формат ndjson без заголовков в заданный поток"""
+        out = self.CountingWriter()
+        shown = filled_manager.list_tasks("невыполненные", fmt="ndjson", out=out)
+
+        items = [json.loads(line) for line in out.getvalue().splitlines()]
+        assert shown == len(items)
+        assert items and not any(item["completed"] for item in items)
+
+    def test_iter_tasks_stops_early(self, temp_json_file):
+        """Тест: с limit ленивый менеджер не дочитывает файл"""
+        manager = TaskManager(temp_json_file)
+        manager.add_tasks([f"Task {i}"] for i in range(100))
+
+        lazy = TaskManager(temp_json_file, lazy=True)
+        tasks = list(lazy.iter_tasks(offset=3, limit=2))
+
+        assert [task.title for task in tasks] == ["Task 3", "Task 4"]
+        assert not lazy._store.fully_loaded
+
+    def test_iter_tasks_filters_use_indexes(self, temp_json_file, mocker):
+        """Тест: редкие задачи под фильтр берутся из индексов, а не обходом"""
+        manager = TaskManager(temp_json_file)
+        manager.add_tasks([f"Task {i}", "низкий"] for i in range(200))
+        manager.mark_completed_many(range(5, 200))
+        # Порядок в индексе приоритета — порядок изменений, а не номеров
+        manager.edit_many({150: {"priority": "высокий"}, 20: {"priority": "высокий"}})
+        mocker.patch.object(
+            type(manager._store), "__iter__", side_effect=AssertionError
+        )
+
+        pending = [task.id for task in manager.iter_tasks(False)]
+        high = [task.id for task in manager.iter_tasks(priority="Высокий")]
+
+        assert pending == [0, 1, 2, 3, 4]
+        assert high == [20, 150]
+
+    def test_iter_tasks_matches_full_scan(self, temp_json_file):
+        """Тест: любой путь iter_tasks даёт то же, что проверка каждой задачи"""
+        manager = TaskManager(temp_json_file)
+        manager.add_tasks(
+            [
+                f"Task {i}",
+                ("низкий", "средний", "высокий")[i % 3],
+                f"2024-01-{i % 28 + 1:02d}",
+            ]
+            for i in range(300)
+        )
+        manager.mark_completed_many(range(0, 300, 7))
+        manager.mark_completed_many(range(1, 300, 2))
+        filters = [
+            (None, "средний", None),
+            (False, None, None),
+            (True, None, None),
+            (True, "высокий", "2024-01-10"),
+            (None, None, "2024-01-03"),
+            (False, "низкий", "не дата"),
+        ]
+        for completed, priority, due_before in filters:
+            expected = [
+                task
+                for task in manager.tasks
+                if (completed is None or task.completed == completed)
+                and (priority is None or task.priority == priority)
+                and (due_before is None or task.due_date < due_before)
+            ]
+            for offset, limit in ((0, None), (0, 3), (10, 5), (0, 1000)):
+                tasks = manager.iter_tasks(
+                    completed, priority, due_before, offset=offset, limit=limit
+                )
+                stop = None if limit is None else offset + limit
+                assert list(tasks) == expected[offset:stop]
+
+    def test_todo_app_pages_in_one_pass(self, todo_app, monkeypatch, mocker, capsys):
+        """Тест: следующая страница меню продолжает обход, а не начинает заново"""
+        todo_app.task_manager.add_tasks(
+            [f"Task {i}"] for i in range(todo_app.PAGE_SIZE * 2 + 5)
+        )
+        todo_app.task_manager.mark_completed_many([0, 1])
+        monkeypatch.setattr("builtins.input", lambda text: "")
+        iter_tasks = mocker.spy(todo_app.task_manager, "iter_tasks")
+        capsys.readouterr()
+
+        todo_app.show_tasks("невыполненные")
+
+        output = capsys.readouterr().out
+        assert iter_tasks.call_count == 1
+        assert output.count("Задача #") == todo_app.PAGE_SIZE * 2 + 3
+        assert "Задача #0:" not in output
+        assert f"Показаны задачи: {todo_app.PAGE_SIZE * 2 + 1}–" in output
+
+    def test_todo_app_pages_survive_merge(self, temp_json_file, monkeypatch, capsys):
+        """Тест: изменения другого процесса во время листания не ломают меню"""
+        app = ToDoApp(temp_json_file, autosave=True)
+        manager = app.task_manager
+        manager.add_tasks([f"Task {i}"] for i in range(app.PAGE_SIZE * 2))
+        manager.close()
+        other = TaskManager(temp_json_file, shared=True)
+
+        def answer(text):
+            # Чужое удаление вливается, пока пользователь смотрит страницу
+            other.remove_task(len(other) - 1)
+            manager.refresh()
+            return ""
+
+        monkeypatch.setattr("builtins.input", answer)
+        capsys.readouterr()
+        app.show_tasks("невыполненные")
+
+        assert manager.thread_safe
+        assert capsys.readouterr().out.count("Задача #") == app.PAGE_SIZE * 2
+        app.task_manager.close()
+
+    def test_todo_app_pages_long_list(self, todo_app, monkeypatch, capsys):
+        """Тест: меню выводит длинный список страницами"""
+        todo_app.task_manager.add_tasks(
+            [f"Task {i}"] for i in range(todo_app.PAGE_SIZE + 5)
+        )
+        prompts = []
+        monkeypatch.setattr("builtins.input", lambda text: prompts.append(text) or "")
+        capsys.readouterr()
+
+        todo_app.show_tasks("все")
+
+        output = capsys.readouterr().out
+        assert len(prompts) == 1
+        assert output.count("Задача #") == todo_app.PAGE_SIZE + 5
+
+
+class TestRenderCache:
+    """Тесты для запоминания строк Task.show()"""
+
+    @pytest.fixture
+    def small_cache(self):
+        """Временно уменьшить общий предел кэша строк"""
+        maxsize = RENDER_CACHE.maxsize
+        RENDER_CACHE.resize(2)
+        yield RENDER_CACHE
+        RENDER_CACHE.resize(maxsize)
+
+    def test_show_is_memoized(self):
+        """Тест: повторный show() возвращает ту же строку"""
+        task = Task("Task 1", "высокий", "2024-12-31")
+        assert task.show() is task.show()
+
+    @pytest.mark.parametrize(
+        "change",
+        [
+            lambda task: task.edit(title="New"),
+            lambda task: task.edit(priority="низкий"),
+            lambda task: task.edit(due_date="2025-01-01"),
+            lambda task: task.mark_completed(),
+            lambda task: setattr(task, "completed", True),
+        ],
+    )
+    def test_change_invalidates(self, change):
+        """Тест: любое изменение поля строит строку заново"""
+        task = Task("Task 1", "высокий", "2024-12-31")
+        before = task.show()
+        change(task)
+
+        assert task.show() != before
+
+    def test_list_entry_follows_id(self):
+        """Тест: блок задачи в списке перестраивается при смене номера"""
+        task = Task("Task 1")
+        task.id = 1
+        assert "Задача #1:" in "".join(render_tasks([task]))
+        task.id = 2
+        assert "Задача #2:" in "".join(render_tasks([task]))
+
+    def test_lru_evicts_least_recently_shown(self, small_cache):
+        """Тест: сверх предела сбрасываются давно показанные строки"""
+        first, second, third = Task("1"), Task("2"), Task("3")
+        first_shown = first.show()
+        second_shown = second.show()
+        first.show()  # first снова показана недавно
+        third.show()
+
+        assert len(small_cache) == 2
+        assert first.show() is first_shown
+        assert second.show() is not second_shown
+        assert second.show() == second_shown
+
+    @pytest.mark.benchmark
+    def test_repeated_listing_benchmark(self):
+        """Тест: повторный вывод неизменных задач почти не тратит время на формат"""
+        tasks = [Task(f"Task {i}", "высокий", "2024-12-31") for i in range(20000)]
+        for number, task in enumerate(tasks):
+            task.id = number
+
+        class NullWriter:
+            def write(self, text):
+                pass
+
+        def best_of(action, rounds=5):
+            best = float("inf")
+            for _ in range(rounds):
+                start = time.perf_counter()
+                action()
+                best = min(best, time.perf_counter() - start)
+            return best
+
+        def listing():
+            write_buffered(render_tasks(tasks), NullWriter())
+
+        maxsize = RENDER_CACHE.maxsize
+        RENDER_CACHE.resize(0)
+        try:
+            uncached = best_of(listing)
+        finally:
+            RENDER_CACHE.resize(maxsize)
+        listing()
+        cached = best_of(listing)
+        assert cached < uncached / 2
+
+
+class TestSearch:
+    """Тесты для поиска по словам названий задач"""
+
+    @pytest.fixture
+    def manager(self, temp_json_file):
+        manager = TaskManager(temp_json_file)
+        manager.add_tasks(
+            [
+                ("Отправить СЧЁТ клиенту",),
+                ("Счётчик воды",),
+                ("Позвонить клиенту про счет",),
+                ("Купить молоко",),
+            ]
+        )
+        return manager
+
+    def test_tokenize(self):
+        """Тест: нижний регистр, ё как е, знаки препинания отбрасываются"""
+        assert tokenize("Ёлка, СЧЁТ-фактура №5!") == ["елка", "счет", "фактура", "5"]
+
+    def test_search_all_words_any_case(self, manager):
+        """Тест: находятся задачи со всеми словами запроса, регистр и ё не важны"""
+        titles = [task.title for task in manager.search("счет КЛИЕНТУ")]
+        assert titles == ["Отправить СЧЁТ клиенту", "Позвонить клиенту про счет"]
+        assert manager.search("счёт молоко") == []
+        assert manager.search("  ,") == []
+
+    def test_prefix_match_and_ranking(self, manager):
+        """Тест: слово запроса — начало слова; целые совпадения выше"""
+        titles = [task.title for task in manager.search("счет")]
+        assert titles == [
+            "Отправить СЧЁТ клиенту",
+            "Позвонить клиенту про счет",
+            "Счётчик воды",
+        ]
+        assert [task.title for task in manager.search("отпр")] == [
+            "Отправить СЧЁТ клиенту"
+        ]
+        assert len(manager.search("счет", limit=1)) == 1
+
+    def test_index_updated_incrementally(self, manager, mocker):
+        """Тест: добавление, изменение и удаление обновляют индекс без перестройки"""
+        manager.search("счет")
+        build = mocker.spy(TitleIndex, "build")
+
+        added = manager.add_task("Выставить счёт поставщику")
+        manager.edit_task(0, title="Отправить акт клиенту")
+        manager.remove_task(1)
+
+        assert [task.title for task in manager.search("счет")] == [
+            "Позвонить клиенту про счет",
+            "Выставить счёт поставщику",
+        ]
+        assert [task.id for task in manager.search("акт")] == [0]
+        assert manager.search("поставщ")[0] is added
+        assert build.call_count == 0
+
+    @pytest.mark.parametrize("storage", [ColumnarStorage, SqliteStorage])
+    def test_other_storages(self, manager, storage, tmp_path):
+        """Тест: хранилища без индекса дают те же результаты"""
+        store = (
+            SqliteStorage(str(tmp_path / "search.db"))
+            if storage is SqliteStorage
+            else storage()
+        )
+        other = TaskManager(str(tmp_path / "other.json"), storage=store)
+        other.add_tasks([task.title] for task in manager)
+
+        for query in ("счет", "клиенту сч", "воды"):
+            assert [task.title for task in other.search(query)] == [
+                task.title for task in manager.search(query)
+            ]
+        other.close()
+
+    def test_lazy_manager(self, manager, temp_json_file):
+        """Тест: поиск в ленивом режиме дочитывает файл"""
+        lazy = TaskManager(temp_json_file, lazy=True)
+        assert [task.id for task in lazy.search("клиенту")] == [0, 2]
+
+    def test_command_line_search(self, manager, temp_json_file, capsys):
+        """Тест: команда search выводит найденные задачи"""
+        capsys.readouterr()
+        main(["--file", temp_json_file, "search", "молоко"])
+        assert capsys.readouterr().out.split("\t")[-1] == "Купить молоко\n"
+
+    @pytest.mark.benchmark
+    def test_lookup_time_on_large_list(self, temp_json_file):
+        """Тест: редкое слово находится быстро и на большом списке"""
+        manager = TaskManager(temp_json_file)
+        manager.tasks = (
+            Task(f"Отправить счёт клиенту номер{i}") for i in range(200_000)
+        )
+        manager.search("номер1")  # построение индекса
+
+        best = float("inf")
+        for _ in range(5):
+            start = time.perf_counter()
+            found = manager.search("счет номер123456")
+            best = min(best, time.perf_counter() - start)
+        assert [task.id for task in found] == [123456]
+        assert best < 0.005
+
+
+class TestDeadlines:
+    """Тесты для очереди сроков: просроченные и ближайшие задачи"""
+
+    NOW = datetime(2024, 6, 15, 12, 0)
+
+    @pytest.fixture
+    def manager(self, temp_json_file):
+        manager = TaskManager(temp_json_file)
+        manager.add_tasks(
+            [
+                ("Давно просрочена", "средний", "2024-05-01"),
+                ("Просрочена вчера", "средний", "2024-06-14"),
+                ("Сегодня", "средний", "2024-06-15"),
+                ("Через неделю", "средний", "2024-06-22"),
+                ("Без срока",),
+                ("Выполнена", "средний", "2024-06-01"),
+            ]
+        )
+        manager.mark_task_completed(5)
+        return manager
+
+    @staticmethod
+    def titles(tasks):
+        return [task.title for task in tasks]
+
+    def test_overdue(self, manager):
+        """Тест: просроченные — невыполненные со сроком раньше сегодня"""
+        assert self.titles(manager.overdue(self.NOW)) == [
+            "Давно просрочена",
+            "Просрочена вчера",
+        ]
+        assert self.titles(manager.overdue(self.NOW, limit=1)) == ["Давно просрочена"]
+
+    def test_due_within_and_next_due(self, manager):
+        """Тест: срок в ближайшие дни и ближайшие n задач"""
+        assert self.titles(manager.due_within(timedelta(days=6), self.NOW)) == [
+            "Сегодня"
+        ]
+        assert self.titles(manager.due_within(timedelta(days=7), self.NOW)) == [
+            "Сегодня",
+            "Через неделю",
+        ]
+        assert self.titles(manager.next_due(1, self.NOW)) == ["Сегодня"]
+
+    def test_queue_follows_changes(self, manager):
+        """Тест: выполнение, перенос срока и удаление обновляют очередь"""
+        manager.mark_task_completed(0)
+        manager.edit_task(3, due_date="2024-06-10")
+        manager.remove_task(1)
+
+        assert self.titles(manager.overdue(self.NOW)) == ["Через неделю"]
+        assert self.titles(manager.next_due(5, self.NOW)) == ["Сегодня"]
+
+    def test_queries_do_not_parse_dates(self, manager, mocker):
+        """Тест: запросы не разбирают даты — они проверены при добавлении"""
+        parse = mocker.patch("tasks._is_due_date", side_effect=AssertionError)
+        manager.overdue(self.NOW)
+        manager.due_within(timedelta(days=30), self.NOW)
+        manager.next_due(10, self.NOW)
+        assert parse.call_count == 0
+
+    def test_invalid_due_date_rejected(self, manager, capsys):
+        """Тест: неверный срок не принимается, верный приводится к ГГГГ-ММ-ДД"""
+        assert manager.add_task("Задача", due_date="завтра") is None
+        assert "ГГГГ-ММ-ДД" in capsys.readouterr().out
+        assert manager.add_task("Задача", due_date=" 20240701 ").due_date == (
+            "2024-07-01"
+        )
+        assert not manager.edit_task(0, due_date="31.02.2024")
+        result = manager.edit_many({0: {"due_date": "2024-02-31"}})
+        assert result.errors and manager.get_task(0).due_date == "2024-05-01"
+
+    def test_legacy_free_form_dates_skipped(self, temp_json_file):
+        """Тест: произвольный срок из старого файла не попадает в очередь"""
+        with open(temp_json_file, "w", encoding="utf-8") as f:
+            json.dump(
+                [
+                    {
+                        "title": title,
+                        "priority": "средний",
+                        "due_date": due_date,
+                        "completed": False,
+                        "created_at": "2024-01-01 10:00:00",
+                    }
+                    for title, due_date in [
+                        ("Старая", "1 мая"),
+                        ("Новая", "2024-05-01"),
+                    ]
+                ],
+                f,
+                ensure_ascii=False,
+            )
+        manager = TaskManager(temp_json_file)
+        assert self.titles(manager.overdue(self.NOW)) == ["Новая"]
+
+    @pytest.mark.parametrize("storage", [ColumnarStorage, SqliteStorage])
+    def test_other_storages(self, manager, storage, tmp_path):
+        """Тест: хранилища без очереди сроков отвечают так же"""
+        store = (
+            SqliteStorage(str(tmp_path / "deadlines.db"))
+            if storage is SqliteStorage
+            else storage()
+        )
+        other = TaskManager(str(tmp_path / "other.json"), storage=store)
+        with other.batch():
+            for task in manager:
+                added = other._add(task.title, task.priority, task.due_date)
+                if task.completed:
+                    other._complete(added.id)
+
+        assert self.titles(other.overdue(self.NOW)) == self.titles(
+            manager.overdue(self.NOW)
+        )
+        assert self.titles(other.next_due(2, self.NOW)) == self.titles(
+            manager.next_due(2, self.NOW)
+        )
+        other.close()
+
+    def test_command_line_due(self, manager, temp_json_file, capsys):
+        """Тест: команда due --overdue"""
+        manager.edit_task(3, due_date="2000-01-01")
+        capsys.readouterr()
+        main(["--file", temp_json_file, "due", "--overdue", "--limit", "1"])
+        assert capsys.readouterr().out.split("\t")[-1] == "Через неделю\n"
+
+
+class TestQuery:
+    """Тесты для языка запросов и выбора индекса"""
+
+    @pytest.fixture
+    def manager(self, temp_json_file):
+        manager = TaskManager(temp_json_file)
+        manager.add_tasks(
+            [
+                ("Купить молоко", "низкий", "2024-06-20"),
+                ("Позвонить маме", "высокий", "2024-06-10"),
+                ("Отчёт за квартал", "средний"),
+                ("Купить хлеб", "высокий", "2024-06-10"),
+                ("Прочитать книгу", "средний", "2024-07-01"),
+            ]
+        )
+        manager.mark_task_completed(1)
+        return manager
+
+    @staticmethod
+    def ids(tasks):
+        return [task.id for task in tasks]
+
+    @staticmethod
+    def titles(tasks):
+        return [task.title for task in tasks]
+
+    def test_parse_and_format(self):
+        """Тест: запрос разбирается и печатается в каноническом виде"""
+        query = Query(
+            'status=невыполненные priority>=средний due<2024-07-01 title~"Купить" '
+            "sort=due,-priority limit=5 offset=2"
+        )
+        assert str(query) == (
+            'status=pending priority>=средний due<2024-07-01 title~"купить" '
+            "sort=due,-priority limit=5 offset=2"
+        )
+        assert str(Query(str(query))) == str(query)
+
+    @pytest.mark.parametrize(
+        "text",
+        [
+            "status=maybe",
+            "priority>срочный",
+            "due<завтра",
+            "owner=я",
+            "title=молоко",
+            "priority~высокий",
+            "sort=size",
+            "limit=-1",
+            "просто слова",
+            'title~"не закрыта',
+        ],
+    )
+    def test_invalid_queries(self, text):
+        """Тест: ошибки в запросе — ValueError с понятным текстом"""
+        with pytest.raises(ValueError):
+            Query(text)
+
+    def test_priority_compared_by_rank(self, manager):
+        """Тест: приоритеты сравниваются по порядку, а не как строки"""
+        assert self.ids(manager.select("priority>=средний")) == [1, 2, 3, 4]
+        assert self.ids(manager.select("priority<высокий")) == [0, 2, 4]
+
+    def test_sort_keys_and_page(self, manager):
+        """Тест: несколько ключей сортировки, задачи без срока — в конце"""
+        assert self.ids(manager.select("sort=due,-priority")) == [1, 3, 0, 4, 2]
+        assert self.ids(manager.select("sort=-due")) == [4, 0, 1, 3, 2]
+        assert self.ids(manager.select("sort=-priority,title")) == [3, 1, 2, 4, 0]
+        assert self.ids(manager.select("sort=due limit=2 offset=1")) == [3, 0]
+
+    def test_conditions(self, manager):
+        """Тест: статус, срок, номер и слова из названия"""
+        assert self.ids(manager.select("status=done")) == [1]
+        assert self.ids(manager.select("due=none")) == [2]
+        assert self.ids(manager.select("due>=2024-06-10 due<=2024-06-20")) == [
+            0,
+            1,
+            3,
+        ]
+        assert self.ids(manager.select("id>2 id!=4")) == [3]
+        assert self.ids(manager.select("title~куп status=pending")) == [0, 3]
+
+    def test_empty_title_words_match_all(self, manager):
+        """Тест: title~"" без слов подходит к любой задаче, как и в плане"""
+        assert self.ids(manager.select('title~""')) == [0, 1, 2, 3, 4]
+        assert self.ids(manager.select('title~"" status=done')) == [1]
+        assert "полный просмотр" in manager.explain('title~""')
+
+    @pytest.mark.parametrize(
+        "text, plan",
+        [
+            ("due<2024-06-15", "индекс сроков: due<2024-06-15"),
+            ("title~молоко", "индекс слов: молоко"),
+            ("id=3", "по номеру"),
+            ("created>=2000-01-01", "полный просмотр"),
+            ("sort=due limit=1", "по порядку sort=due"),
+        ],
+    )
+    def test_explain_shows_plan(self, manager, text, plan):
+        """Тест: explain показывает выбранный индекс"""
+        lines = manager.explain(text).splitlines()
+        assert lines[0] == f"запрос: {Query(text)}"
+        assert plan in lines[1]
+
+    def test_plan_follows_changes(self, manager):
+        """Тест: индексы в плане обновляются вместе с задачами"""
+        manager.edit_task(2, due_date="2024-06-01")
+        manager.remove_task(3)
+        assert self.ids(manager.select("due<2024-06-15 sort=due")) == [2, 1]
+        assert self.ids(manager.select("sort=due limit=3")) == [2, 1, 0]
+
+    @pytest.mark.parametrize("storage", [ColumnarStorage, SqliteStorage])
+    def test_other_storages(self, manager, storage, tmp_path):
+        """Тест: хранилища без планировщика отвечают так же"""
+        store = (
+            SqliteStorage(str(tmp_path / "query.db"))
+            if storage is SqliteStorage
+            else storage()
+        )
+        other = TaskManager(str(tmp_path / "other.json"), storage=store)
+        with other.batch():
+            for task in manager:
+                added = other._add(task.title, task.priority, task.due_date)
+                if task.completed:
+                    other._complete(added.id)
+
+        for text in [
+            "status=pending priority>=средний sort=due",
+            "due<2024-06-15",
+            "title~купить sort=-priority limit=1",
+        ]:
+            assert self.titles(other.select(text)) == self.titles(manager.select(text))
+        other.close()
+
+    def test_list_tasks_with_query(self, manager, capsys):
+        """Тест: list_tasks принимает запрос вместо фильтра статуса"""
+        assert manager.list_tasks("priority=высокий", fmt="tsv") == 2
+        assert manager.list_tasks("priority=срочный") == 0
+        assert "Ошибка:" in capsys.readouterr().out
+
+    def test_command_line_query(self, manager, temp_json_file, capsys):
+        """Тест: команда query и query --explain"""
+        capsys.readouterr()
+        assert main(["--file", temp_json_file, "query", "sort=-priority limit=1"]) == 0
+        assert capsys.readouterr().out.split("\t")[-1] == "Позвонить маме\n"
+        main(["--file", temp_json_file, "query", "--explain", "id=0"])
+        assert "по номеру" in capsys.readouterr().out
+        assert main(["--file", temp_json_file, "query", "status=?"]) == 1
+
+
+class TestImportExport:
+    """Тесты для потокового импорта и экспорта задач"""
+
+    @pytest.fixture
+    def manager(self, temp_json_file):
+        manager = TaskManager(temp_json_file)
+        manager.add_tasks(
+            [
+                ("Купить молоко", "низкий", "2024-06-20"),
+                ("Позвонить маме", "высокий"),
+                ('Отчёт, квартал "3"', "средний", "2024-07-01"),
+            ]
+        )
+        manager.mark_task_completed(1)
+        return manager
+
+    @staticmethod
+    def fields(manager):
+        return [{**task.to_dict(), "id": None} for task in manager]
+
+    @pytest.mark.parametrize(
+        "name",
+        ["tasks.json", "tasks.ndjson", "tasks.csv", "tasks.ndjson.gz", "tasks.csv.xz"],
+    )
+    def test_round_trip(self, manager, tmp_path, name):
+        """Тест: экспорт и импорт сохраняют статус и даты задач"""
+        target = str(tmp_path / name)
+        assert manager.export_tasks(target) == 3
+
+        copy = TaskManager(str(tmp_path / "copy.json"))
+        result = copy.import_tasks(target)
+        assert (result.added, result.duplicates, result.ok) == (3, 0, True)
+        assert self.fields(copy) == self.fields(manager)
+
+    def test_dedupe(self, manager, tmp_path):
+        """Тест: повторы в файле и уже имеющиеся задачи пропускаются"""
+        target = str(tmp_path / "tasks.ndjson")
+        manager.export_tasks(target)
+        with open(target, "a", encoding="utf-8") as f:
+            f.write(open(target, encoding="utf-8").readline())
+
+        result = manager.import_tasks(target)
+        assert (result.added, result.duplicates) == (0, 4)
+        copy = TaskManager(str(tmp_path / "copy.json"))
+        assert copy.import_tasks(target).duplicates == 1
+        assert copy.import_tasks(target, dedupe=False).added == 4
+        assert len(copy) == 7
+
+    def test_bad_records(self, temp_json_file, tmp_path):
+        """Тест: ошибки в записях собираются в результат, остальное добавляется"""
+        source = tmp_path / "tasks.ndjson"
+        source.write_text(
+            "\n".join(
+                json.dumps(record, ensure_ascii=False)
+                for record in [
+                    {"title": "Хорошая", "priority": "высокий"},
+                    {"title": "Без приоритета", "priority": "срочный"},
+                    {"title": "Плохой срок", "due_date": "завтра"},
+                    ["не", "объект"],
+                    {"title": "Со сроком", "due_date": "20240701", "completed": True},
+                ]
+            ),
+            encoding="utf-8",
+        )
+        manager = TaskManager(temp_json_file)
+        result = manager.import_tasks(str(source))
+        assert (result.added, result.failed) == (2, 3)
+        assert [number for number, _ in result.errors] == [2, 3, 4]
+        task = manager.get_task(1)
+        assert (task.due_date, task.completed) == ("2024-07-01", True)
+        assert task.completed_at
+
+        source.write_text('{"title": "Первая"}\n{"title": ', encoding="utf-8")
+        with pytest.raises(ValueError, match="строка 2"):
+            manager.import_tasks(str(source))
+
+    def test_bulk_path(self, manager, tmp_path, mocker):
+        """Тест: импорт идёт одним пакетом, без add_task на каждую запись"""
+        target = str(tmp_path / "tasks.csv")
+        manager.export_tasks(target)
+        copy = TaskManager(str(tmp_path / "copy.json"))
+        save = mocker.spy(copy, "save_to_file")
+        add_task = mocker.spy(copy, "add_task")
+
+        copy.import_tasks(target)
+        assert save.call_count == 1
+        assert add_task.call_count == 0
+
+    def test_progress(self, manager, tmp_path):
+        """Тест: progress получает число обработанных задач"""
+        manager.add_tasks([("Ещё",), ("И ещё",)])
+        target = str(tmp_path / "tasks.ndjson")
+        exported = []
+        manager.export_tasks(target, progress=exported.append, progress_every=2)
+        imported = []
+        TaskManager(str(tmp_path / "copy.json")).import_tasks(
+            target, progress=imported.append, progress_every=2
+        )
+        assert exported == imported == [2, 4, 5]
+
+    def test_export_memory_does_not_grow(self, tmp_path):
+        """Тест: экспорт не строит список всех задач"""
+        manager = TaskManager(str(tmp_path / "tasks.json"))
+        manager.add_tasks((f"Задача {number}",) for number in range(20_000))
+
+        tracemalloc.start()
+        manager.export_tasks(str(tmp_path / "tasks.ndjson"))
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        assert peak < 1024 * 1024
+
+    def test_batch_keeps_due_order(self, temp_json_file):
+        """Тест: внутри пакета списки сроков сортируются перед чтением"""
+        manager = TaskManager(temp_json_file)
+        with manager.batch():
+            for due_date in ["2024-06-03", "2024-06-01", "2024-06-02"]:
+                manager._add("Задача", "средний", due_date)
+            assert [task.id for task in manager.next_due(3, date(2024, 1, 1))] == [
+                1,
+                2,
+                0,
+            ]
+            manager._add("Задача", "средний", "2024-05-01")
+            manager.edit_task(0, due_date="2024-04-01")
+        assert [task.id for task in manager.select("sort=due")] == [0, 3, 1, 2]
+
+    def test_command_line(self, manager, temp_json_file, tmp_path, capsys):
+        """Тест: команды export и import с форматом, сжатием и повторами"""
+        target = str(tmp_path / "tasks.ndjson.gz")
+        copy = str(tmp_path / "copy.json")
+        assert main(["--file", temp_json_file, "export", target]) == 0
+        assert main(["--file", copy, "import", target, "--progress"]) == 0
+        captured = capsys.readouterr()
+        assert "Импортировано задач: 3\n" in captured.out
+        assert "обработано задач: 3" in captured.err
+
+        main(["--file", copy, "import", target])
+        assert "пропущено повторов: 3" in capsys.readouterr().out
+
+        main(["--file", temp_json_file, "export", "-", "--format", "csv"])
+        lines = capsys.readouterr().out.splitlines()
+        assert (
+            lines[0] == "id,title,priority,due_date,completed,created_at,completed_at"
+        )
+        assert lines[2].startswith("1,Позвонить маме,высокий,,1,")
+
+
+class TestMmapNdjsonStorage:
+    """Тесты для хранилища NDJSON с индексом смещений и чтением через mmap"""
+
+    @staticmethod
+    def open_manager(filename):
+        return TaskManager(storage=MmapNdjsonStorage(filename))
+
+    @pytest.fixture
+    def filename(self, temp_ndjson_file):
+        manager = self.open_manager(temp_ndjson_file)
+        manager.add_tasks([(f"Task {i}",) for i in range(6)])
+        manager.close()
+        return temp_ndjson_file
+
+    def test_round_trip(self, filename):
+        """Тест: изменения сохраняются и читаются после повторного открытия"""
+        manager = self.open_manager(filename)
+        manager.edit_task(1, title="Task 1 " + "x" * 200, priority="высокий")
+        manager.mark_task_completed(2)
+        manager.remove_task(0)
+        manager.add_task("Task 6", due_date="2024-12-31")
+        expected = [task.to_dict() for task in manager]
+        manager.close()
+
+        reloaded = self.open_manager(filename)
+        assert [task.to_dict() for task in reloaded] == expected
+        assert len(reloaded) == 6
+        assert reloaded.get_task(0) is None
+        assert [task.id for task in reloaded.find_tasks(completed=True)] == [2]
+        assert os.path.exists(filename + ".idx")
+
+    def test_insert_existing_id_gets_new_id(self, filename):
+        """Тест: задача с занятым номером не заменяет существующую"""
+        storage = MmapNdjsonStorage(filename)
+        task = Task("Duplicate")
+        task.id = 2
+        storage.insert(task)
+
+        assert task.id == 6
+        assert storage.get(2).title == "Task 2"
+        assert len(storage) == 7
+        storage.close()
+
+    def test_decodes_only_requested_tasks(self, filename, mocker):
+        """Тест: открытие ничего не декодирует, а задача и страница — только себя"""
+        from_dict = mocker.spy(Task, "from_dict")
+        manager = self.open_manager(filename)
+        assert from_dict.call_count == 0
+
+        assert manager.get_task(4).title == "Task 4"
+        assert from_dict.call_count == 1
+        page = list(manager.iter_tasks(offset=2, limit=2))
+        assert [task.id for task in page] == [2, 3]
+        assert from_dict.call_count == 3
+
+    def test_edits_do_not_rewrite_columns(self, filename):
+        """Тест: переехавший слот хранится в хвосте индекса, столбцы те же"""
+        manager = self.open_manager(filename)
+        manager.edit_task(3, title="Task 3 " + "x" * 200)
+        manager.close()
+        with open(filename + ".idx", "rb") as f:
+            columns = f.read()[MmapNdjsonStorage._HEADER.size :]
+        assert len(columns) == 24 * (6 + 1)
+
+        reloaded = self.open_manager(filename)
+        assert reloaded._store._moved.keys() == {3}
+        assert reloaded.get_task(3).title.endswith("x" * 200)
+
+    def test_pending_slots_merged_into_columns(self, filename, monkeypatch):
+        """Тест: накопившиеся изменения слотов сливаются в столбцы индекса"""
+        monkeypatch.setattr(MmapNdjsonStorage, "MAX_PENDING_SLOTS", 2)
+        manager = self.open_manager(filename)
+        for task_id in (0, 1, 2):
+            manager.edit_task(task_id, title="x" * 100)
+        assert not manager._store._moved
+        manager.close()
+        assert [task.title for task in self.open_manager(filename)][:4] == [
+            "x" * 100,
+            "x" * 100,
+            "x" * 100,
+            "Task 3",
+        ]
+
+    def test_stale_index_is_rebuilt(self, filename):
+        """Тест: индекс после сбоя или чужой записи строится заново"""
+        manager = self.open_manager(filename)
+        manager.remove_task(1)
+        manager._store.flush()
+        # Хранилище не закрыто — как после сбоя процесса
+        assert [task.id for task in self.open_manager(filename)] == [0, 2, 3, 4, 5]
+
+        other = TaskManager(storage=NdjsonStorage(filename))
+        other.remove_task(2)
+        other.add_task("Task 6")
+        reloaded = self.open_manager(filename)
+        assert [task.id for task in reloaded] == [0, 3, 4, 5, 6]
+
+        os.remove(filename + ".idx")
+        assert len(self.open_manager(filename)) == 5
+
+    def test_compaction_and_torn_tail(self, filename):
+        """Тест: файл сжимается, когда свободных слотов больше занятых"""
+        manager = self.open_manager(filename)
+        size = os.path.getsize(filename)
+        manager.remove_many([0, 1, 2, 3])
+        assert os.path.getsize(filename) < size
+        manager.close()
+        with open(filename, "ab") as f:
+            f.write(b'{"id":9,"title":"Tas')
+
+        reloaded = self.open_manager(filename)
+        assert [task.title for task in reloaded] == ["Task 4", "Task 5"]
+        assert reloaded.add_task("Task 6").id == 6
+
+
 class TestToDoApp:
     """Тесты для класса ToDoApp"""
 